@@ -1,9 +1,22 @@
 # generate_city_hourly_timestamps.py
-# Paste into Jupyter or run with python.
-import pandas as pd
+# Paste into Jupyter or run with python:
+#   python Time.py [--input IN.csv] [--output OUT.csv | --parquet OUT_DIR] [--chunksize N]
+#
+# Every city's rows get consecutive hourly timestamps from start_datetime, in
+# the order the rows appear in the input. The input is streamed in chunks with
+# a running per-city row counter, so the whole file is read once and memory
+# stays at about one chunk regardless of file size (plus, for Parquet, at
+# most parquet_max_buffered rows waiting for their row groups).
+#
+# Output keeps the input row order (CSV), or goes to one Parquet file per
+# city under OUT_DIR/City=<name>/ (needs pyarrow).
+import argparse
 import os
 import sys
 
+import numpy as np
+import pandas as pd
+
 # Optional: progress bar
 try:
     from tqdm import tqdm
@@ -16,83 +29,159 @@ except Exception:
 input_path = "D:/AI_RES_models/karnataka_data.csv"   # <-- local path provided earlier
 output_path = "D:/AI_RES_models/karnataka_data_time.csv"
 start_datetime = pd.Timestamp("2005-01-01 06:00:00")  # starting timestamp for each city
-timestamp_freq = "H"  # hourly
-
-# -------------------------
-# Basic checks
-# -------------------------
-if not os.path.exists(input_path):
-    raise FileNotFoundError(f"Input file not found: {input_path}")
-
-print("Loading input CSV (this may take some time for large files)...")
-# Read full CSV (we need City grouping). If very large, consider reading selected columns first.
-df = pd.read_csv(input_path)
-
-print(f"Loaded file with {len(df):,} rows and columns: {list(df.columns)}")
-
-# detect city column (case-insensitive)
-city_col = None
-for c in df.columns:
-    if c.lower() == "city":
-        city_col = c
-        break
-if city_col is None:
-    # fallback: look for column name containing 'city'
-    for c in df.columns:
+timestamp_step = pd.Timedelta(hours=1)  # hourly
+chunksize = 500_000  # rows per chunk; peak memory is about one chunk
+# Parquet rows buffered per city before a row group is written
+parquet_row_group = 65_536
+# Parquet rows buffered across all cities; beyond it the largest city
+# buffers are written early (as smaller row groups)
+parquet_max_buffered = 1_000_000
+
+
+def find_city_column(columns):
+    """The 'City' column (case-insensitive), else the first column containing 'city'."""
+    for c in columns:
+        if c.lower() == "city":
+            return c
+    for c in columns:
         if "city" in c.lower():
-            city_col = c
-            break
-
-if city_col is None:
+            return c
     raise ValueError("Could not find a 'City' column in the CSV. Rename the city column to 'City' or modify the script.")
 
-print(f"Using city column: '{city_col}'")
-
-# ensure the city column is string and strip whitespace
-df[city_col] = df[city_col].astype(str).str.strip()
-
-# prepare output DataFrame in chunks per city to avoid memory surge
-cities = df[city_col].unique()
-print(f"Found {len(cities)} unique cities. Example: {cities[:5]}")
 
-# If output exists, remove it (we will recreate)
-if os.path.exists(output_path):
-    print(f"Output file {output_path} exists — it will be overwritten.")
-    os.remove(output_path)
-
-# We'll write header on first write
-first_write = True
-rows_written = 0
-
-print("\nStarting per-city timestamp assignment...")
-for city in tqdm(cities, desc="cities"):
-    # get mask for this city (preserves original row order for that city)
-    mask = df[city_col] == city
-    df_city = df.loc[mask].copy()
-    n = len(df_city)
-    if n == 0:
-        continue
-
-    # generate timestamps for this city
-    # safe to use date_range here because n is expected to be ~1e5 level per city (no overflow)
-    timestamps = pd.date_range(start=start_datetime, periods=n, freq=timestamp_freq)
-
-    # assign timestamps (as naive timestamps without tz). If you want timezone-aware, use tz_localize.
-    df_city['assigned_timestamp'] = timestamps
-
-    # append to output CSV (write header only once)
-    if first_write:
-        df_city.to_csv(output_path, index=False)
-        first_write = False
+def assign_timestamps(chunk, city_col, counters, start=start_datetime, step=timestamp_step):
+    """Add 'assigned_timestamp' to ``chunk`` and advance ``counters`` (city -> rows seen).
+
+    Row k of a city (counting across all chunks so far) gets start + k * step.
+    """
+    chunk[city_col] = chunk[city_col].astype(str).str.strip()
+    seen = chunk[city_col].map(counters).fillna(0).to_numpy(dtype=np.int64)
+    position = seen + chunk.groupby(city_col, sort=False).cumcount().to_numpy(dtype=np.int64)
+    chunk["assigned_timestamp"] = start + pd.to_timedelta(position * step.value, unit="ns")
+    for city, n in chunk[city_col].value_counts(sort=False).items():
+        counters[city] = counters.get(city, 0) + int(n)
+    return chunk
+
+
+class CsvSink:
+    def __init__(self, path):
+        self.path = path
+        self.first_write = True
+
+    def write(self, chunk, city_col):
+        chunk.to_csv(self.path, mode="w" if self.first_write else "a", header=self.first_write, index=False)
+        self.first_write = False
+
+    def close(self):
+        pass
+
+
+class ParquetSink:
+    """One Parquet file per city (OUT_DIR/City=<name>/part-0.parquet), written
+    in row groups of ``row_group`` rows buffered per city. At most
+    ``max_buffered`` rows are held in total: when a chunk takes the sink
+    past that, the largest buffers are flushed until it is back under. As
+    usual for hive-style partitions the city column lives in the folder name
+    only."""
+
+    def __init__(self, out_dir, row_group=parquet_row_group, max_buffered=parquet_max_buffered):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa, self.pq = pa, pq
+        self.out_dir = out_dir
+        self.row_group = row_group
+        self.max_buffered = max_buffered
+        self.schema = None
+        self.city_col = None
+        self.writers = {}
+        self.buffers = {}
+        self.buffered = {}  # city -> rows in its buffer
+        self.total_buffered = 0
+
+    def _table(self, frame):
+        if self.schema is None:
+            # columns that are integers in the first chunk may hold gaps later on
+            frame = frame.astype({c: "float64" for c in frame.columns if frame[c].dtype.kind in "iu"})
+            self.schema = self.pa.Schema.from_pandas(frame, preserve_index=False)
+        return self.pa.Table.from_pandas(frame, schema=self.schema, preserve_index=False)
+
+    def _flush(self, city):
+        frames = self.buffers.pop(city, [])
+        self.total_buffered -= self.buffered.pop(city, 0)
+        if not frames:
+            return
+        table = self._table(pd.concat(frames, ignore_index=True).drop(columns=[self.city_col]))
+        writer = self.writers.get(city)
+        if writer is None:
+            safe = str(city).replace("/", "_").replace(os.sep, "_")
+            folder = os.path.join(self.out_dir, f"City={safe}")
+            os.makedirs(folder, exist_ok=True)
+            writer = self.writers[city] = self.pq.ParquetWriter(os.path.join(folder, "part-0.parquet"), self.schema)
+        writer.write_table(table)
+
+    def write(self, chunk, city_col):
+        self.city_col = city_col
+        for city, group in chunk.groupby(city_col, sort=False):
+            self.buffers.setdefault(city, []).append(group)
+            self.buffered[city] = self.buffered.get(city, 0) + len(group)
+            self.total_buffered += len(group)
+            if self.buffered[city] >= self.row_group:
+                self._flush(city)
+        while self.total_buffered > self.max_buffered:
+            self._flush(max(self.buffered, key=self.buffered.get))
+
+    def close(self):
+        for city in list(self.buffers):
+            self._flush(city)
+        for writer in self.writers.values():
+            writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Assign per-city hourly timestamps in one streaming pass")
+    parser.add_argument("--input", default=input_path)
+    parser.add_argument("--output", default=output_path, help="CSV output path")
+    parser.add_argument("--parquet", metavar="OUT_DIR", help="write city-partitioned Parquet here instead of CSV")
+    parser.add_argument("--chunksize", type=int, default=chunksize)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.input):
+        raise FileNotFoundError(f"Input file not found: {args.input}")
+
+    if args.parquet:
+        sink = ParquetSink(args.parquet)
+        print(f"Writing city-partitioned Parquet to {args.parquet}")
     else:
-        df_city.to_csv(output_path, mode='a', header=False, index=False)
-
-    rows_written += n
-
-print(f"\nFinished. Total rows written: {rows_written:,}")
-print(f"Output saved to: {output_path}")
-
-# quick verification: show sample
-print("\nSample of first 20 rows in output:")
-out_df = pd.read_csv(output_path, nrows=20)
-print(out_df[['assigned_timestamp', city_col]].to_string(index=True))
+        if os.path.exists(args.output):
+            print(f"Output file {args.output} exists — it will be overwritten.")
+        sink = CsvSink(args.output)
+
+    print(f"Streaming {args.input} in chunks of {args.chunksize:,} rows...")
+    reader = pd.read_csv(args.input, chunksize=args.chunksize, low_memory=False)
+    counters = {}
+    city_col = None
+    rows_written = 0
+    try:
+        for chunk in tqdm(reader, desc="chunks"):
+            if city_col is None:
+                city_col = find_city_column(chunk.columns)
+                print(f"Using city column: '{city_col}'")
+            assign_timestamps(chunk, city_col, counters)
+            sink.write(chunk, city_col)
+            rows_written += len(chunk)
+    finally:
+        sink.close()
+
+    print(f"\nFinished. Total rows written: {rows_written:,} for {len(counters)} cities")
+    print(f"Output saved to: {args.parquet or args.output}")
+
+    if not args.parquet and rows_written:
+        # quick verification: show sample
+        print("\nSample of first 20 rows in output:")
+        out_df = pd.read_csv(args.output, nrows=20)
+        print(out_df[['assigned_timestamp', city_col]].to_string(index=True))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,40 +4,56 @@ calculate_ghi_only.py
 
 - Strict purpose: read a CSV, compute a single new column "GHI" per row as the sum of available
   POA components (poa_direct + poa_diffuse + poa_sky_diffuse + poa_ground_diffuse),
-  and write an output CSV with the new column appended.
+  and write a Parquet (or Arrow IPC) file with the new column appended.
+- Runs on all cores: the CSV is cut into byte ranges that a process pool parses and scores
+  independently; the finished parts are stitched back together in input order.
 - Includes progress bar, ETA, and clear console messages (uses tqdm + colorama).
 - DOES NOT touch or create any timestamp columns.
 
 Usage:
   - Edit INPUT_PATH and OUTPUT_PATH if needed, then run:
-      python calculate_ghi_only.py
+      python data_add.py [--input IN.csv] [--output OUT.parquet] [--format parquet|arrow]
+                         [--workers N] [--chunk-mb MB] [--ghi-only] [--fresh]
 
 Notes:
   - The script auto-detects POA column names case-insensitively.
   - If a component column is missing, it is treated as zero for the sum.
   - If *all* components are missing for a row, GHI is set to NaN.
-  - Processes the file in chunks to be memory-friendly and shows progress/ETA.
+  - Each byte range owns the lines that start inside it, so ranges can be parsed in any order.
+    Quoted fields with embedded newlines are not supported (the state datasets have none).
+  - --ghi-only parses just the POA columns and writes GHI alone, in input row order.
+  - Finished parts are kept in OUTPUT.parts/ until the end. Re-running after an interruption
+    resumes from the completed parts as long as the input and settings are unchanged
+    (--fresh starts over).
+  - Progress is counted in input bytes, so there is no pre-scan of the file.
 """
+import argparse
+import csv
+import io
+import json
 import os
+import shutil
 import sys
-import pandas as pd
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
 import numpy as np
+import pandas as pd
 from tqdm import tqdm
 from colorama import init as colorama_init, Fore, Style
 
 colorama_init(autoreset=True)
 
 # ---------- USER CONFIG ----------
-# The user-uploaded file path from conversation history (kept here as default per instruction).
-# If you want to use a .csv file on your disk, replace this path with that CSV path.
 INPUT_PATH = "D:/AI_RES_models/karnataka_data.csv"
-# Example CSV alternative:
-# INPUT_PATH = ""
-
-OUTPUT_PATH = "D:/AI_RES_models/output_with_ghi.csv"
-CHUNKSIZE = 200000   # rows per chunk; tune based on memory (200k is a good starting point)
+OUTPUT_PATH = "D:/AI_RES_models/output_with_ghi.parquet"
+CHUNK_MB = 32        # bytes of CSV per task; ~200k rows of the state datasets
+WORKERS = os.cpu_count() or 1
+SAMPLE_ROWS = 10000  # rows read up front to settle the column types
 # ----------------------------------
 
+MANIFEST = "manifest.json"
+
+
 def _print_info(msg):
     print(Fore.CYAN + "[INFO] " + Style.RESET_ALL + msg)
 
@@ -71,128 +87,245 @@ def detect_poa_columns(columns):
         find_column_ignore_case(columns, cand_ground),
     )
 
-def estimate_total_rows(path):
-    """Estimate total rows (fast-ish). Falls back to None on failure."""
-    try:
-        with open(path, "rb") as f:
-            # Count newline bytes - memory efficient
-            count = 0
-            buf_size = 1024 * 1024
-            while True:
-                b = f.read(buf_size)
-                if not b:
-                    break
-                count += b.count(b"\n")
-        # subtract header (we assume 1 header line). If file ends without newline difference minimal.
-        return max(0, count - 1)
-    except Exception:
-        return None
+def compute_ghi_chunk(df_chunk, poa_cols_tuple):
+    """NaN-aware sum of the POA components present in ``df_chunk``."""
+    comps = []
+    present_mask = []
+    for col in poa_cols_tuple:
+        if col is not None and col in df_chunk.columns:
+            ser = pd.to_numeric(df_chunk[col], errors="coerce").to_numpy(dtype=float)
+            present = ~np.isnan(ser)
+            comps.append(np.where(present, ser, 0.0))
+            present_mask.append(present)
+    if not comps:
+        return np.full(len(df_chunk), np.nan)
+    ghi = np.sum(comps, axis=0)
+    ghi[~np.logical_or.reduce(present_mask)] = np.nan
+    return ghi
 
-def main():
-    _print_info("Starting GHI-only processing...")
-    if not os.path.exists(INPUT_PATH):
-        _print_err(f"Input file not found: {INPUT_PATH}")
-        sys.exit(1)
 
-    # Quick sanity: ensure it's a CSV (file extension check only)
-    if not INPUT_PATH.lower().endswith((".csv", ".txt")):
-        _print_warn(f"Input file does not have .csv extension. Attempting to read anyway. Path: {INPUT_PATH}")
+# ---------- input layout ----------
+
+def read_header(path):
+    """(column names, byte offset of the first data line)."""
+    with open(path, "rb") as f:
+        line = f.readline()
+    names = next(csv.reader([line.decode("utf-8-sig")]), [])
+    return [c.strip() for c in names], len(line)
 
-    total_rows = estimate_total_rows(INPUT_PATH)
-    if total_rows is None:
-        _print_warn("Could not estimate total rows. Progress will show chunks processed (no percent).")
+def plan_chunks(data_start, size, chunk_bytes):
+    """[start, end) byte ranges covering the data lines."""
+    bounds = list(range(data_start, size, chunk_bytes)) + [size]
+    return [[start, end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+def read_range(path, start, end, data_start):
+    """The lines that start in [start, end) (a line belongs to the range its first byte is in)."""
+    with open(path, "rb") as f:
+        if start > data_start:
+            # finish the line running into this range; it belongs to the previous one
+            f.seek(start - 1)
+            f.readline()
+        else:
+            f.seek(start)
+        pos = f.tell()
+        if pos >= end:
+            return b""
+        data = f.read(end - pos)
+        if data and not data.endswith(b"\n"):
+            data += f.readline()
+    return data
+
+def sample_schema(path, columns, usecols):
+    """Arrow schema for the output: columns numeric in the sample become float64
+    (later chunks may hold gaps), everything else string; GHI last."""
+    import pyarrow as pa
+
+    sample = pd.read_csv(path, nrows=SAMPLE_ROWS, low_memory=False)
+    sample.columns = [c.strip() for c in sample.columns]
+    fields = [
+        pa.field(c, pa.float64() if pd.api.types.is_numeric_dtype(sample[c]) else pa.string())
+        for c in columns if c in usecols
+    ]
+    return pa.schema(fields + [pa.field("GHI", pa.float64())])
+
+
+# ---------- worker ----------
+
+def process_range(task):
+    """Parse one byte range, add GHI and write it as a Parquet part. Returns
+    (chunk index, rows, bytes). Runs in a pool worker."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    index, start, end = task["index"], task["start"], task["end"]
+    data = read_range(task["input"], start, end, task["data_start"])
+    schema = pa.schema([pa.field(name, pa.type_for_alias(kind)) for name, kind in task["schema"]])
+    names = [f.name for f in schema if f.name != "GHI"]
+
+    if data:
+        df = pd.read_csv(
+            io.BytesIO(data), header=None, names=task["columns"], usecols=names,
+            dtype={c: str for c, kind in task["schema"] if kind == "string"}, low_memory=False,
+        )
     else:
-        _print_info(f"Estimated total data rows (excluding header): {total_rows:,}")
+        df = pd.DataFrame(columns=names)
+    for field in schema:
+        if field.name != "GHI" and pa.types.is_floating(field.type):
+            df[field.name] = pd.to_numeric(df[field.name], errors="coerce").astype("float64")
+    df["GHI"] = compute_ghi_chunk(df, task["poa_cols"])
+
+    table = pa.Table.from_pandas(df[[f.name for f in schema]], schema=schema, preserve_index=False)
+    part = os.path.join(task["parts_dir"], f"part-{index:06d}.parquet")
+    pq.write_table(table, part + ".tmp")
+    os.replace(part + ".tmp", part)  # a part only exists once it is complete
+    return index, table.num_rows, end - start
+
+
+# ---------- resume + reassembly ----------
 
-    # Remove existing output if any (we'll write fresh)
-    if os.path.exists(OUTPUT_PATH):
-        _print_warn(f"Output file {OUTPUT_PATH} exists and will be overwritten.")
+def open_parts_dir(parts_dir, manifest, fresh):
+    """Reuse ``parts_dir`` if it was started with the same manifest, else start it over."""
+    path = os.path.join(parts_dir, MANIFEST)
+    if not fresh and os.path.exists(path):
         try:
-            os.remove(OUTPUT_PATH)
-        except Exception as e:
-            _print_err(f"Could not remove existing output file: {e}")
-            sys.exit(1)
+            with open(path, "r", encoding="utf-8") as f:
+                if json.load(f) == manifest:
+                    return True
+        except (OSError, ValueError):
+            pass
+        _print_warn("Existing partial output was made from a different input or settings; starting over.")
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    os.makedirs(parts_dir)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    return False
 
-    # Read first chunk to detect columns and prepare header writing
-    _print_info("Reading first chunk to detect columns and POA component names...")
+def assemble(parts_dir, n_chunks, output_path, fmt, schema):
+    """Concatenate the parts in chunk order into one file, one part in memory at a time."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    tmp = output_path + ".tmp"
+    if fmt == "arrow":
+        writer = pa.ipc.new_file(tmp, schema)
+    else:
+        writer = pq.ParquetWriter(tmp, schema)
+    rows = 0
     try:
-        it = pd.read_csv(INPUT_PATH, chunksize=CHUNKSIZE, iterator=True, low_memory=False)
-    except Exception as e:
-        _print_err(f"Failed to open input as CSV: {e}")
+        for index in range(n_chunks):
+            table = pq.read_table(os.path.join(parts_dir, f"part-{index:06d}.parquet"), schema=schema)
+            if table.num_rows:
+                writer.write_table(table)
+            rows += table.num_rows
+    finally:
+        writer.close()
+    os.replace(tmp, output_path)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Add a GHI column to a state dataset CSV, in parallel")
+    parser.add_argument("--input", default=INPUT_PATH)
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--format", choices=("parquet", "arrow"), default="parquet")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--chunk-mb", type=float, default=CHUNK_MB)
+    parser.add_argument("--ghi-only", action="store_true", help="parse only the POA columns and write GHI alone")
+    parser.add_argument("--fresh", action="store_true", help="ignore partial output from an earlier run")
+    args = parser.parse_args(argv)
+
+    _print_info("Starting GHI-only processing...")
+    if not os.path.exists(args.input):
+        _print_err(f"Input file not found: {args.input}")
         sys.exit(1)
 
-    try:
-        first_chunk = next(it)
-    except StopIteration:
+    # Quick sanity: ensure it's a CSV (file extension check only)
+    if not args.input.lower().endswith((".csv", ".txt")):
+        _print_warn(f"Input file does not have .csv extension. Attempting to read anyway. Path: {args.input}")
+
+    columns, data_start = read_header(args.input)
+    if not columns:
         _print_err("Input CSV appears empty.")
         sys.exit(1)
-    except Exception as e:
-        _print_err(f"Error reading first chunk: {e}")
-        sys.exit(1)
-
-    # Normalize columns
-    first_chunk.columns = [c.strip() for c in first_chunk.columns]
-    poa_cols = detect_poa_columns(first_chunk.columns)
+    poa_cols = detect_poa_columns(columns)
     _print_info("Detected POA columns (or None):")
     _print_info(f"  poa_direct: {poa_cols[0]}")
     _print_info(f"  poa_diffuse: {poa_cols[1]}")
     _print_info(f"  poa_sky: {poa_cols[2]}")
     _print_info(f"  poa_ground: {poa_cols[3]}")
 
-    # Prepare output CSV header: same columns as input + GHI
-    out_columns = list(first_chunk.columns) + ["GHI"]
-    # Write header now (we will append chunks)
-    pd.DataFrame(columns=out_columns).to_csv(OUTPUT_PATH, index=False)
-
-    # Function to compute GHI for a dataframe chunk (vectorized)
-    def compute_ghi_chunk(df_chunk, poa_cols_tuple):
-        # ensure columns cleaned
-        df_chunk.columns = [c.strip() for c in df_chunk.columns]
-        # prepare components
-        comps = []
-        present_mask = []
-        for col in poa_cols_tuple:
-            if col is not None and col in df_chunk.columns:
-                ser = pd.to_numeric(df_chunk[col], errors="coerce")
-                comps.append(ser.fillna(0.0))
-                present_mask.append(~ser.isna())
-            else:
-                comps.append(pd.Series(0.0, index=df_chunk.index))
-                present_mask.append(pd.Series(False, index=df_chunk.index))
-        ghi = comps[0] + comps[1] + comps[2] + comps[3]
-        any_present = present_mask[0] | present_mask[1] | present_mask[2] | present_mask[3]
-        ghi.loc[~any_present] = np.nan
-        return ghi
-
-    # Process the first chunk and then subsequent chunks with progress bar
-    processed = 0
-    # Compute GHI for first chunk
-    _print_info("Processing chunks and writing output with progress bar...")
-    first_chunk["GHI"] = compute_ghi_chunk(first_chunk, poa_cols)
-    # Append to output
-    first_chunk.to_csv(OUTPUT_PATH, mode="a", index=False, header=False)
-    processed += len(first_chunk)
-
-    # If we have an estimated total, initialize tqdm with total_rows; else leave total=None
-    pbar = tqdm(total=total_rows if total_rows else None, unit="rows", desc="Rows processed", ncols=100)
-    pbar.update(len(first_chunk))
-
-    # Iterate remaining chunks
-    for chunk in it:
-        chunk.columns = [c.strip() for c in chunk.columns]
-        chunk["GHI"] = compute_ghi_chunk(chunk, poa_cols)
-        chunk.to_csv(OUTPUT_PATH, mode="a", index=False, header=False)
-        processed += len(chunk)
-        pbar.update(len(chunk))
+    usecols = [c for c in poa_cols if c is not None] if args.ghi_only else columns
+    try:
+        schema = sample_schema(args.input, columns, usecols)
+    except Exception as e:
+        _print_err(f"Failed to read input as CSV: {e}")
+        sys.exit(1)
 
+    stat = os.stat(args.input)
+    chunks = plan_chunks(data_start, stat.st_size, max(1, int(args.chunk_mb * 1024 * 1024)))
+    parts_dir = args.output + ".parts"
+    manifest = {
+        "input": os.path.abspath(args.input),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "chunks": chunks,
+        "schema": [[f.name, str(f.type)] for f in schema],
+    }
+    resumed = open_parts_dir(parts_dir, manifest, args.fresh)
+    done = {
+        i for i in range(len(chunks))
+        if os.path.exists(os.path.join(parts_dir, f"part-{i:06d}.parquet"))
+    }
+    if resumed and done:
+        _print_info(f"Resuming: {len(done)} of {len(chunks)} chunks already done.")
+
+    tasks = [
+        {
+            "index": i, "start": start, "end": end, "input": args.input, "data_start": data_start,
+            "columns": columns, "schema": manifest["schema"], "poa_cols": poa_cols, "parts_dir": parts_dir,
+        }
+        for i, (start, end) in enumerate(chunks) if i not in done
+    ]
+
+    _print_info(f"Processing {len(chunks)} chunks of ~{args.chunk_mb:g} MB on {args.workers} workers...")
+    pbar = tqdm(total=stat.st_size, initial=data_start + sum(chunks[i][1] - chunks[i][0] for i in done),
+                unit="B", unit_scale=True, desc="Input processed", ncols=100)
+    processed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        pending = set()
+        queue = iter(tasks)
+        # a couple of tasks per worker in flight keeps every core busy without queueing the whole file
+        for task in queue:
+            pending.add(pool.submit(process_range, task))
+            if len(pending) >= 2 * args.workers:
+                break
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                _, rows, nbytes = future.result()
+                processed += rows
+                pbar.update(nbytes)
+                task = next(queue, None)
+                if task is not None:
+                    pending.add(pool.submit(process_range, task))
     pbar.close()
-    _print_ok(f"Finished. Processed {processed:,} rows. Output saved to: {OUTPUT_PATH}")
 
-    # Quick stats summary
+    _print_info(f"Reassembling {len(chunks)} parts in input order...")
+    total = assemble(parts_dir, len(chunks), args.output, args.format, schema)
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    _print_ok(f"Finished. Processed {processed:,} rows this run, {total:,} in total. Output saved to: {args.output}")
+
+    # Quick stats summary (NaN GHI is stored as null)
     try:
-        out_df_sample = pd.read_csv(OUTPUT_PATH, nrows=1000)
-        nan_ghi_sample = out_df_sample["GHI"].isna().sum()
-        _print_info(f"Sample check (first 1000 rows): GHI NaNs = {nan_ghi_sample}")
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if args.format == "arrow":
+            with pa.ipc.open_file(args.output) as reader:
+                head = reader.get_batch(0).column("GHI")[:1000]
+        else:
+            head = next(pq.ParquetFile(args.output).iter_batches(batch_size=1000, columns=["GHI"])).column(0)
+        _print_info(f"Sample check (first {len(head)} rows): GHI NaNs = {head.null_count}")
     except Exception:
         pass
 
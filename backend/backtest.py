@@ -0,0 +1,385 @@
+"""Backtest the deployed regional models against the historical dataset.
+
+Historical hours from the dataset store (dataset_store.py) are turned into
+the serving feature layout -- [poa_ground_reflected, solar_elev,
+temperature, wind_speed, lat, lon], as in prepare_features -- and scored
+with the same model files and scaler the server loads (model_io), in
+large vectorized batches. Each city-year partition is one task on a
+process pool; every worker keeps its own ModelRegistry and a share of the
+CPU threads.
+
+Tasks don't keep residuals, only mergeable error sums (n, Σ|e|, Σe², Σy,
+Σy²) per month and per hour of day. Summing them gives MAE/RMSE/R² at any
+level: per model, per city, per month, per hour of day. Finished tasks are
+saved under ``<out>/parts/`` together with the model version and the
+partition's row count, so an interrupted or repeated run only scores what
+is missing or out of date.
+
+Outputs, per model, in ``<out>/<model>/``: by_city.csv, by_month.csv,
+by_hour.csv and summary.json. The totals are also written to the
+``"backtest"`` section of ``models/<model>/metrics.json`` (the training
+metrics are left as they are) unless ``--no-write-metrics`` is given.
+
+Usage (from backend/):
+    python dataset_store.py build ../AI_RES_models/Dataset.zip   # once
+    python backtest.py [--models hassan,karwar] [--cities A,B] [--start 2015-01-01]
+                       [--end 2020-01-01] [--workers N] [--out backtest_results]
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from dataset_store import DEFAULT_ROOT, TIME_COLUMN, DatasetStore, column_to_numpy
+from ephemeris import compute_solar_elevation_array
+
+logger = logging.getLogger("solarc.backtest")
+
+BASE_DIR = Path(__file__).parent
+DEFAULT_OUT = BASE_DIR / "backtest_results"
+BATCH_ROWS = 262_144
+ALBEDO = 0.2
+
+# Historical column names, matched case-insensitively in this order
+COLUMN_CANDIDATES = {
+    "direct": ("poa_direct", "direct_radiation", "poa direct", "direct"),
+    "diffuse": ("poa_diffuse", "diffuse_radiation", "poa diffuse", "diffuse"),
+    "temperature": ("temperature", "temperature_2m", "temp_air", "temp", "t2m"),
+    "wind_speed": ("wind_speed", "wind_speed_10m", "windspeed", "ws10m"),
+    "target": ("p", "power", "p_mp", "target"),
+    "lat": ("lat", "latitude"),
+    "lon": ("lon", "longitude"),
+}
+
+# n, Σ|e|, Σe², Σy, Σy²
+N_SUMS = 5
+
+
+def resolve_columns(columns: Sequence[str]) -> Dict[str, Optional[str]]:
+    lower = {c.lower(): c for c in columns}
+    found = {
+        role: next((lower[c] for c in candidates if c in lower), None)
+        for role, candidates in COLUMN_CANDIDATES.items()
+    }
+    missing = [r for r in ("direct", "diffuse", "temperature", "wind_speed", "target") if found[r] is None]
+    if missing:
+        raise KeyError(f"Dataset has no column for {missing} (columns: {list(columns)})")
+    return found
+
+
+def historical_features(data: Dict[str, np.ndarray], roles: Dict[str, Optional[str]],
+                        lat: float, lon: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(features, target, valid) for historical rows. Timestamps are treated
+    as UTC, as prepare_features does with Open-Meteo times."""
+    n = len(data[TIME_COLUMN])
+    lats = data[roles["lat"]] if roles["lat"] else np.full(n, lat)
+    lons = data[roles["lon"]] if roles["lon"] else np.full(n, lon)
+    poa_direct = data[roles["direct"]]
+    poa_diffuse = data[roles["diffuse"]]
+    solar_elev = compute_solar_elevation_array(lats, lons, data[TIME_COLUMN])
+    features = np.column_stack([
+        (poa_direct + poa_diffuse) * ALBEDO,
+        solar_elev,
+        data[roles["temperature"]],
+        data[roles["wind_speed"]],
+        lats,
+        lons,
+    ])
+    target = data[roles["target"]]
+    valid = np.isfinite(features).all(axis=1) & np.isfinite(target)
+    return features, target, valid
+
+
+def error_sums(groups: np.ndarray, n_groups: int, y: np.ndarray, pred: np.ndarray) -> np.ndarray:
+    """(n_groups, N_SUMS) error sums of ``pred`` against ``y`` per group id."""
+    err = pred - y
+    out = np.empty((n_groups, N_SUMS))
+    for i, weights in enumerate((None, np.abs(err), err * err, y, y * y)):
+        out[:, i] = np.bincount(groups, weights=weights, minlength=n_groups)
+    return out
+
+
+def metrics_from_sums(sums: Sequence[float]) -> Dict[str, Any]:
+    n, abs_err, sq_err, sum_y, sum_y2 = (float(v) for v in sums)
+    if n == 0:
+        return {"rows": 0, "mae": None, "rmse": None, "r2": None}
+    total = sum_y2 - sum_y * sum_y / n
+    return {
+        "rows": int(n),
+        "mae": abs_err / n,
+        "rmse": (sq_err / n) ** 0.5,
+        "r2": 1.0 - sq_err / total if total > 0 else None,
+    }
+
+
+# ---------- worker ----------
+
+_REGISTRY = None
+
+
+def _init_worker(threads: int):
+    global _REGISTRY
+    import xgboost as xgb
+    from model_io import ModelRegistry
+
+    xgb.set_config(nthread=threads)
+    _REGISTRY = ModelRegistry(max_models=2)
+
+
+def run_task(task: Dict[str, Any]) -> Dict[str, Any]:
+    """Score one city-year partition; returns its error sums by month and hour."""
+    from inference import score
+
+    started = time.perf_counter()
+    store = DatasetStore(task["root"])
+    roles = task["roles"]
+    columns = sorted({c for c in roles.values() if c})
+    partition = next(p for p in store.partitions if p["city"] == task["city"] and p["year"] == task["year"])
+    table = store.read(partition, columns, task["start"], task["end"])
+    data = {name: column_to_numpy(table.column(name)) for name in table.column_names}
+
+    features, target, valid = historical_features(data, roles, task["lat"], task["lon"])
+    if task["daylight_only"]:
+        valid &= data[roles["direct"]] > 10
+    times = data[TIME_COLUMN][valid]
+    features, target = features[valid], target[valid]
+
+    model, scaler = _REGISTRY.get(task["model"])
+    pred = np.empty(len(target))
+    for start in range(0, len(target), BATCH_ROWS):
+        stop = start + BATCH_ROWS
+        pred[start:stop] = score(model, scaler, features[start:stop])
+
+    month = times.astype("datetime64[M]").astype(np.int64) % 12
+    hour = (times.astype("datetime64[h]").astype(np.int64)) % 24
+    return {
+        **{k: task[k] for k in ("model", "city", "year", "key")},
+        "rows": int(len(table)),
+        "scored": int(len(target)),
+        "by_month": error_sums(month, 12, target, pred).tolist(),
+        "by_hour": error_sums(hour, 24, target, pred).tolist(),
+        "seconds": time.perf_counter() - started,
+    }
+
+
+# ---------- driver ----------
+
+def _part_path(out: Path, result: Dict[str, Any]) -> Path:
+    return out / "parts" / result["model"] / result["city"] / f"{result['year']}.json"
+
+
+def _load_part(path: Path, key: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            part = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return part if part.get("key") == key else None
+
+
+def _write_json(path: Path, payload: Any):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp, path)
+
+
+def assign_partition(city: str, city_assignments: Dict[str, dict],
+                     roles: Dict[str, Optional[str]]) -> Optional[Tuple[str, float, float]]:
+    """(model, lat, lon) for a dataset city, or None when it can't be scored.
+
+    Cities come from city_mapping.json; a partition named after a region
+    (e.g. one training CSV per model) belongs to that region's model.
+    lat/lon are NaN when the rows carry their own coordinates.
+    """
+    from model_io import find_model_folder
+
+    info = city_assignments.get(city)
+    if info is None:
+        model = city.lower() if find_model_folder(city.lower()) else None
+        lat = lon = np.nan
+    else:
+        model, lat, lon = info["model"], float(info["lat"]), float(info["lon"])
+    if model is None:
+        return None
+    if (roles["lat"] is None or roles["lon"] is None) and not np.isfinite(lat):
+        logger.warning("⚠️ Skipping '%s': no coordinates in the data or city_mapping.json", city)
+        return None
+    return model, lat, lon
+
+
+def plan_tasks(store: DatasetStore, city_assignments: Dict[str, dict], models: Optional[Iterable[str]],
+               cities: Optional[Iterable[str]], start: Optional[str], end: Optional[str],
+               daylight_only: bool) -> List[Dict[str, Any]]:
+    from model_io import model_version
+
+    roles = resolve_columns(store.columns)
+    wanted_models = set(models) if models else None
+    tasks = []
+    for p in store.select(cities, start, end):
+        assigned = assign_partition(p["city"], city_assignments, roles)
+        if assigned is None or (wanted_models is not None and assigned[0] not in wanted_models):
+            continue
+        model, lat, lon = assigned
+        key = {
+            "model_version": [list(v) for v in model_version(model)],
+            "rows": p["rows"], "start": start, "end": end, "daylight_only": daylight_only,
+        }
+        tasks.append({
+            "root": str(store.root), "model": model, "city": p["city"], "year": p["year"],
+            "lat": lat, "lon": lon, "roles": roles, "start": start, "end": end,
+            "daylight_only": daylight_only, "key": key,
+        })
+    return tasks
+
+
+def _write_breakdown(path: Path, header: Sequence[str], rows: Iterable[Tuple[Any, Sequence[float]]]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(list(header) + ["rows", "mae", "rmse", "r2"])
+        for label, sums in rows:
+            m = metrics_from_sums(sums)
+            writer.writerow(list(label) + [m["rows"], m["mae"], m["rmse"], m["r2"]])
+
+
+def write_reports(out: Path, results: List[Dict[str, Any]], write_metrics: bool,
+                  throughput: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    from model_io import find_model_folder
+
+    # fixed order so repeated runs sum to the same floats
+    results = sorted(results, key=lambda r: (r["model"], r["city"], r["year"]))
+    summaries = {}
+    for model in sorted({r["model"] for r in results}):
+        mine = [r for r in results if r["model"] == model]
+        by_month = {}
+        by_city = {}
+        by_hour = np.zeros((24, N_SUMS))
+        for r in mine:
+            months = np.asarray(r["by_month"])
+            for m in range(12):
+                if months[m, 0]:
+                    key = (r["city"], r["year"], m + 1)
+                    by_month[key] = by_month.get(key, 0) + months[m]
+            by_city[r["city"]] = by_city.get(r["city"], 0) + months.sum(axis=0)
+            by_hour += np.asarray(r["by_hour"])
+
+        _write_breakdown(out / model / "by_city.csv", ["city"], (((c,), s) for c, s in sorted(by_city.items())))
+        _write_breakdown(out / model / "by_month.csv", ["city", "year", "month"], sorted(by_month.items()))
+        _write_breakdown(out / model / "by_hour.csv", ["hour_utc"], (((h,), by_hour[h]) for h in range(24)))
+
+        summary = {
+            **metrics_from_sums(by_hour.sum(axis=0)),
+            "cities": len(by_city),
+            "rows_read": sum(r["rows"] for r in mine),
+            "daylight_only": mine[0]["key"]["daylight_only"],
+            "start": mine[0]["key"]["start"],
+            "end": mine[0]["key"]["end"],
+            "completed_at": datetime.now().isoformat(),
+        }
+        _write_json(out / model / "summary.json", {**summary, "throughput": throughput})
+        summaries[model] = summary
+
+        folder = find_model_folder(model)
+        if write_metrics and folder is not None:
+            path = folder / "metrics.json"
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    metrics = json.load(f)
+            except (OSError, ValueError):
+                metrics = {"location": model}
+            metrics["backtest"] = summary
+            _write_json(path, metrics)
+    return summaries
+
+
+def run_backtest(store: DatasetStore, city_assignments: Dict[str, dict], out: Path = DEFAULT_OUT,
+                 models: Optional[Iterable[str]] = None, cities: Optional[Iterable[str]] = None,
+                 start: Optional[str] = None, end: Optional[str] = None, workers: Optional[int] = None,
+                 daylight_only: bool = False, write_metrics: bool = True) -> Dict[str, Any]:
+    out = Path(out)
+    workers = workers or os.cpu_count() or 1
+    tasks = plan_tasks(store, city_assignments, models, cities, start, end, daylight_only)
+
+    results, todo = [], []
+    for task in tasks:
+        part = _load_part(_part_path(out, task), task["key"])
+        (results if part is not None else todo).append(part if part is not None else task)
+    if results:
+        logger.info("♻️ Reusing %d of %d finished partitions", len(results), len(tasks))
+
+    started = time.perf_counter()
+    scored = 0
+    if todo:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(threads,)) as pool:
+            # largest partitions first so one big year doesn't finish last
+            todo.sort(key=lambda t: -t["key"]["rows"])
+            futures = [pool.submit(run_task, task) for task in todo]
+            for done, future in enumerate(as_completed(futures), 1):
+                result = future.result()
+                _write_json(_part_path(out, result), result)
+                results.append(result)
+                scored += result["scored"]
+                elapsed = time.perf_counter() - started
+                logger.info("📈 [%d/%d] %s %s %d: %d rows in %.1fs (%.0f rows/s overall)",
+                            done, len(todo), result["model"], result["city"], result["year"],
+                            result["scored"], result["seconds"], scored / elapsed if elapsed else 0.0)
+    elapsed = time.perf_counter() - started
+    throughput = {
+        "rows_scored": scored,
+        "seconds": round(elapsed, 3),
+        "rows_per_s": round(scored / elapsed, 1) if elapsed and scored else None,
+        "workers": workers,
+        "tasks_run": len(todo),
+        "tasks_reused": len(tasks) - len(todo),
+    }
+    summaries = write_reports(out, results, write_metrics, throughput) if results else {}
+    return {"models": summaries, "throughput": throughput}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest the deployed models on historical data")
+    parser.add_argument("--store", type=Path, default=DEFAULT_ROOT)
+    parser.add_argument("--out", type=Path, default=DEFAULT_OUT)
+    parser.add_argument("--models", help="comma-separated model names (default: all)")
+    parser.add_argument("--cities", help="comma-separated cities (default: all)")
+    parser.add_argument("--start", help="first timestamp (inclusive)")
+    parser.add_argument("--end", help="last timestamp (exclusive)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--daylight-only", action="store_true", help="score only hours the server would (poa_direct > 10)")
+    parser.add_argument("--no-write-metrics", action="store_true", help="leave models/*/metrics.json untouched")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    with open(BASE_DIR / "city_mapping.json", "r", encoding="utf-8") as f:
+        city_assignments = json.load(f)
+    split = lambda value: [v.strip() for v in value.split(",") if v.strip()] if value else None
+
+    report = run_backtest(
+        DatasetStore(args.store), city_assignments, args.out,
+        models=split(args.models), cities=split(args.cities), start=args.start, end=args.end,
+        workers=args.workers, daylight_only=args.daylight_only, write_metrics=not args.no_write_metrics,
+    )
+    for model, summary in report["models"].items():
+        if not summary["rows"]:
+            print(f"⚠️ {model}: no rows scored")
+            continue
+        r2 = "n/a" if summary["r2"] is None else f"{summary['r2']:.4f}"
+        print(f"✅ {model}: MAE {summary['mae']:.2f}  RMSE {summary['rmse']:.2f}  R² {r2}  ({summary['rows']:,} rows)")
+    t = report["throughput"]
+    print(f"⏱️ {t['rows_scored']:,} rows in {t['seconds']}s"
+          + (f" ({t['rows_per_s']:,.0f} rows/s on {t['workers']} workers)" if t["rows_per_s"] else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Dynamic micro-batching of scoring work per model.
+
+Concurrent score requests for the same model are queued and flushed as one
+stacked matrix when the batch reaches ``max_batch_size`` requests or the
+oldest request has waited ``max_wait`` seconds. The batch goes through the
+InferenceExecutor as a single booster call and the predictions are scattered
+back to the waiting callers.
+
+A batch is a single job to the executor, so its backpressure would bound
+batches, not requests. The batcher therefore applies ``max_pending`` itself
+to requests queued here or in a running batch and rejects further ones with
+ExecutorSaturated.
+"""
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from inference import ExecutorSaturated, InferenceExecutor
+from metrics import REGISTRY
+
+BATCH_SIZE = REGISTRY.histogram(
+    "solarc_inference_batch_size",
+    "Requests merged into one booster call",
+    ("model",),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+BATCH_ROWS = REGISTRY.histogram(
+    "solarc_inference_batch_rows",
+    "Feature rows scored in one booster call",
+    ("model",),
+    buckets=(1, 24, 96, 384, 1536, 6144),
+)
+
+
+class _Pending:
+    __slots__ = ("features", "future", "submitted")
+
+    def __init__(self, features: np.ndarray, future: asyncio.Future):
+        self.features = features
+        self.future = future
+        self.submitted = time.perf_counter()
+
+
+class MicroBatcher:
+    def __init__(self, executor: InferenceExecutor, max_batch_size: int = 32, max_wait: float = 0.002,
+                 max_pending: Optional[int] = None):
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        # requests queued or in a running batch; defaults to the executor's bound
+        self.max_pending = executor.max_pending if max_pending is None else max_pending
+
+        self._queues: Dict[str, List[_Pending]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        # strong references, so a running batch isn't garbage-collected
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.pending = 0
+        self.rejected = 0
+
+    async def predict(self, model_name: str, features: np.ndarray) -> Tuple[np.ndarray, Dict[str, float]]:
+        """Same contract as InferenceExecutor.predict, plus a "batch_wait" timing."""
+        if self.max_wait <= 0 or self.max_batch_size <= 1:
+            P, timing = await self.executor.predict(model_name, features)
+            self._observe(model_name, 1, len(features))
+            return P, {"batch_wait": 0.0, **timing}
+
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise ExecutorSaturated(self.pending, self.executor.retry_after)
+
+        loop = asyncio.get_running_loop()
+        item = _Pending(features, loop.create_future())
+        self.pending += 1
+        queue = self._queues.setdefault(model_name, [])
+        queue.append(item)
+
+        if len(queue) >= self.max_batch_size:
+            self._flush(model_name)
+        elif model_name not in self._timers:
+            self._timers[model_name] = loop.call_later(self.max_wait, self._flush, model_name)
+
+        return await item.future
+
+    def _flush(self, model_name: str):
+        timer = self._timers.pop(model_name, None)
+        if timer is not None:
+            timer.cancel()
+        queued = self._queues.pop(model_name, [])
+        batch = [item for item in queued if not item.future.done()]
+        self.pending -= len(queued) - len(batch)  # callers that gave up while queued
+        if batch:
+            task = asyncio.ensure_future(self._run(model_name, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, model_name: str, batch: List[_Pending]):
+        flushed = time.perf_counter()
+        sizes = [len(item.features) for item in batch]
+        self._observe(model_name, len(batch), sum(sizes))
+        try:
+            P, timing = await self.executor.predict(model_name, np.vstack([item.features for item in batch]))
+        except Exception as e:
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+        finally:
+            self.pending -= len(batch)
+
+        offsets = np.cumsum(sizes)[:-1]
+        for item, part in zip(batch, np.split(P, offsets)):
+            if not item.future.done():
+                item.future.set_result((part, {"batch_wait": flushed - item.submitted, **timing}))
+
+    def _observe(self, model_name: str, requests: int, rows: int):
+        BATCH_SIZE.observe(requests, model=model_name)
+        BATCH_ROWS.observe(rows, model=model_name)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+            "batch_size": {s["model"]: BATCH_SIZE.snapshot(**s) for s in BATCH_SIZE.label_sets()},
+            "batch_rows": {s["model"]: BATCH_ROWS.snapshot(**s) for s in BATCH_ROWS.label_sets()},
+        }
@@ -0,0 +1,82 @@
+"""Cold-start benchmark: legacy model folders vs packed model bundles.
+
+Each trial runs in a fresh interpreter and measures, for one region:
+  import   - importing model_io, numpy and xgboost (needed by both formats)
+  load     - load_model_for(name) in the chosen format, including any extra
+             imports it pulls in (joblib/sklearn for the legacy scaler)
+  first    - first scaler.transform + predict on one feature row
+  total    - wall time from interpreter start of the trial to first prediction
+
+Usage (from backend/):
+    python model_bundle.py                      # build bundles first
+    python benchmarks/cold_start.py [--model hassan] [--trials 5] [--json out.json]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+TRIAL = r"""
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {backend!r})
+import numpy as np
+import xgboost
+import model_io
+t1 = time.perf_counter()
+model, scaler = model_io.load_model_for({name!r}, {fmt!r})
+t2 = time.perf_counter()
+X = np.array([[120.0, 45.0, 28.0, 3.5, 13.0, 76.1]])
+model.predict(scaler.transform(X))
+t3 = time.perf_counter()
+print(json.dumps({{"import": t1 - t0, "load": t2 - t1, "first": t3 - t2, "total": t3 - t0}}))
+"""
+
+
+def run_trial(name: str, fmt: str) -> dict:
+    code = TRIAL.format(backend=str(BACKEND_DIR), name=name, fmt=fmt)
+    out = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", code],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def summarize(trials):
+    return {
+        stage: {
+            "median_ms": round(1000 * statistics.median(t[stage] for t in trials), 2),
+            "min_ms": round(1000 * min(t[stage] for t in trials), 2),
+        }
+        for stage in ("import", "load", "first", "total")
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="hassan")
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    for fmt in ("legacy", "bundle"):
+        trials = [run_trial(args.model, fmt) for _ in range(args.trials)]
+        results[fmt] = summarize(trials)
+
+    print(f"Cold start for '{args.model}' ({args.trials} trials, median ms)")
+    print(f"{'format':<8} {'import':>9} {'load':>9} {'first':>9} {'total':>9}")
+    for fmt, stages in results.items():
+        print(f"{fmt:<8} " + " ".join(f"{stages[s]['median_ms']:>9.1f}" for s in ("import", "load", "first", "total")))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"model": args.model, "trials": args.trials, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
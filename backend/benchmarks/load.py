@@ -0,0 +1,197 @@
+"""End-to-end load test for POST /predict-energy against a mock Open-Meteo.
+
+Starts the mock weather server in-process and the API under uvicorn in a
+subprocess (pointed at the mock through OPEN_METEO_URL), then drives each
+scenario with ``--concurrency`` closed-loop clients and reports req/s and
+p50/p95/p99 latency. Cities are cycled so requests spread over the models
+and weather cache entries.
+
+The API is started with the background precompute off, so every run
+measures request handling alone: cached runs fill the weather and forecast
+caches through their own (warm-up) requests. ``--uncached`` also turns both
+caches off, so every request fetches from the mock upstream and is scored.
+
+Scenarios: realtime, 7day, monthly, wind.
+
+Usage (from backend/):
+    python benchmarks/load.py [--scenarios realtime,monthly] [--concurrency 16]
+                              [--requests 500] [--uncached] [--synthetic] [--json out.json]
+    python benchmarks/load.py --target http://127.0.0.1:8000   # already running API
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(BENCH_DIR))
+
+import httpx  # noqa: E402
+import numpy as np  # noqa: E402
+
+from mock_openmeteo import MissingFixtures, MockOpenMeteo  # noqa: E402
+
+SCENARIOS = {
+    "realtime": {"mode": "realtime", "area": 10.0},
+    "7day": {"mode": "7day", "area": 10.0},
+    "monthly": {"mode": "monthly", "area": 10.0},
+    "wind": {"mode": "wind", "area": 1.0, "num_turbines": 5, "rotor_diameter": 90, "hub_height": 100},
+}
+
+
+def benchmark_cities(limit: int = 32) -> List[str]:
+    with open(BACKEND_DIR / "city_mapping.json", "r", encoding="utf-8") as f:
+        return sorted(json.load(f))[:limit]
+
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    ms = np.asarray(latencies) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "max_ms": round(float(ms.max()), 2),
+    }
+
+
+async def run_scenario(client: httpx.AsyncClient, body: dict, cities: List[str],
+                       concurrency: int, total: int, warmup: int) -> Dict[str, object]:
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+
+    async def worker():
+        for i in counter:
+            payload = dict(body, city=cities[i % len(cities)])
+            start = time.perf_counter()
+            try:
+                resp = await client.post("/predict-energy", json=payload)
+                status = str(resp.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+            if status == "200":
+                latencies.append(elapsed)
+            else:
+                errors[status] = errors.get(status, 0) + 1
+
+    # warm up sequentially so model loads and first weather fetches aren't timed
+    for i in range(warmup):
+        await client.post("/predict-energy", json=dict(body, city=cities[i % len(cities)]))
+
+    counter = iter(range(total))
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+
+    result: Dict[str, object] = {
+        "requests": total,
+        "ok": len(latencies),
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "req_per_s": round(len(latencies) / wall, 1) if wall else 0.0,
+    }
+    if latencies:
+        result.update(percentiles(latencies))
+    return result
+
+
+async def run_all(base_url: str, scenarios: List[str], concurrency: int, total: int,
+                  warmup: int) -> Dict[str, Dict[str, object]]:
+    cities = benchmark_cities()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        results = {}
+        for name in scenarios:
+            results[name] = await run_scenario(client, SCENARIOS[name], cities, concurrency, total, warmup)
+            r = results[name]
+            print(f"{name:<9} {r['req_per_s']:>9.1f} req/s  "
+                  f"p50 {r.get('p50_ms', 0):>8.2f}  p95 {r.get('p95_ms', 0):>8.2f}  "
+                  f"p99 {r.get('p99_ms', 0):>8.2f} ms  errors {sum(r['errors'].values())}")
+        return results
+
+
+def start_api(port: int, weather_url: str, extra_env: Dict[str, str]) -> subprocess.Popen:
+    # no background precompute: it would add load to, and serve, the timed requests
+    env = dict(os.environ, OPEN_METEO_URL=weather_url, LOG_LEVEL="WARNING", PRECOMPUTE_INTERVAL="0", **extra_env)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"API exited with code {proc.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("API did not become healthy within 60s")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500, help="timed requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--upstream-latency-ms", type=float, default=0.0)
+    parser.add_argument("--uncached", "--no-weather-cache", dest="uncached", action="store_true",
+                        help="turn off the weather and forecast caches: every request goes to the mock upstream")
+    parser.add_argument("--synthetic", action="store_true", help="mock serves synthetic weather instead of the fixtures")
+    parser.add_argument("--target", help="benchmark an already running API instead of starting one")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args(argv)
+
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    extra_env = {"WEATHER_CACHE_MAX_ENTRIES": "0", "FORECAST_CACHE_MAX_ENTRIES": "0"} if args.uncached else {}
+    config = {
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "warmup": args.warmup,
+        "upstream_latency_ms": args.upstream_latency_ms,
+        "caches": not args.uncached,
+        "precompute": None if args.target else False,  # unknown for --target
+    }
+
+    try:
+        mock = MockOpenMeteo(latency=args.upstream_latency_ms / 1000, synthetic=args.synthetic)
+    except MissingFixtures as e:
+        parser.error(str(e))
+
+    with mock:
+        config["weather"] = mock.source
+        proc = None
+        base_url = args.target
+        if base_url is None:
+            proc = start_api(args.port, mock.url, extra_env)
+            base_url = f"http://127.0.0.1:{args.port}"
+        try:
+            results = asyncio.run(run_all(base_url, scenarios, args.concurrency, args.requests, args.warmup))
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.wait(timeout=10)
+        config["upstream_calls"] = mock.requests
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"config": config, "results": results}, f, indent=2)
+    return {"config": config, "results": results}
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Micro-benchmarks for the per-request hot path.
+
+Times, on the mock Open-Meteo payloads:
+  compute_solar_elevation         scalar, one hour
+  compute_solar_elevation_array   vectorized, whole horizon
+  ephemeris.solar_elevation       tabulated lookup, whole horizon
+  prepare_features                scalar, one hour
+  prepare_features_batch          vectorized, whole horizon
+  predict                         XGBBoosterWrapper.predict on 1 / 24 / 384 rows
+
+Usage (from backend/):
+    python benchmarks/micro.py [--model hassan] [--repeat 5] [--synthetic] [--json out.json]
+"""
+import argparse
+import json
+import statistics
+import sys
+import timeit
+from pathlib import Path
+from typing import Callable, Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import numpy as np  # noqa: E402
+
+from mock_openmeteo import MissingFixtures, load_payloads  # noqa: E402
+
+
+def measure(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """Per-call time in microseconds: median and min over ``repeat`` timed runs."""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    runs = [t / number * 1e6 for t in timer.repeat(repeat=repeat, number=number)]
+    return {"median_us": round(statistics.median(runs), 3), "min_us": round(min(runs), 3), "loops": number}
+
+
+def run(model_name: str = "hassan", repeat: int = 5, synthetic: bool = False) -> Dict[str, Dict[str, float]]:
+    import app
+    from model_io import load_model_for
+
+    city = next(info for info in app.CITY_ASSIGNMENTS.values() if info["model"] == model_name)
+    lat, lon = float(city["lat"]), float(city["lon"])
+    payloads = load_payloads(synthetic)
+    hourly_1d, hourly_16d = payloads[1]["hourly"], payloads[16]["hourly"]
+    dt = app.parse_openmeteo_time(hourly_1d["time"][12])
+    times_16d = app.parse_openmeteo_times(hourly_16d["time"])
+
+    app.load_ephemeris()  # as at server startup; feature prep reads the table
+    model, scaler = load_model_for(model_name)
+    features, _, valid = app.prepare_features_batch(hourly_16d, lat, lon)
+    rows = scaler.transform(features[valid])
+
+    cases: Dict[str, Callable[[], object]] = {
+        "compute_solar_elevation": lambda: app.compute_solar_elevation(lat, lon, dt),
+        "compute_solar_elevation_array[384h]": lambda: app.compute_solar_elevation_array(lat, lon, times_16d),
+        "ephemeris.solar_elevation[384h]": lambda: app.EPHEMERIS.solar_elevation(lat, lon, times_16d),
+        "prepare_features": lambda: app.prepare_features(hourly_1d, lat, lon, 12),
+        "prepare_features_batch[24h]": lambda: app.prepare_features_batch(hourly_1d, lat, lon),
+        "prepare_features_batch[384h]": lambda: app.prepare_features_batch(hourly_16d, lat, lon),
+    }
+    for n in (1, 24, 384):
+        batch = np.resize(rows, (n, rows.shape[1]))
+        cases[f"predict[{n} rows]"] = lambda batch=batch: model.predict(batch)
+
+    return {name: measure(fn, repeat) for name, fn in cases.items()}
+
+
+def print_table(results: Dict[str, Dict[str, float]]):
+    width = max(len(name) for name in results)
+    print(f"{'benchmark':<{width}} {'median µs':>12} {'min µs':>12}")
+    for name, r in results.items():
+        print(f"{name:<{width}} {r['median_us']:>12.2f} {r['min_us']:>12.2f}")
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="hassan")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--synthetic", action="store_true", help="synthetic weather instead of the fixtures")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args(argv)
+
+    try:
+        results = run(args.model, args.repeat, args.synthetic)
+    except MissingFixtures as e:
+        parser.error(str(e))
+    print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"model": args.model, "repeat": args.repeat,
+                       "weather": "synthetic" if args.synthetic else "recorded", "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""Local stand-in for the Open-Meteo forecast API.
+
+Serves ``GET /v1/forecast`` from recorded payloads so benchmarks never touch
+api.open-meteo.com. Payloads live in ``benchmarks/fixtures/forecast_<days>d.json``
+(1, 7 and 16 days) and are captured once with ``--record``. A missing
+fixture is an error: numbers measured on made-up weather aren't comparable
+with recorded runs. ``--synthetic`` (here and in micro.py, load.py and
+run.py) explicitly substitutes a deterministic synthetic payload of the same
+shape, and the result files say which was used. Multi-location queries
+(comma-separated latitude/longitude) get a list back, like the real API,
+and ``past_days`` is answered by replaying the first recorded days before
+the forecast.
+
+Usage (from backend/):
+    python benchmarks/mock_openmeteo.py --record          # capture fixtures once
+    python benchmarks/mock_openmeteo.py --port 8765       # serve them
+    python benchmarks/mock_openmeteo.py --synthetic       # no fixtures: serve synthetic payloads
+    OPEN_METEO_URL=http://127.0.0.1:8765/v1/forecast uvicorn app:app
+"""
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+FORECAST_DAYS = (1, 7, 16)
+HOURLY_VARIABLES = (
+    "direct_radiation",
+    "diffuse_radiation",
+    "shortwave_radiation",
+    "temperature_2m",
+    "wind_speed_10m",
+)
+# Where --record samples the real API (Hassan)
+RECORD_LAT, RECORD_LON = 13.0, 76.1
+
+
+def fixture_path(days: int) -> Path:
+    return FIXTURES_DIR / f"forecast_{days}d.json"
+
+
+def synthetic_payload(days: int, seed: int = 0) -> dict:
+    """Open-Meteo shaped payload with a clear-sky-ish diurnal cycle and a few nulls."""
+    rng = np.random.default_rng(seed + days)
+    n = days * 24
+    start = datetime(2025, 3, 14)
+    hour = np.arange(n) % 24
+    sun = np.clip(np.sin((hour - 6) / 12 * np.pi), 0, None)
+    direct = (sun * 700 * rng.uniform(0.3, 1.0, n)).round(1)
+    diffuse = (sun * 150 * rng.uniform(0.5, 1.0, n)).round(1)
+    hourly = {
+        "time": [(start + timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M") for i in range(n)],
+        "direct_radiation": direct.tolist(),
+        "diffuse_radiation": diffuse.tolist(),
+        "shortwave_radiation": (direct + diffuse).round(1).tolist(),
+        "temperature_2m": (24 + 6 * sun + rng.normal(0, 1, n)).round(1).tolist(),
+        "wind_speed_10m": rng.uniform(0, 25, n).round(1).tolist(),
+    }
+    # upstream occasionally reports gaps; keep the null-handling paths exercised
+    for key, idx in (("direct_radiation", 30), ("temperature_2m", 36), ("wind_speed_10m", 60)):
+        if idx < n:
+            hourly[key][idx] = None
+    return {
+        "latitude": RECORD_LAT,
+        "longitude": RECORD_LON,
+        "timezone": "Asia/Kolkata",
+        "utc_offset_seconds": 19800,
+        "hourly_units": {"time": "iso8601"},
+        "hourly": hourly,
+    }
+
+
+class MissingFixtures(FileNotFoundError):
+    pass
+
+
+def load_payloads(synthetic: bool = False) -> Dict[int, dict]:
+    """Recorded payload per forecast horizon, or synthetic ones if ``synthetic``.
+
+    Raises MissingFixtures when a recording is missing and ``synthetic`` is off.
+    """
+    if synthetic:
+        return {days: synthetic_payload(days) for days in FORECAST_DAYS}
+    missing = [fixture_path(days) for days in FORECAST_DAYS if not fixture_path(days).exists()]
+    if missing:
+        raise MissingFixtures(
+            "Recorded Open-Meteo payloads not found: " + ", ".join(str(p) for p in missing)
+            + ". Capture them with `python benchmarks/mock_openmeteo.py --record`,"
+              " or pass --synthetic to benchmark on synthetic weather."
+        )
+    payloads = {}
+    for days in FORECAST_DAYS:
+        with open(fixture_path(days), "r", encoding="utf-8") as f:
+            payloads[days] = json.load(f)
+    return payloads
+
+
+def record(lat: float = RECORD_LAT, lon: float = RECORD_LON):
+    """Fetch one real payload per forecast horizon into fixtures/."""
+    import httpx
+
+    FIXTURES_DIR.mkdir(exist_ok=True)
+    for days in FORECAST_DAYS:
+        resp = httpx.get("https://api.open-meteo.com/v1/forecast", params={
+            "latitude": lat,
+            "longitude": lon,
+            "hourly": ",".join(HOURLY_VARIABLES),
+            "timezone": "auto",
+            "forecast_days": days,
+        }, timeout=30)
+        resp.raise_for_status()
+        with open(fixture_path(days), "w", encoding="utf-8") as f:
+            json.dump(resp.json(), f)
+        print(f"✅ Recorded {days}-day forecast -> {fixture_path(days)}")
+
+
+def _with_past_days(hourly: dict, past_days: int) -> dict:
+    """Prepend ``past_days`` days: the first recorded ones replayed a day earlier."""
+    n = past_days * 24
+    start = datetime.strptime(hourly["time"][0], "%Y-%m-%dT%H:%M") - timedelta(days=past_days)
+    past = {k: (v * -(-n // len(v)))[:n] for k, v in hourly.items()}
+    past["time"] = [(start + timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M") for i in range(n)]
+    return {k: past[k] + v for k, v in hourly.items()}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/v1/forecast":
+            return self._send(404, {"error": True, "reason": "Not found"})
+
+        query = parse_qs(url.query)
+        try:
+            days = int(query.get("forecast_days", ["7"])[0])
+            past_days = int(query.get("past_days", ["0"])[0])
+            lats = [float(v) for v in query["latitude"][0].split(",")]
+            lons = [float(v) for v in query["longitude"][0].split(",")]
+        except (KeyError, ValueError):
+            return self._send(400, {"error": True, "reason": "Bad coordinates"})
+
+        server: MockOpenMeteo = self.server.owner
+        payload = server.payload_for(days, past_days)
+        if payload is None:
+            return self._send(400, {"error": True, "reason": f"Unsupported forecast_days {days}"})
+        if server.latency:
+            time.sleep(server.latency)
+        server.requests += 1
+
+        locations = [dict(payload, latitude=lat, longitude=lon) for lat, lon in zip(lats, lons)]
+        self._send(200, locations if len(locations) > 1 else locations[0])
+
+    def _send(self, status: int, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockOpenMeteo:
+    """Threaded mock server; use as a context manager or start()/stop()."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 synthetic: bool = False):
+        self.payloads = load_payloads(synthetic)
+        self.source = "synthetic" if synthetic else "recorded"
+        self.latency = latency
+        self.requests = 0
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.owner = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/forecast"
+
+    def payload_for(self, days: int, past_days: int = 0) -> Optional[dict]:
+        # serve the shortest recording that covers the horizon, trimmed to it
+        for recorded in sorted(self.payloads):
+            if recorded >= days:
+                payload = self.payloads[recorded]
+                if recorded == days and not past_days:
+                    return payload
+                hours = days * 24
+                hourly = {k: v[:hours] for k, v in payload["hourly"].items()}
+                if past_days:
+                    hourly = _with_past_days(hourly, past_days)
+                return dict(payload, hourly=hourly)
+        return None
+
+    def start(self) -> "MockOpenMeteo":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="added delay per upstream call")
+    parser.add_argument("--record", action="store_true", help="capture fixtures from the real API and exit")
+    parser.add_argument("--synthetic", action="store_true", help="serve synthetic payloads instead of fixtures")
+    args = parser.parse_args()
+
+    if args.record:
+        record()
+        return
+
+    server = MockOpenMeteo(args.host, args.port, args.latency_ms / 1000, args.synthetic)
+    print(f"Mock Open-Meteo serving {server.url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
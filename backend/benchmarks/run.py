@@ -0,0 +1,136 @@
+"""Run the benchmark suite and save one JSON result per run.
+
+Runs micro.py and load.py (see their docstrings) and writes
+``benchmarks/results/<timestamp>-<commit>.json`` with the git commit,
+interpreter and library versions next to the numbers, so runs can be
+compared across commits:
+
+    python benchmarks/run.py [--quick] [--skip-load] [--concurrency 16] [--synthetic]
+    python benchmarks/run.py --compare results/a.json results/b.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCH_DIR.parent
+RESULTS_DIR = BENCH_DIR / "results"
+sys.path.insert(0, str(BENCH_DIR))
+
+import load  # noqa: E402
+import micro  # noqa: E402
+from mock_openmeteo import MissingFixtures, load_payloads  # noqa: E402
+
+
+def git_commit() -> Dict[str, object]:
+    def git(*args) -> str:
+        return subprocess.run(["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True).stdout.strip()
+
+    return {"sha": git("rev-parse", "--short", "HEAD") or "unknown", "dirty": bool(git("status", "--porcelain"))}
+
+
+def environment() -> Dict[str, str]:
+    import numpy
+    import xgboost
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": str(os.cpu_count()),
+        "numpy": numpy.__version__,
+        "xgboost": xgboost.__version__,
+    }
+
+
+def flatten(report: dict) -> Dict[str, float]:
+    """{"micro.<name>": median_us, "load.<scenario>.<metric>": value} for comparison."""
+    flat = {}
+    for name, r in report.get("micro", {}).get("results", {}).items():
+        flat[f"micro.{name}.median_us"] = r["median_us"]
+    for name, r in report.get("load", {}).get("results", {}).items():
+        for metric in ("req_per_s", "p50_ms", "p95_ms", "p99_ms"):
+            if metric in r:
+                flat[f"load.{name}.{metric}"] = r[metric]
+    return flat
+
+
+def compare(base_path: str, new_path: str):
+    with open(base_path, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = json.load(f)
+
+    a, b = flatten(base), flatten(new)
+    print(f"{base['commit']['sha']} -> {new['commit']['sha']}")
+    weather = (base.get("weather", "recorded"), new.get("weather", "recorded"))
+    if weather[0] != weather[1]:
+        print(f"⚠️ Runs used different weather ({weather[0]} vs {weather[1]}); numbers aren't comparable")
+    width = max((len(k) for k in a.keys() | b.keys()), default=10)
+    for key in sorted(a.keys() | b.keys()):
+        old, cur = a.get(key), b.get(key)
+        if old is None or cur is None:
+            print(f"{key:<{width}} {old!s:>12} {cur!s:>12}")
+            continue
+        change = (cur - old) / old * 100 if old else 0.0
+        print(f"{key:<{width}} {old:>12.2f} {cur:>12.2f} {change:>+8.1f}%")
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="fewer repeats and requests")
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--model", default="hassan")
+    parser.add_argument("--synthetic", action="store_true", help="synthetic weather instead of the recorded fixtures")
+    parser.add_argument("--out", help="result file (default: results/<timestamp>-<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="diff two result files and exit")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    try:
+        load_payloads(args.synthetic)
+    except MissingFixtures as e:
+        parser.error(str(e))
+
+    commit = git_commit()
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "environment": environment(),
+    }
+
+    repeat = 3 if args.quick else 5
+    print("== micro ==")
+    report["weather"] = "synthetic" if args.synthetic else "recorded"
+    report["micro"] = {"model": args.model, "repeat": repeat,
+                       "results": micro.run(args.model, repeat, args.synthetic)}
+    micro.print_table(report["micro"]["results"])
+
+    if not args.skip_load:
+        print("== load ==")
+        requests = 100 if args.quick else 500
+        report["load"] = load.main([
+            "--concurrency", str(args.concurrency), "--requests", str(requests),
+            *(["--synthetic"] if args.synthetic else []),
+        ])
+
+    out = Path(args.out) if args.out else RESULTS_DIR / (
+        f"{datetime.now():%Y%m%d-%H%M%S}-{commit['sha']}{'-dirty' if commit['dirty'] else ''}.json"
+    )
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
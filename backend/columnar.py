@@ -0,0 +1,85 @@
+"""Columnar encodings for hourly forecast series.
+
+A series is a dict of equal-length columns (numpy arrays, or lists for
+strings) plus a flat metadata dict. Two encodings:
+- JSON: ``{...metadata, "hours": n, "columns": {name: [values]}}`` with NaN as
+  null, written with orjson when it is installed and the json module otherwise.
+- Arrow IPC stream: one record batch, metadata in the schema, floats as
+  float32. Needs pyarrow, which is imported on first use.
+"""
+import json
+from typing import Any, Dict, Sequence, Union
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+JSON_MEDIA_TYPE = "application/json"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+Column = Union[np.ndarray, Sequence]
+
+
+class ArrowUnavailable(Exception):
+    """Arrow output was requested but pyarrow is not installed."""
+
+
+def arrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _is_float(column: Column) -> bool:
+    return isinstance(column, np.ndarray) and column.dtype.kind == "f"
+
+
+def _json_values(column: Column) -> list:
+    if _is_float(column) and np.isnan(column).any():
+        return np.where(np.isnan(column), None, column).tolist()
+    return column.tolist() if isinstance(column, np.ndarray) else list(column)
+
+
+def encode_json(meta: Dict[str, Any], columns: Dict[str, Column]) -> bytes:
+    hours = len(next(iter(columns.values()))) if columns else 0
+    if orjson is not None:
+        # orjson writes numpy arrays natively and NaN as null
+        return orjson.dumps(
+            {**meta, "hours": hours, "columns": columns},
+            option=orjson.OPT_SERIALIZE_NUMPY,
+        )
+    payload = {**meta, "hours": hours, "columns": {k: _json_values(v) for k, v in columns.items()}}
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+
+def encode_arrow(meta: Dict[str, Any], columns: Dict[str, Column],
+                 time_columns: Sequence[str] = ("time",)) -> bytes:
+    """Floats are written as float32 and ``time_columns`` (ISO strings) as
+    timestamp[s]; both are plenty for rounded forecast values."""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ArrowUnavailable("pyarrow is not installed")
+
+    arrays, names = [], []
+    for name, column in columns.items():
+        if name in time_columns:
+            arrays.append(pa.array(np.array(column, dtype="datetime64[s]")))
+        elif _is_float(column):
+            arrays.append(pa.array(column.astype(np.float32), mask=np.isnan(column)))
+        else:
+            arrays.append(pa.array(column))
+        names.append(name)
+    schema_meta = {k: json.dumps(v) for k, v in meta.items()}
+    batch = pa.RecordBatch.from_arrays(arrays, names=names)
+    batch = batch.replace_schema_metadata(schema_meta)
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,423 @@
+"""Columnar store for the historical training data.
+
+The raw data (``AI_RES_models/Dataset.zip`` or the CSVs the prep scripts
+write) is converted once into Parquet partitioned by city and year::
+
+    <root>/city=<name>/year=<yyyy>/part-0.parquet
+    <root>/index.json
+
+Columns are typed on the way in: the timestamp becomes ``timestamp[s]``,
+numeric columns float64 and the rest strings. City and year live in the
+folder names only. ``index.json`` lists every partition with its row count
+and time range, so a query opens only the partitions it can match; inside
+them the time filter is pushed down to Parquet row-group statistics and
+only the requested columns are decoded.
+
+Rows without a timestamp column get consecutive hourly timestamps per city
+from ``DEFAULT_START``, the same rule as ``AI_RES_models/Time.py``. Sources
+without a city column take the city from the CSV file name.
+
+Build the store with::
+
+    python dataset_store.py build ../AI_RES_models/Dataset.zip [--root DIR]
+    python dataset_store.py info [--root DIR]
+
+Queries return pyarrow tables, pandas frames or dicts of NumPy arrays
+(zero-copy for float columns without gaps). ``mapped`` opens a partition as
+an uncompressed Arrow file that is memory-mapped, converted on first use.
+pyarrow is required.
+"""
+import io
+import json
+import os
+import shutil
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+INDEX_FILE = "index.json"
+MAPPED_DIR = "_mapped"
+STORE_VERSION = 1
+TIME_COLUMN = "time"
+
+DEFAULT_ROOT = Path(os.getenv("DATASET_DIR", Path(__file__).resolve().parent.parent / "AI_RES_models" / "dataset"))
+DEFAULT_START = pd.Timestamp("2005-01-01 06:00:00")
+CHUNK_ROWS = 500_000
+ROW_GROUP_ROWS = 65_536
+
+_TIME_CANDIDATES = ("assigned_timestamp", "timestamp", "time", "datetime", "date")
+
+TimeBound = Any  # anything pandas.Timestamp accepts, or None
+
+
+def _find_column(columns: Sequence[str], exact: Sequence[str], contains: Optional[str] = None) -> Optional[str]:
+    lower = {c.lower(): c for c in columns}
+    for name in exact:
+        if name in lower:
+            return lower[name]
+    if contains:
+        for c in columns:
+            if contains in c.lower():
+                return c
+    return None
+
+
+def _partition_dir(city: str, year: int) -> str:
+    safe = str(city).replace("/", "_").replace(os.sep, "_")
+    return f"city={safe}/year={year}"
+
+
+def _to_seconds(value: TimeBound) -> Optional[np.datetime64]:
+    return None if value is None else np.datetime64(pd.Timestamp(value).to_datetime64(), "s")
+
+
+# ---------- building ----------
+
+def iter_source_frames(source: Path, chunk_rows: int = CHUNK_ROWS) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """(file stem, chunk) for every CSV in ``source`` (a CSV, a zip of CSVs or a folder)."""
+    source = Path(source)
+    if source.is_dir():
+        for path in sorted(source.rglob("*.csv")):
+            for chunk in pd.read_csv(path, chunksize=chunk_rows, low_memory=False):
+                yield path.stem, chunk
+    elif zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as zf:
+            for member in sorted(n for n in zf.namelist() if n.lower().endswith(".csv")):
+                with zf.open(member) as f:
+                    for chunk in pd.read_csv(io.TextIOWrapper(f, encoding="utf-8-sig"),
+                                             chunksize=chunk_rows, low_memory=False):
+                        yield Path(member).stem, chunk
+    else:
+        for chunk in pd.read_csv(source, chunksize=chunk_rows, low_memory=False):
+            yield source.stem, chunk
+
+
+class _PartitionWriter:
+    """One ParquetWriter per (city, year), fed in row groups buffered per partition."""
+
+    def __init__(self, root: Path, schema, row_group: int):
+        import pyarrow.parquet as pq
+
+        self.pq = pq
+        self.root = root
+        self.schema = schema
+        self.row_group = row_group
+        self.writers: Dict[Tuple[str, int], Any] = {}
+        self.buffers: Dict[Tuple[str, int], List[pd.DataFrame]] = {}
+        self.meta: Dict[Tuple[str, int], Dict[str, Any]] = {}
+
+    def _flush(self, key: Tuple[str, int]):
+        import pyarrow as pa
+
+        frames = self.buffers.pop(key, [])
+        if not frames:
+            return
+        table = pa.Table.from_pandas(pd.concat(frames, ignore_index=True), schema=self.schema, preserve_index=False)
+        writer = self.writers.get(key)
+        if writer is None:
+            folder = self.root / _partition_dir(*key)
+            folder.mkdir(parents=True, exist_ok=True)
+            writer = self.writers[key] = self.pq.ParquetWriter(folder / "part-0.parquet", self.schema)
+        writer.write_table(table, row_group_size=self.row_group)
+
+    def write(self, city: str, frame: pd.DataFrame):
+        times = frame[TIME_COLUMN].to_numpy(dtype="datetime64[s]")
+        years = times.astype("datetime64[Y]").astype(np.int64) + 1970
+        for year in np.unique(years):
+            mask = years == year
+            key = (city, int(year))
+            part = frame[mask]
+            ptimes = times[mask]
+            meta = self.meta.setdefault(key, {"rows": 0, "start": ptimes[0], "end": ptimes[0], "sorted": True})
+            meta["sorted"] = meta["sorted"] and ptimes[0] >= meta["end"] and bool((np.diff(ptimes) >= np.timedelta64(0)).all())
+            meta["rows"] += len(part)
+            meta["start"] = min(meta["start"], ptimes.min())
+            meta["end"] = max(meta["end"], ptimes.max())
+            frames = self.buffers.setdefault(key, [])
+            frames.append(part)
+            if sum(len(f) for f in frames) >= self.row_group:
+                self._flush(key)
+
+    def close(self):
+        for key in list(self.buffers):
+            self._flush(key)
+        for writer in self.writers.values():
+            writer.close()
+
+
+def build_store(source: Path, root: Path = DEFAULT_ROOT, chunk_rows: int = CHUNK_ROWS,
+                start: pd.Timestamp = DEFAULT_START, row_group: int = ROW_GROUP_ROWS) -> "DatasetStore":
+    """Convert ``source`` into a fresh store at ``root`` in one streaming pass."""
+    import pyarrow as pa
+
+    source, root = Path(source), Path(root)
+    tmp = root.with_name(root.name + ".building")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    writer: Optional[_PartitionWriter] = None
+    columns: List[str] = []
+    city_col = time_col = None
+    counters: Dict[str, int] = {}
+    try:
+        for stem, chunk in iter_source_frames(source, chunk_rows):
+            chunk.columns = [str(c).strip() for c in chunk.columns]
+            if writer is None:
+                city_col = _find_column(chunk.columns, ("city",), contains="city")
+                time_col = _find_column(chunk.columns, _TIME_CANDIDATES)
+                columns = [c for c in chunk.columns if c not in (city_col, time_col)]
+                fields = [pa.field(TIME_COLUMN, pa.timestamp("s"))] + [
+                    pa.field(c, pa.float64() if pd.api.types.is_numeric_dtype(chunk[c]) else pa.string())
+                    for c in columns
+                ]
+                writer = _PartitionWriter(tmp, pa.schema(fields), row_group)
+
+            cities = chunk[city_col].astype(str).str.strip() if city_col else pd.Series(stem, index=chunk.index)
+            if time_col:
+                times = pd.to_datetime(chunk[time_col], errors="coerce")
+            else:
+                # consecutive hours per city, counted across chunks (as in Time.py)
+                seen = cities.map(counters).fillna(0).to_numpy(dtype=np.int64)
+                position = seen + cities.groupby(cities, sort=False).cumcount().to_numpy(dtype=np.int64)
+                times = pd.Series(start + pd.to_timedelta(position, unit="h"), index=chunk.index)
+                for city, n in cities.value_counts(sort=False).items():
+                    counters[city] = counters.get(city, 0) + int(n)
+
+            frame = pd.DataFrame({TIME_COLUMN: times.astype("datetime64[s]")}, index=chunk.index)
+            for field in writer.schema:
+                if field.name == TIME_COLUMN:
+                    continue
+                values = chunk[field.name] if field.name in chunk else pd.Series(np.nan, index=chunk.index)
+                if pa.types.is_floating(field.type):
+                    frame[field.name] = pd.to_numeric(values, errors="coerce").astype("float64")
+                else:
+                    frame[field.name] = values.astype("string")
+            keep = frame[TIME_COLUMN].notna()
+            for city, group in frame[keep].groupby(cities[keep], sort=False):
+                writer.write(city, group)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if writer is None:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise ValueError(f"No CSV rows found in '{source}'")
+
+    index = {
+        "version": STORE_VERSION,
+        "source": str(source),
+        "schema": [[f.name, str(f.type)] for f in writer.schema],
+        "partitions": [
+            {
+                "city": city,
+                "year": year,
+                "path": f"{_partition_dir(city, year)}/part-0.parquet",
+                "rows": meta["rows"],
+                "start": str(meta["start"]),
+                "end": str(meta["end"]),
+                "sorted": meta["sorted"],
+            }
+            for (city, year), meta in sorted(writer.meta.items())
+        ],
+    }
+    with open(tmp / INDEX_FILE, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=1)
+
+    # swap the finished store in; a failed build leaves the old one untouched
+    shutil.rmtree(root, ignore_errors=True)
+    os.replace(tmp, root)
+    return DatasetStore(root)
+
+
+# ---------- querying ----------
+
+class DatasetStore:
+    def __init__(self, root: Path = DEFAULT_ROOT):
+        self.root = Path(root)
+        try:
+            with open(self.root / INDEX_FILE, "r", encoding="utf-8") as f:
+                self.index = json.load(f)
+        except OSError as e:
+            raise FileNotFoundError(f"No dataset store at '{self.root}' (run: python dataset_store.py build SOURCE)") from e
+        if self.index.get("version") != STORE_VERSION:
+            raise ValueError(f"Dataset store at '{self.root}' has version {self.index.get('version')}, "
+                             f"expected {STORE_VERSION}; rebuild it")
+        self.partitions: List[Dict[str, Any]] = self.index["partitions"]
+        for p in self.partitions:
+            p["_start"] = np.datetime64(p["start"], "s")
+            p["_end"] = np.datetime64(p["end"], "s")
+
+    @property
+    def columns(self) -> List[str]:
+        return [name for name, _ in self.index["schema"]]
+
+    @property
+    def cities(self) -> List[str]:
+        return sorted({p["city"] for p in self.partitions})
+
+    def years(self, city: Optional[str] = None) -> List[int]:
+        return sorted({p["year"] for p in self.partitions if city is None or p["city"] == city})
+
+    def rows(self, cities: Optional[Iterable[str]] = None) -> int:
+        return sum(p["rows"] for p in self.select(cities))
+
+    def select(self, cities: Optional[Iterable[str]] = None, start: TimeBound = None,
+               end: TimeBound = None) -> List[Dict[str, Any]]:
+        """Index entries of the partitions that can hold matching rows.
+        ``start`` is inclusive and ``end`` exclusive."""
+        wanted = None if cities is None else {cities} if isinstance(cities, str) else set(cities)
+        lo, hi = _to_seconds(start), _to_seconds(end)
+        return [
+            p for p in self.partitions
+            if (wanted is None or p["city"] in wanted)
+            and (lo is None or p["_end"] >= lo)
+            and (hi is None or p["_start"] < hi)
+        ]
+
+    def _names(self, columns: Optional[Sequence[str]]) -> List[str]:
+        names = self.columns if columns is None else [TIME_COLUMN] + [c for c in columns if c != TIME_COLUMN]
+        unknown = set(names) - set(self.columns)
+        if unknown:
+            raise KeyError(f"Unknown columns: {sorted(unknown)}")
+        return names
+
+    def _schema(self, names: List[str]):
+        """Index schema of ``names``, in that order."""
+        import pyarrow as pa
+
+        types = {n: pa.type_for_alias(t) for n, t in self.index["schema"]}
+        return pa.schema([pa.field(n, types[n]) for n in names])
+
+    def _read(self, p: Dict[str, Any], names: List[str], start: TimeBound = None, end: TimeBound = None):
+        import pyarrow.parquet as pq
+
+        filters = []
+        if start is not None:
+            filters.append((TIME_COLUMN, ">=", pd.Timestamp(start).to_pydatetime()))
+        if end is not None:
+            filters.append((TIME_COLUMN, "<", pd.Timestamp(end).to_pydatetime()))
+        table = pq.read_table(self.root / p["path"], columns=names, filters=filters or None,
+                              memory_map=True, partitioning=None)
+        # Parquet has no seconds unit, so times come back as timestamp[ms]
+        return table.cast(self._schema(names))
+
+    def query(self, cities: Optional[Iterable[str]] = None, start: TimeBound = None, end: TimeBound = None,
+              columns: Optional[Sequence[str]] = None, with_city: bool = True):
+        """pyarrow Table of the matching rows, partitions in index order (city,
+        then year) and rows in stored order within them. ``columns`` defaults
+        to all; ``time`` is always included, plus a ``city`` column when
+        ``with_city`` is set."""
+        import pyarrow as pa
+
+        names = self._names(columns)
+        schema = self._schema(names)
+        if with_city:
+            schema = schema.append(pa.field("city", pa.string()))
+
+        tables = []
+        for p in self.select(cities, start, end):
+            table = self._read(p, names, start, end)
+            if with_city:
+                table = table.append_column("city", pa.array([p["city"]] * table.num_rows, pa.string()))
+            tables.append(table)
+        if not tables:
+            return schema.empty_table()
+        table = pa.concat_tables(tables)
+        return table.combine_chunks() if table.num_rows else table
+
+    def frame(self, *args, **kwargs) -> pd.DataFrame:
+        return self.query(*args, **kwargs).to_pandas()
+
+    def arrays(self, *args, **kwargs) -> Dict[str, np.ndarray]:
+        """Column name -> NumPy array. Float columns without nulls are views
+        on the Arrow buffers; nulls become NaN (and need a copy)."""
+        table = self.query(*args, **kwargs)
+        return {name: column_to_numpy(table.column(name)) for name in table.column_names}
+
+    def read(self, partition: Dict[str, Any], columns: Optional[Sequence[str]] = None,
+             start: TimeBound = None, end: TimeBound = None):
+        """pyarrow Table of one partition (an entry of ``partitions``)."""
+        return self._read(partition, self._names(columns), start, end)
+
+    def iter_partitions(self, cities: Optional[Iterable[str]] = None, start: TimeBound = None,
+                        end: TimeBound = None, columns: Optional[Sequence[str]] = None):
+        """(index entry, table) per matching partition, for callers that work
+        a partition at a time rather than holding a whole query in memory."""
+        names = self._names(columns)
+        for p in self.select(cities, start, end):
+            yield p, self._read(p, names, start, end)
+
+    def mapped(self, city: str, year: int):
+        """Memory-mapped pyarrow Table of one partition. The partition is
+        written out as an uncompressed Arrow file on first use, so reads
+        afterwards map straight from the page cache without decoding."""
+        import pyarrow as pa
+
+        entry = next((p for p in self.partitions if p["city"] == city and p["year"] == year), None)
+        if entry is None:
+            raise KeyError(f"No partition for {city!r} in {year}")
+        path = self.root / MAPPED_DIR / (_partition_dir(city, year).replace("/", "__") + ".arrow")
+        if not path.exists():
+            table = self._read(entry, self.columns)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".arrow.tmp")
+            with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            os.replace(tmp, path)
+        with pa.memory_map(str(path), "r") as source:
+            return pa.ipc.open_file(source).read_all()
+
+    def info(self) -> Dict[str, Any]:
+        starts = [p["_start"] for p in self.partitions]
+        ends = [p["_end"] for p in self.partitions]
+        return {
+            "root": str(self.root),
+            "source": self.index.get("source"),
+            "cities": len(self.cities),
+            "partitions": len(self.partitions),
+            "rows": self.rows(),
+            "start": str(min(starts)) if starts else None,
+            "end": str(max(ends)) if ends else None,
+            "columns": self.index["schema"],
+            "bytes": sum((self.root / p["path"]).stat().st_size for p in self.partitions),
+        }
+
+
+def column_to_numpy(column) -> np.ndarray:
+    """NumPy view of an Arrow column where possible (see DatasetStore.arrays)."""
+    import pyarrow as pa
+
+    column = column.combine_chunks() if isinstance(column, pa.ChunkedArray) else column
+    if pa.types.is_floating(column.type):
+        if column.null_count:
+            column = column.fill_null(np.nan)
+        return column.to_numpy(zero_copy_only=False)
+    if pa.types.is_timestamp(column.type):
+        return column.to_numpy(zero_copy_only=False).astype("datetime64[s]")
+    return column.to_numpy(zero_copy_only=False)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build or inspect the historical dataset store")
+    parser.add_argument("command", choices=("build", "info"))
+    parser.add_argument("source", nargs="?", type=Path, help="CSV, zip of CSVs or folder (build)")
+    parser.add_argument("--root", type=Path, default=DEFAULT_ROOT)
+    parser.add_argument("--chunksize", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--start", default=str(DEFAULT_START),
+                        help="first timestamp per city when the source has no time column")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        if args.source is None:
+            parser.error("build needs a SOURCE")
+        store = build_store(args.source, args.root, args.chunksize, pd.Timestamp(args.start))
+        info = store.info()
+        print(f"✅ Built {info['partitions']} partitions ({info['rows']:,} rows, "
+              f"{len(store.cities)} cities) -> {args.root}")
+    else:
+        print(json.dumps(DatasetStore(args.root).info(), indent=2))
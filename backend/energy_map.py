@@ -0,0 +1,227 @@
+"""Gridded solar energy maps over a lat/lon bounding box.
+
+Cells sit on a global grid of ``resolution`` degrees (cell i spans
+``[i * res, (i + 1) * res)``, scored at its centre), so overlapping requests
+at the same resolution share cells. Cells are grouped into square tiles of
+TILE_SIZE x TILE_SIZE; a map is computed and cached a tile at a time and
+cut to the requested box on the way out.
+
+Tiles hold the summed P (W/m² at 100 % efficiency) over the requested
+forecast hours, NaN for cells with no model region or no weather. Energy is
+``value * efficiency / 1000`` in kWh/m², applied per request. Tiles follow
+the forecast cache's freshness rule (same forecast-hour bucket and younger
+than ``ttl``) and are dropped when a model they used is reloaded.
+
+Encodings of the cut grid (rows run north to south):
+- JSON: bounds, shape and ``values`` as nested lists with null for no data.
+- f32: raw little-endian float32, row-major, NaN for no data.
+- PNG: 16-bit greyscale; 0 is no data, 1..65535 spans ``[min, max]``, which
+  are given in tEXt chunks.
+"""
+import json
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ephemeris import compute_solar_elevation_array
+
+TILE_SIZE = 16
+
+Tile = Tuple[int, int]  # (tile row, tile col) on the global grid
+
+
+def cell_range(lo: float, hi: float, resolution: float) -> Tuple[int, int]:
+    """[first, last) global cell indices covering ``[lo, hi]``."""
+    first = int(np.floor(lo / resolution))
+    last = max(int(np.ceil(hi / resolution)), first + 1)
+    return first, last
+
+
+def tiles_for(lat_cells: Tuple[int, int], lon_cells: Tuple[int, int]) -> List[Tile]:
+    return [
+        (ti, tj)
+        for ti in range(lat_cells[0] // TILE_SIZE, (lat_cells[1] - 1) // TILE_SIZE + 1)
+        for tj in range(lon_cells[0] // TILE_SIZE, (lon_cells[1] - 1) // TILE_SIZE + 1)
+    ]
+
+
+def tile_centres(tile: Tile, resolution: float) -> Tuple[np.ndarray, np.ndarray]:
+    """(lat, lon) of every cell centre in ``tile``, row-major from the south-west."""
+    i = (tile[0] * TILE_SIZE + np.arange(TILE_SIZE) + 0.5) * resolution
+    j = (tile[1] * TILE_SIZE + np.arange(TILE_SIZE) + 0.5) * resolution
+    lat, lon = np.meshgrid(i, j, indexing="ij")
+    return lat.ravel(), lon.ravel()
+
+
+def assemble(tiles: Dict[Tile, np.ndarray], lat_cells: Tuple[int, int],
+             lon_cells: Tuple[int, int]) -> np.ndarray:
+    """Cut the requested cells out of their tiles; rows north to south."""
+    grid = np.full((lat_cells[1] - lat_cells[0], lon_cells[1] - lon_cells[0]), np.nan, dtype=np.float32)
+    for (ti, tj), values in tiles.items():
+        i0, j0 = ti * TILE_SIZE, tj * TILE_SIZE
+        si, ei = max(i0, lat_cells[0]), min(i0 + TILE_SIZE, lat_cells[1])
+        sj, ej = max(j0, lon_cells[0]), min(j0 + TILE_SIZE, lon_cells[1])
+        if si >= ei or sj >= ej:
+            continue
+        grid[si - lat_cells[0]:ei - lat_cells[0], sj - lon_cells[0]:ej - lon_cells[0]] = \
+            values[si - i0:ei - i0, sj - j0:ej - j0]
+    return grid[::-1]
+
+
+def _hourly_window(hourly: dict, key: str, start: int, stop: int) -> List[Any]:
+    values = hourly[key][start:stop]
+    if len(values) < stop - start:
+        raise IndexError(f"'{key}' has {len(hourly[key])} values, expected {stop}")
+    return values
+
+
+def window_features(hourlies: Sequence[dict], lats: np.ndarray, lons: np.ndarray,
+                    start: int, stop: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Feature rows for hours ``[start, stop)`` of every cell at once.
+
+    Returns the (cells * hours, 6) matrix in prepare_features_batch's column
+    layout and the daylight mask of rows worth scoring.
+    """
+    def column(key: str) -> np.ndarray:
+        return np.array(
+            [[np.nan if v is None else v for v in _hourly_window(h, key, start, stop)] for h in hourlies],
+            dtype=float,
+        ).reshape(len(hourlies), stop - start)
+
+    poa_direct = column("direct_radiation")
+    poa_diffuse = column("diffuse_radiation")
+    temperature = column("temperature_2m")
+    wind_speed = column("wind_speed_10m")
+    times = np.array([_hourly_window(h, "time", start, stop) for h in hourlies], dtype="datetime64[s]")
+
+    albedo = 0.2
+    poa_ground_reflected = (poa_direct + poa_diffuse) * albedo
+    solar_elev = compute_solar_elevation_array(lats[:, None], lons[:, None], times)
+
+    features = np.stack([
+        poa_ground_reflected,
+        solar_elev,
+        temperature,
+        wind_speed,
+        np.broadcast_to(lats[:, None], poa_direct.shape),
+        np.broadcast_to(lons[:, None], poa_direct.shape),
+    ], axis=-1).reshape(-1, 6)
+    valid = np.isfinite(features).all(axis=1)
+    return features, valid & (poa_direct.ravel() > 10)
+
+
+class TileCache:
+    def __init__(
+        self,
+        max_tiles: int = 4096,
+        ttl: float = 3600.0,
+        bucket_offset: float = 0.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.max_tiles = max_tiles
+        self.ttl = ttl
+        self.bucket_offset = bucket_offset
+        self._clock = clock
+
+        # key -> (computed_at, models used, values)
+        self._tiles: "OrderedDict[Hashable, Tuple[float, frozenset, np.ndarray]]" = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _bucket(self, t: float) -> int:
+        return int((t - self.bucket_offset) // 3600)
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key: Hashable) -> Optional[np.ndarray]:
+        now = self._clock()
+        with self._lock:
+            entry = self._tiles.get(key)
+            if entry is not None and now - entry[0] <= self.ttl and self._bucket(entry[0]) == self._bucket(now):
+                self._tiles.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, values: np.ndarray, models: Iterable[str], generation: int):
+        with self._lock:
+            if generation != self._generation:
+                return  # computed with a model that has since been reloaded
+            self._tiles[key] = (self._clock(), frozenset(models), values)
+            self._tiles.move_to_end(key)
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, model: str):
+        """Drop every tile that used ``model``."""
+        with self._lock:
+            self._generation += 1
+            stale = [key for key, entry in self._tiles.items() if model in entry[1]]
+            for key in stale:
+                del self._tiles[key]
+            self.invalidations += len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "tiles": len(self._tiles),
+            "max_tiles": self.max_tiles,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+PNG_MEDIA_TYPE = "image/png"
+F32_MEDIA_TYPE = "application/octet-stream"
+
+
+def encode_f32(grid: np.ndarray) -> bytes:
+    return np.ascontiguousarray(grid, dtype="<f4").tobytes()
+
+
+def encode_grid_json(meta: Dict[str, Any], grid: np.ndarray) -> bytes:
+    values = np.where(np.isnan(grid), None, np.round(grid.astype(float), 6)).tolist()
+    return json.dumps({**meta, "values": values}, separators=(",", ":")).encode("utf-8")
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def encode_png16(grid: np.ndarray, text: Optional[Dict[str, str]] = None) -> Tuple[bytes, float, float]:
+    """16-bit greyscale PNG of ``grid``; returns (png, min, max) of the scale."""
+    finite = grid[np.isfinite(grid)]
+    vmin = float(finite.min()) if finite.size else 0.0
+    vmax = float(finite.max()) if finite.size else 0.0
+    span = vmax - vmin
+    scaled = np.zeros(grid.shape, dtype=">u2")
+    if finite.size:
+        levels = 1 + np.round((grid - vmin) / span * 65534) if span > 0 else np.ones(grid.shape)
+        scaled[np.isfinite(grid)] = levels[np.isfinite(grid)]
+
+    height, width = grid.shape
+    # filter type 0 (none) on every scanline
+    raw = b"".join(b"\x00" + row.tobytes() for row in scaled)
+    chunks = [_png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 16, 0, 0, 0, 0))]
+    for key, value in {**(text or {}), "min": repr(vmin), "max": repr(vmax)}.items():
+        chunks.append(_png_chunk(b"tEXt", key.encode("latin-1") + b"\x00" + value.encode("latin-1")))
+    chunks.append(_png_chunk(b"IDAT", zlib.compress(raw, 6)))
+    chunks.append(_png_chunk(b"IEND", b""))
+    return b"\x89PNG\r\n\x1a\n" + b"".join(chunks), vmin, vmax
@@ -0,0 +1,247 @@
+"""Precomputed solar ephemeris for the configured cities.
+
+Solar elevation only depends on the location, the day of the year and the
+time of day, so for a fixed set of cities it can be tabulated once: one row
+per city, one column per hour of a 366-day year. Next to it sits each city's
+daylight window (sunrise and sunset, minutes from UTC midnight) per day of
+the year.
+
+The table is written as plain ``.npy`` files plus a JSON index and opened
+memory-mapped, so every process shares one copy from the page cache. It is
+built at startup when missing or out of date, or ahead of time with::
+
+    python ephemeris.py [--dir DIR]
+
+Coordinates that are not in the table, and timestamps that are not on the
+hour, fall back to compute_solar_elevation_array.
+"""
+import json
+import os
+from math import pi
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+HOURS_PER_YEAR = 366 * 24
+# A leap year, so every day of the year (1..366) has a column
+_TABLE_START = np.datetime64("2024-01-01T00:00", "s")
+# Upper edge of the sun's disc incl. refraction, as used for sunrise/sunset
+_HORIZON_DEG = -0.833
+# Slack around the analytic sunrise/sunset before an hour counts as dark
+DARK_MARGIN_MINUTES = 20.0
+
+INDEX_FILE = "index.json"
+ELEVATION_FILE = "elevation.npy"
+DAYLIGHT_FILE = "daylight.npy"
+
+Coord = Tuple[float, float]
+
+
+def _eqtime_decl(gamma):
+    """NOAA equation of time (minutes) and solar declination (radians)."""
+    eqtime = 229.18 * (
+        0.000075
+        + 0.001868 * np.cos(gamma)
+        - 0.032077 * np.sin(gamma)
+        - 0.014615 * np.cos(2 * gamma)
+        - 0.040849 * np.sin(2 * gamma)
+    )
+
+    decl = (
+        0.006918
+        - 0.399912 * np.cos(gamma)
+        + 0.070257 * np.sin(gamma)
+        - 0.006758 * np.cos(2 * gamma)
+        + 0.000907 * np.sin(2 * gamma)
+        - 0.002697 * np.cos(3 * gamma)
+        + 0.00148 * np.sin(3 * gamma)
+    )
+    return eqtime, decl
+
+
+def _day_of_year(days: np.ndarray) -> np.ndarray:
+    years = days.astype("datetime64[Y]").astype("datetime64[D]")
+    return (days - years).astype(np.int64) + 1
+
+
+def compute_solar_elevation_array(lat_deg, lon_deg, times_utc) -> np.ndarray:
+    """Vectorized solar elevation (degrees) over an array of UTC timestamps.
+
+    ``lat_deg``/``lon_deg`` may be scalars or arrays broadcastable against
+    ``times_utc`` (anything convertible to ``datetime64[s]``).
+    """
+    t = np.asarray(times_utc, dtype="datetime64[s]")
+    days = t.astype("datetime64[D]")
+    doy = _day_of_year(days)
+
+    secs = (t - days).astype(np.int64)
+    hour = secs // 3600 + (secs % 3600 // 60) / 60 + (secs % 60) / 3600
+
+    gamma = 2.0 * pi / 365.0 * (doy - 1 + (hour - 12.0) / 24.0)
+    eqtime, decl = _eqtime_decl(gamma)
+
+    time_offset = eqtime + 4.0 * np.asarray(lon_deg, dtype=float)
+    tst = hour * 60.0 + time_offset
+    ha = (tst / 4.0 - 180.0) * pi / 180.0
+    lat_rad = np.asarray(lat_deg, dtype=float) * pi / 180.0
+
+    cos_zenith = (
+        np.sin(lat_rad) * np.sin(decl) +
+        np.cos(lat_rad) * np.cos(decl) * np.cos(ha)
+    )
+    cos_zenith = np.clip(cos_zenith, -1.0, 1.0)
+    zenith = np.arccos(cos_zenith)
+
+    elev = 90.0 - zenith * 180.0 / pi
+    return elev
+
+
+def daylight_windows(lat_deg, lon_deg) -> np.ndarray:
+    """(..., 366, 2) sunrise and sunset per day of the year, in minutes from
+    UTC midnight (may fall outside 0..1440). Polar night gives an empty
+    window at solar noon, polar day the whole day."""
+    lat_rad = np.asarray(lat_deg, dtype=float)[..., None] * pi / 180.0
+    lon = np.asarray(lon_deg, dtype=float)[..., None]
+    gamma = 2.0 * pi / 365.0 * np.arange(366)
+    eqtime, decl = _eqtime_decl(gamma)
+
+    cos_ha = (np.cos((90.0 - _HORIZON_DEG) * pi / 180.0) - np.sin(lat_rad) * np.sin(decl)) / (
+        np.cos(lat_rad) * np.cos(decl)
+    )
+    ha = np.arccos(np.clip(cos_ha, -1.0, 1.0)) * 180.0 / pi
+    sunrise = 720.0 - 4.0 * (lon + ha) - eqtime
+    sunset = 720.0 - 4.0 * (lon - ha) - eqtime
+    return np.stack([sunrise, sunset], axis=-1)
+
+
+def _coord_key(lat: float, lon: float) -> Coord:
+    return (round(float(lat), 5), round(float(lon), 5))
+
+
+class EphemerisTable:
+    def __init__(self, coords: Sequence[Coord], elevation: np.ndarray, daylight: np.ndarray):
+        self.coords = [_coord_key(lat, lon) for lat, lon in coords]
+        self.elevation = elevation  # (cities, HOURS_PER_YEAR) degrees
+        self.daylight = daylight    # (cities, 366, 2) minutes from UTC midnight
+        self._rows: Dict[Coord, int] = {c: i for i, c in enumerate(self.coords)}
+
+    @classmethod
+    def build(cls, coords: Sequence[Coord]) -> "EphemerisTable":
+        coords = [_coord_key(lat, lon) for lat, lon in coords]
+        lat = np.array([c[0] for c in coords], dtype=float)
+        lon = np.array([c[1] for c in coords], dtype=float)
+        times = _TABLE_START + np.arange(HOURS_PER_YEAR) * np.timedelta64(3600, "s")
+        # row by row, with the same scalar-coordinate call the request path makes
+        elevation = np.empty((len(coords), HOURS_PER_YEAR))
+        for i in range(len(coords)):
+            elevation[i] = compute_solar_elevation_array(lat[i], lon[i], times)
+        return cls(coords, elevation, daylight_windows(lat, lon).astype(np.float32))
+
+    def save(self, directory: Path):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name, array in ((ELEVATION_FILE, self.elevation), (DAYLIGHT_FILE, self.daylight)):
+            tmp = directory / (name + ".tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp, directory / name)
+        # the index goes last: a table only counts as present once it exists
+        tmp = directory / (INDEX_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"hours": HOURS_PER_YEAR, "coords": self.coords}, f)
+        os.replace(tmp, directory / INDEX_FILE)
+
+    @classmethod
+    def load(cls, directory: Path, coords: Optional[Sequence[Coord]] = None) -> Optional["EphemerisTable"]:
+        """Memory-map a saved table; None if it is missing, or does not cover
+        exactly ``coords`` when they are given."""
+        directory = Path(directory)
+        try:
+            with open(directory / INDEX_FILE, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            elevation = np.load(directory / ELEVATION_FILE, mmap_mode="r")
+            daylight = np.load(directory / DAYLIGHT_FILE, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        saved = [tuple(c) for c in index.get("coords", [])]
+        if index.get("hours") != HOURS_PER_YEAR or elevation.shape != (len(saved), HOURS_PER_YEAR):
+            return None
+        if coords is not None and saved != [_coord_key(lat, lon) for lat, lon in coords]:
+            return None
+        return cls(saved, elevation, daylight)
+
+    @classmethod
+    def load_or_build(cls, directory: Path, coords: Sequence[Coord]) -> Tuple["EphemerisTable", bool]:
+        """(table, built): the saved table if it matches ``coords``, else a
+        freshly built one that is saved and re-opened memory-mapped."""
+        table = cls.load(directory, coords)
+        if table is not None:
+            return table, False
+        cls.build(coords).save(directory)
+        return cls.load(directory, coords), True
+
+    def row(self, lat: float, lon: float) -> Optional[int]:
+        return self._rows.get(_coord_key(lat, lon))
+
+    def solar_elevation(self, lat: float, lon: float, times_utc: np.ndarray) -> Optional[np.ndarray]:
+        """Tabulated elevations for ``times_utc`` (datetime64[s]); None when the
+        location is not in the table or a timestamp is not on the hour."""
+        row = self.row(lat, lon)
+        if row is None:
+            return None
+        secs = times_utc.astype(np.int64)
+        if (secs % 3600).any():
+            return None
+        days = times_utc.astype("datetime64[D]")
+        hour_of_year = (_day_of_year(days) - 1) * 24 + (secs // 3600) % 24
+        return self.elevation[row, hour_of_year]
+
+    def dark_hours(self, lat: float, lon: float, times: np.ndarray, utc_offset: float) -> Optional[np.ndarray]:
+        """True for hours whose whole preceding hour is night.
+
+        ``times`` are local wall-clock timestamps as Open-Meteo returns them
+        (``utc_offset`` seconds ahead of UTC); radiation values are averages
+        over the preceding hour, so only those hours are certainly zero.
+        None when the location is not in the table.
+        """
+        row = self.row(lat, lon)
+        if row is None:
+            return None
+        end = (times.astype(np.int64) - utc_offset) / 60.0
+        start = end - 60.0
+        today = np.floor(end / 1440.0).astype(np.int64)
+        lit = np.zeros(len(times), dtype=bool)
+        # sunset west of Greenwich can fall after UTC midnight, so look at neighbours too
+        for day in (today - 1, today, today + 1):
+            doy = _day_of_year(day.astype("datetime64[D]"))
+            window = self.daylight[row, doy - 1]
+            rise = day * 1440.0 + window[:, 0] - DARK_MARGIN_MINUTES
+            set_ = day * 1440.0 + window[:, 1] + DARK_MARGIN_MINUTES
+            lit |= (start < set_) & (end > rise)
+        return ~lit
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "cities": len(self.coords),
+            "bytes": int(self.elevation.nbytes + self.daylight.nbytes),
+        }
+
+
+def city_coords(city_assignments: Dict[str, dict]) -> list:
+    """Table coordinates for a city mapping, in a stable order."""
+    return [(info["lat"], info["lon"]) for _, info in sorted(city_assignments.items())]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    base_dir = Path(__file__).parent
+    parser = argparse.ArgumentParser(description="Build the solar ephemeris table for city_mapping.json")
+    parser.add_argument("--dir", type=Path, default=Path(os.getenv("EPHEMERIS_DIR", base_dir / "ephemeris_cache")))
+    args = parser.parse_args()
+
+    with open(base_dir / "city_mapping.json", "r", encoding="utf-8") as f:
+        coords = city_coords(json.load(f))
+    EphemerisTable.build(coords).save(args.dir)
+    print(f"✅ Wrote ephemeris for {len(coords)} cities -> {args.dir}")
@@ -0,0 +1,211 @@
+"""In-process cache of raw model output per city and mode.
+
+``energy_total`` is ``P * efficiency / 1000 * area``, so everything expensive
+(weather, features, scoring) depends only on the model, city, mode and the
+forecast hour. Entries hold the per-hour P series plus the context needed to
+rebuild a response; panel parameters are applied on the way out.
+
+An entry is a hit while it belongs to the current forecast-hour bucket and is
+younger than ``ttl``. Older entries up to ``max_age`` are reported as stale:
+callers recompute but may still serve them if recomputing fails. The cache
+is LRU-bounded and entries for a model are dropped when it is reloaded; a
+per-model generation keeps results scored by the old model from being
+stored after the invalidation.
+
+With a ``shared`` cache (workers.SharedCache) stored entries are also written
+there, and lookup_async / lookup_many_async serve a local miss from it when
+another worker has already scored the city (``lookup`` stays in-process). Shared keys carry the model's shared generation, which the
+app advances with ``set_shared_generation`` once it has reloaded the model,
+so workers never exchange entries scored by different model versions.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+HIT, STALE, MISS = "hit", "stale", "miss"
+
+
+class StoredForecast:
+    """Weather, row context and raw predictions for one city and mode."""
+
+    __slots__ = ("model", "hourly", "ctx", "P_all", "generation", "computed_at")
+
+    def __init__(self, model: str, hourly: dict, ctx: Dict[str, Any], P_all: np.ndarray,
+                 generation: int = 0, computed_at: Optional[float] = None):
+        self.model = model
+        self.hourly = hourly
+        self.ctx = ctx
+        self.P_all = P_all
+        self.generation = generation
+        self.computed_at = time.time() if computed_at is None else computed_at
+
+    def age(self, now: Optional[float] = None) -> float:
+        return max(0.0, (time.time() if now is None else now) - self.computed_at)
+
+
+class ForecastStore:
+    def __init__(
+        self,
+        max_entries: int = 2048,
+        ttl: float = 3600.0,
+        max_age: float = 3600.0,
+        bucket_offset: float = 0.0,
+        clock: Callable[[], float] = time.time,
+        shared: Optional[Any] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_age = max(max_age, ttl)
+        # forecast hours roll over this long after the hour (upstream update lag)
+        self.bucket_offset = bucket_offset
+        self._clock = clock
+        self.shared = shared
+
+        self._entries: "OrderedDict[Hashable, StoredForecast]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._shared_generations: Dict[str, int] = {}
+        # model reloads happen on executor threads
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.shared_hits = 0
+
+    def bucket(self, t: float) -> int:
+        return int((t - self.bucket_offset) // 3600)
+
+    def generation(self, model: str) -> int:
+        return self._generations.get(model, 0)
+
+    def shared_generation(self, model: str) -> int:
+        return self._shared_generations.get(model, 0)
+
+    def set_shared_generation(self, model: str, generation: int):
+        self._shared_generations[model] = generation
+
+    def _shared_key(self, model: str, city: str, mode: str) -> str:
+        return f"forecast:{model}:{self._shared_generations.get(model, 0)}:{city}:{mode}"
+
+    def _fresh(self, entry: StoredForecast, now: float) -> bool:
+        return entry.age(now) <= self.ttl and self.bucket(entry.computed_at) == self.bucket(now)
+
+    def _local(self, key: Tuple[str, str, str], now: float) -> Tuple[Optional[StoredForecast], bool]:
+        with self._lock:
+            entry = self._entries.get(key)
+            fresh = entry is not None and self._fresh(entry, now)
+            if fresh:
+                self._entries.move_to_end(key)
+            return entry, fresh
+
+    def _status(self, entry: Optional[StoredForecast], fresh: bool, shared: Optional[StoredForecast],
+                now: float) -> Tuple[Optional[StoredForecast], str]:
+        with self._lock:
+            if fresh:
+                self.hits += 1
+                return entry, HIT
+            if shared is not None:
+                self.hits += 1
+                self.shared_hits += 1
+                return shared, HIT
+            if entry is not None and entry.age(now) <= self.max_age:
+                self.stale += 1
+                return entry, STALE
+            self.misses += 1
+            return None, MISS
+
+    def lookup(self, model: str, city: str, mode: str) -> Tuple[Optional[StoredForecast], str]:
+        """(entry, status) from this process: HIT and STALE return the entry, MISS returns None."""
+        now = self._clock()
+        return self._status(*self._local((model, city, mode), now), None, now)
+
+    async def lookup_async(self, model: str, city: str, mode: str) -> Tuple[Optional[StoredForecast], str]:
+        """lookup, falling back to the shared cache when the local entry isn't fresh."""
+        return (await self.lookup_many_async([(model, city, mode)]))[0]
+
+    async def lookup_many_async(self, keys: List[Tuple[str, str, str]]) -> List[Tuple[Optional[StoredForecast], str]]:
+        """lookup_async for several (model, city, mode) keys with one shared cache read."""
+        now = self._clock()
+        local = [self._local(key, now) for key in keys]
+        adopted: Dict[Tuple[str, str, str], StoredForecast] = {}
+        wanted = {self._shared_key(*key): key for key, (_, fresh) in zip(keys, local) if not fresh}
+        if self.shared is not None and wanted:
+            found = await self.shared.run(self.shared.get_many, list(wanted))
+            for shared_key, (entry, _) in found.items():
+                if self._fresh(entry, now):
+                    adopted[wanted[shared_key]] = self._adopt(wanted[shared_key], entry)
+        return [self._status(entry, fresh, adopted.get(key), now) for key, (entry, fresh) in zip(keys, local)]
+
+    def _adopt(self, key: Tuple[str, str, str], entry: StoredForecast) -> StoredForecast:
+        model, city, mode = key
+        with self._lock:
+            entry.generation = self._generations.get(model, 0)
+            self._put(city, mode, entry)
+            self._evict()
+        return entry
+
+    def put(self, city: str, mode: str, entry: StoredForecast):
+        self.put_many(mode, {city: entry})
+
+    def put_many(self, mode: str, entries: Dict[str, StoredForecast]):
+        # one locked update: readers see the whole chunk or none of it
+        with self._lock:
+            accepted = [(city, entry) for city, entry in entries.items() if self._put(city, mode, entry)]
+            self._evict()
+        if self.shared is not None and accepted:
+            # written (and pickled) on the shared cache's thread
+            self.shared.submit(self.shared.put_many, [
+                (self._shared_key(entry.model, city, mode), entry, entry.computed_at + self.max_age)
+                for city, entry in accepted
+            ])
+
+    def _put(self, city: str, mode: str, entry: StoredForecast) -> bool:
+        if entry.generation != self._generations.get(entry.model, 0):
+            return False  # scored by a model that has since been reloaded
+        key = (entry.model, city, mode)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        return True
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, model: str):
+        """Drop every entry scored by ``model``."""
+        with self._lock:
+            self._generations[model] = self._generations.get(model, 0) + 1
+            stale = [key for key in self._entries if key[0] == model]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        now = self._clock()
+        with self._lock:
+            ages = [entry.age(now) for entry in self._entries.values()]
+        lookups = self.hits + self.misses + self.stale
+        return {
+            "entries": len(ages),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "max_age": self.max_age,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "shared_hits": self.shared_hits,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "oldest_age_s": round(max(ages), 1) if ages else None,
+        }
@@ -0,0 +1,163 @@
+"""Runs scaler + booster scoring off the asyncio event loop.
+
+Two backends:
+- "thread": a ThreadPoolExecutor sharing the app's loaded models. XGBoost
+  releases the GIL while predicting, so threads give real parallelism.
+- "process": a ProcessPoolExecutor where each worker keeps its own
+  model_io.ModelRegistry, loading models on first use. Jobs carry a per-model
+  generation so workers reload a model after model_reloaded() is called.
+
+Submissions beyond ``max_pending`` (queued + running) are rejected with
+ExecutorSaturated so callers can shed load instead of queueing unboundedly.
+"""
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+
+class ExecutorSaturated(Exception):
+    def __init__(self, pending: int, retry_after: float):
+        super().__init__(f"inference queue full ({pending} pending)")
+        self.pending = pending
+        self.retry_after = retry_after
+
+
+def score(model, scaler, features: np.ndarray) -> np.ndarray:
+    """Raw model output for already-built feature rows."""
+    features_scaled = scaler.transform(features)
+    return model.predict(features_scaled)
+
+
+def _timed_score(model, scaler, features: np.ndarray) -> Tuple[np.ndarray, float, float]:
+    # same steps as score(), timed separately: (P, scaling secs, inference secs)
+    start = time.perf_counter()
+    features_scaled = scaler.transform(features)
+    scaled = time.perf_counter()
+    P = model.predict(features_scaled)
+    return P, scaled - start, time.perf_counter() - scaled
+
+
+def _resolve_and_score(resolve, model_name: str, features: np.ndarray) -> Tuple[np.ndarray, float, float]:
+    # resolve runs on the pool thread so a first-use model load never blocks the event loop
+    model, scaler = resolve(model_name)
+    return _timed_score(model, scaler, features)
+
+
+# Per-process model registry for the "process" backend
+_WORKER_REGISTRY = None
+_WORKER_GENERATIONS: Dict[str, int] = {}
+
+
+def _init_worker(max_models: Optional[int], max_bytes: Optional[int]):
+    global _WORKER_REGISTRY
+    from model_io import ModelRegistry
+    _WORKER_REGISTRY = ModelRegistry(max_models=max_models, max_bytes=max_bytes)
+
+
+def _worker_score(model_name: str, features: np.ndarray, generation: int = 0) -> Tuple[np.ndarray, float, float]:
+    if _WORKER_GENERATIONS.get(model_name, 0) != generation:
+        model, scaler = _WORKER_REGISTRY.reload(model_name)
+        _WORKER_GENERATIONS[model_name] = generation
+    else:
+        model, scaler = _WORKER_REGISTRY.get(model_name)
+    return _timed_score(model, scaler, features)
+
+
+class InferenceExecutor:
+    def __init__(
+        self,
+        resolve: Callable[[str], Tuple[Any, Any]],
+        kind: str = "thread",
+        max_workers: Optional[int] = None,
+        max_pending: int = 64,
+        retry_after: float = 1.0,
+        worker_max_models: Optional[int] = None,
+        worker_max_bytes: Optional[int] = None,
+    ):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown inference executor kind '{kind}'")
+        self.resolve = resolve
+        self.kind = kind
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+
+        self._pool: Executor
+        if kind == "process":
+            self._pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                initializer=_init_worker,
+                initargs=(worker_max_models, worker_max_bytes),
+            )
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        self.max_workers = self._pool._max_workers
+        self._generations: Dict[str, int] = {}
+
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queued_seconds = 0.0
+        self.exec_seconds = 0.0
+
+    async def predict(self, model_name: str, features: np.ndarray) -> Tuple[np.ndarray, Dict[str, float]]:
+        """Score ``features`` with ``model_name``.
+
+        Returns the raw predictions and a timing dict with the seconds this
+        call spent queued, scaling features and running the booster.
+        """
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise ExecutorSaturated(self.pending, self.retry_after)
+
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+        if self.kind == "process":
+            job = self._pool.submit(_worker_score, model_name, features, self._generations.get(model_name, 0))
+        else:
+            job = self._pool.submit(_resolve_and_score, self.resolve, model_name, features)
+
+        # released when the job itself finishes, even if the caller stops waiting
+        self.pending += 1
+        job.add_done_callback(lambda _: self._release_from(loop))
+        fut = asyncio.wrap_future(job, loop=loop)
+        P, scaling_s, inference_s = await fut
+        total = time.perf_counter() - submitted
+        exec_s = scaling_s + inference_s
+
+        timing = {"queued": max(total - exec_s, 0.0), "scaling": scaling_s, "inference": inference_s}
+        self.completed += 1
+        self.queued_seconds += timing["queued"]
+        self.exec_seconds += exec_s
+        return P, timing
+
+    def model_reloaded(self, model_name: str):
+        """Make process workers reload ``model_name`` on their next job for it."""
+        self._generations[model_name] = self._generations.get(model_name, 0) + 1
+
+    def _release(self):
+        self.pending -= 1
+
+    def _release_from(self, loop: asyncio.AbstractEventLoop):
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            # loop already closed during shutdown
+            pass
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "workers": self.max_workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_queued_ms": round(1000 * self.queued_seconds / self.completed, 3) if self.completed else 0.0,
+            "avg_exec_ms": round(1000 * self.exec_seconds / self.completed, 3) if self.completed else 0.0,
+        }
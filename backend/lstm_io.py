@@ -0,0 +1,133 @@
+"""Serving of the per-region LSTM SavedModels (``models/<name>/lstm_model``).
+
+The LSTMs take windows of the last LSTM_WINDOW hours of the usual six
+feature columns, scaled with the region's scaler, and predict P for the
+window's last hour. They are served through the same ModelRegistry,
+MicroBatcher and InferenceExecutor as the XGBoost models, under the model
+key ``<name>:lstm``. Feature "rows" are then (window, 6) windows stacked on
+axis 0, so concurrent requests still merge into one call.
+
+TensorFlow is optional: it is imported on the first LSTM load, kept off
+any GPU, and each model is run once right after loading so the first
+request does not pay for kernel setup.
+"""
+import functools
+import logging
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("solarc.models")
+
+LSTM_WINDOW = 24
+N_FEATURES = 6
+LSTM_DIR = "lstm_model"
+# windows per TensorFlow call; larger stacks are split
+MAX_CALL_BATCH = 4096
+
+
+@functools.lru_cache(maxsize=None)
+def tensorflow_available() -> bool:
+    try:
+        import tensorflow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _fill_gaps(series: np.ndarray) -> np.ndarray:
+    """NaNs take the previous hour's value (the next one for leading gaps)."""
+    filled = series.copy()
+    for column in filled.T:
+        ok = np.isfinite(column)
+        if ok.all():
+            continue
+        if not ok.any():
+            column[:] = 0.0
+            continue
+        idx = np.where(ok, np.arange(len(column)), 0)
+        np.maximum.accumulate(idx, out=idx)
+        first = int(np.argmax(ok))
+        idx[:first] = first
+        column[:] = column[idx]
+    return filled
+
+
+def sliding_windows(series: np.ndarray, window: int = LSTM_WINDOW) -> np.ndarray:
+    """(hours, window, features) windows ending at every hour of ``series``.
+
+    Hours before the start of the series repeat its first row, and gaps are
+    filled from neighbouring hours so one missing value doesn't void a
+    whole day of windows.
+    """
+    series = _fill_gaps(np.asarray(series, dtype=float))
+    padded = np.concatenate([np.repeat(series[:1], window - 1, axis=0), series])
+    # sliding_window_view puts the window last: (hours, features, window)
+    return np.lib.stride_tricks.sliding_window_view(padded, window, axis=0).transpose(0, 2, 1)
+
+
+class WindowScaler:
+    """Applies a row scaler to every hour of stacked windows."""
+
+    def __init__(self, scaler: Any):
+        self.scaler = scaler
+
+    def transform(self, windows: np.ndarray) -> np.ndarray:
+        flat = self.scaler.transform(windows.reshape(-1, windows.shape[-1]))
+        return flat.reshape(windows.shape)
+
+
+class LSTMWrapper:
+    def __init__(self, loaded: Any, signature: Any, input_name: str, output_name: str):
+        self._loaded = loaded  # keeps the variables the signature reads alive
+        self.signature = signature
+        self.input_name = input_name
+        self.output_name = output_name
+
+    def predict(self, windows: np.ndarray) -> np.ndarray:
+        import tensorflow as tf
+
+        windows = np.asarray(windows, dtype=np.float32)
+        out = []
+        for start in range(0, len(windows), MAX_CALL_BATCH):
+            batch = tf.constant(windows[start:start + MAX_CALL_BATCH])
+            out.append(self.signature(**{self.input_name: batch})[self.output_name].numpy().reshape(-1))
+        return np.concatenate(out) if out else np.zeros(0, dtype=np.float32)
+
+
+def _import_tensorflow():
+    import tensorflow as tf
+
+    try:
+        tf.config.set_visible_devices([], "GPU")
+    except (RuntimeError, ValueError):
+        pass  # devices already initialised by an earlier load
+    return tf
+
+
+def load_lstm(folder: Path, scaler: Any) -> Tuple[LSTMWrapper, WindowScaler]:
+    tf = _import_tensorflow()
+    path = Path(folder) / LSTM_DIR
+    if not (path / "saved_model.pb").exists():
+        raise FileNotFoundError(f"LSTM SavedModel not found in '{folder}'")
+
+    loaded = tf.saved_model.load(str(path))
+    signature = loaded.signatures["serving_default"]
+    (input_name, spec), = signature.structured_input_signature[1].items()
+    if tuple(spec.shape[1:]) != (LSTM_WINDOW, N_FEATURES):
+        raise ValueError(f"LSTM in '{folder}' expects windows of {tuple(spec.shape[1:])}, "
+                         f"not ({LSTM_WINDOW}, {N_FEATURES})")
+    output_name = next(iter(signature.structured_outputs))
+    model = LSTMWrapper(loaded, signature, input_name, output_name)
+
+    # first call sets up the kernels; do it now rather than on a request
+    model.predict(np.zeros((1, LSTM_WINDOW, N_FEATURES), dtype=np.float32))
+    logger.info("✅ Loaded LSTM for '%s'", Path(folder).name)
+    return model, WindowScaler(scaler)
+
+
+def lstm_footprint(folder: Optional[Path]) -> int:
+    if folder is None or not (folder / LSTM_DIR).exists():
+        return 0
+    return sum(p.stat().st_size for p in (folder / LSTM_DIR).rglob("*") if p.is_file())
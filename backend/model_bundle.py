@@ -0,0 +1,249 @@
+"""Packed single-file model bundles for fast cold starts.
+
+A bundle (``models/<name>/model.bundle``) holds everything needed to serve a
+region without JSON-parsing the booster or unpickling the scaler:
+
+    8 bytes   magic b"SOLARCMB"
+    u32       format version
+    u32       header length (bytes)
+    header    UTF-8 JSON: section table, scaler flags, metrics.json, the
+              size, mtime and SHA-256 of each source file and a CRC32 of
+              the payload
+    padding   to a 64-byte boundary
+    payload   sections, each 64-byte aligned:
+              "booster"       XGBoost model in binary UBJSON
+              "scaler_mean"   float64 vector (little endian)
+              "scaler_scale"  float64 vector (little endian)
+
+The file is memory-mapped on load; the scaler vectors are read straight out
+of the mapping without copying. A bundle is stale once xgb_model.json or
+scaler.pkl no longer matches it: sources whose size and mtime are unchanged
+are taken as is, the others are compared by content hash (a refit scaler is
+always the same size, and a checkout resets mtimes).
+
+Convert the existing model folders with:
+    python model_bundle.py            # every folder under models/
+    python model_bundle.py hassan     # just one region
+"""
+import hashlib
+import json
+import mmap
+import struct
+import sys
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b"SOLARCMB"
+FORMAT_VERSION = 1
+BUNDLE_NAME = "model.bundle"
+ALIGN = 64
+
+_PREAMBLE = struct.Struct("<8sII")
+
+
+class BundleError(Exception):
+    """The bundle is missing, corrupt, stale or from an unsupported version."""
+
+
+class ArrayScaler:
+    """Drop-in for a fitted sklearn StandardScaler's ``transform``."""
+
+    def __init__(self, mean: Optional[np.ndarray], scale: Optional[np.ndarray]):
+        self.mean_ = mean
+        self.scale_ = scale
+        self.n_features_in_ = len(mean if mean is not None else scale)
+
+    def transform(self, X):
+        # same operation order as StandardScaler.transform, so results are identical
+        X = np.array(X, dtype=np.float64)
+        if self.mean_ is not None:
+            X -= self.mean_
+        if self.scale_ is not None:
+            X /= self.scale_
+        return X
+
+
+def _pad(n: int) -> int:
+    return (-n) % ALIGN
+
+
+def bundle_path(folder: Path) -> Path:
+    return Path(folder) / BUNDLE_NAME
+
+
+SOURCES = ("xgb_model.json", "scaler.pkl")
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_info(folder: Path) -> Dict[str, Dict[str, Any]]:
+    """Size, mtime_ns and SHA-256 of the files a bundle is packed from."""
+    folder = Path(folder)
+    info = {}
+    for name in SOURCES:
+        path = folder / name
+        if path.exists():
+            st = path.stat()
+            info[name] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": _sha256(path)}
+    return info
+
+
+def sources_match(folder: Path, recorded: Any) -> bool:
+    """True if ``folder``'s sources are the ones recorded in a bundle header."""
+    folder = Path(folder)
+    present = [name for name in SOURCES if (folder / name).exists()]
+    if not present:
+        return True  # bundle-only deployment
+    if not isinstance(recorded, dict) or set(recorded) != set(present):
+        return False
+    for name in present:
+        entry = recorded[name]
+        if not isinstance(entry, dict):
+            return False  # written by an older version that recorded sizes only
+        st = (folder / name).stat()
+        if st.st_size != entry.get("size"):
+            return False
+        if st.st_mtime_ns != entry.get("mtime_ns") and _sha256(folder / name) != entry.get("sha256"):
+            return False
+    return True
+
+
+def write_bundle(folder: Path, out_path: Optional[Path] = None) -> Path:
+    """Pack ``folder``'s xgb_model.json, scaler.pkl and metrics.json."""
+    import joblib
+    import xgboost as xgb
+
+    folder = Path(folder)
+    out_path = Path(out_path) if out_path else bundle_path(folder)
+
+    booster = xgb.Booster()
+    booster.load_model(str(folder / "xgb_model.json"))
+    scaler = joblib.load(folder / "scaler.pkl")
+
+    metrics: Dict[str, Any] = {}
+    if (folder / "metrics.json").exists():
+        with open(folder / "metrics.json", "r", encoding="utf-8") as f:
+            metrics = json.load(f)
+
+    sections = {"booster": bytes(booster.save_raw("ubj"))}
+    scaler_info = {
+        "with_mean": scaler.mean_ is not None and getattr(scaler, "with_mean", True),
+        "with_std": scaler.scale_ is not None and getattr(scaler, "with_std", True),
+        "n_features_in": int(scaler.n_features_in_),
+    }
+    if scaler_info["with_mean"]:
+        sections["scaler_mean"] = np.ascontiguousarray(scaler.mean_, dtype="<f8").tobytes()
+    if scaler_info["with_std"]:
+        sections["scaler_scale"] = np.ascontiguousarray(scaler.scale_, dtype="<f8").tobytes()
+
+    payload = bytearray()
+    table = {}
+    for name, data in sections.items():
+        table[name] = {"offset": len(payload), "length": len(data)}
+        payload += data + b"\0" * _pad(len(data))
+
+    header = json.dumps({
+        "name": folder.name,
+        "created_at": datetime.now().isoformat(),
+        "xgboost_version": xgb.__version__,
+        "sections": table,
+        "scaler": scaler_info,
+        "metrics": metrics,
+        "source": source_info(folder),
+        "crc32": zlib.crc32(payload),
+    }).encode("utf-8")
+
+    preamble = _PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header))
+    head = preamble + header
+    tmp = out_path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        f.write(head + b"\0" * _pad(len(head)))
+        f.write(payload)
+    tmp.replace(out_path)
+    return out_path
+
+
+def read_bundle(path: Path, verify: bool = True) -> Tuple[bytearray, ArrayScaler, Dict[str, Any]]:
+    """Memory-map a bundle and return (booster UBJSON bytes, scaler, header)."""
+    path = Path(path)
+    try:
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as e:
+        raise BundleError(f"Cannot map {path}: {e}")
+
+    if len(mm) < _PREAMBLE.size:
+        raise BundleError(f"{path} is truncated")
+    magic, version, header_len = _PREAMBLE.unpack_from(mm, 0)
+    if magic != MAGIC:
+        raise BundleError(f"{path} is not a model bundle")
+    if version != FORMAT_VERSION:
+        raise BundleError(f"{path} has format version {version}, expected {FORMAT_VERSION}")
+
+    head_len = _PREAMBLE.size + header_len
+    header = json.loads(bytes(mm[_PREAMBLE.size:head_len]).decode("utf-8"))
+    base = head_len + _pad(head_len)
+
+    if verify and zlib.crc32(memoryview(mm)[base:]) != header["crc32"]:
+        raise BundleError(f"{path} failed its checksum")
+
+    def section(name: str) -> memoryview:
+        info = header["sections"][name]
+        start = base + info["offset"]
+        return memoryview(mm)[start:start + info["length"]]
+
+    def vector(name: str) -> Optional[np.ndarray]:
+        if name not in header["sections"]:
+            return None
+        return np.frombuffer(section(name), dtype="<f8")
+
+    scaler = ArrayScaler(vector("scaler_mean"), vector("scaler_scale"))
+    return bytearray(section("booster")), scaler, header
+
+
+def load_bundle(folder: Path, verify: bool = True):
+    """(XGBBoosterWrapper, ArrayScaler, header) for a model folder's bundle.
+
+    Raises BundleError when the bundle is absent, corrupt, packed from
+    different xgb_model.json / scaler.pkl files than the ones in ``folder``,
+    or holds a booster this xgboost cannot read.
+    """
+    import xgboost as xgb
+    from model_io import XGBBoosterWrapper
+
+    path = bundle_path(folder)
+    if not path.exists():
+        raise BundleError(f"{path} not found")
+
+    raw, scaler, header = read_bundle(path, verify=verify)
+    if not sources_match(folder, header.get("source")):
+        raise BundleError(f"{path} is stale; re-run model_bundle.py")
+
+    booster = xgb.Booster()
+    try:
+        booster.load_model(raw)
+    except xgb.core.XGBoostError as e:
+        raise BundleError(f"{path} booster (xgboost {header.get('xgboost_version')}) failed to load: {e}")
+    return XGBBoosterWrapper(booster), scaler, header
+
+
+def main(argv):
+    models_dir = Path(__file__).parent / "models"
+    names = argv or sorted(p.name for p in models_dir.iterdir() if (p / "xgb_model.json").exists())
+    for name in names:
+        out = write_bundle(models_dir / name)
+        print(f"✅ Packed '{name}' -> {out} ({out.stat().st_size / 1e6:.2f} MB)")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,256 @@
+"""Loading of the per-region XGBoost models and their feature scalers.
+
+Kept separate from app.py so inference worker processes can load models
+without importing (and re-initialising) the web app. A model key is the
+region name for its XGBoost model, or ``<name>:lstm`` for its LSTM (see
+lstm_io.py); everything here takes keys.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+BASE_DIR = Path(__file__).parent
+
+logger = logging.getLogger("solarc.models")
+
+# "auto" prefers a fresh model.bundle and falls back to xgb_model.json + scaler.pkl
+MODEL_FORMAT = os.getenv("MODEL_FORMAT", "auto")
+
+LSTM_SUFFIX = ":lstm"
+
+def lstm_key(name: str) -> str:
+    return name + LSTM_SUFFIX
+
+def split_model_key(key: str) -> Tuple[str, str]:
+    """(region name, family) for a model key; family is "xgboost" or "lstm"."""
+    if key.endswith(LSTM_SUFFIX):
+        return key[:-len(LSTM_SUFFIX)], "lstm"
+    return key, "xgboost"
+
+# XGBoost wrapper (xgboost/joblib are imported lazily to keep cold starts short)
+class XGBBoosterWrapper:
+    def __init__(self, booster: "xgb.Booster"):
+        self.booster = booster
+
+    def predict(self, X):
+        import xgboost as xgb
+        dmat = xgb.DMatrix(X)
+        return self.booster.predict(dmat)
+
+def find_model_folder(key: str) -> Optional[Path]:
+    name, family = split_model_key(key)
+    folder1 = BASE_DIR.parent / "models" / name
+    folder2 = BASE_DIR / "models" / name
+
+    for folder in (folder1, folder2):
+        if (folder / "xgb_model.json").exists():
+            if family == "lstm" and not (folder / "lstm_model" / "saved_model.pb").exists():
+                return None
+            return folder
+    return None
+
+def load_model_for(name: str, model_format: Optional[str] = None):
+    folder = find_model_folder(name)
+    if folder is None:
+        raise FileNotFoundError(f"xgb_model.json not found for '{name}'")
+
+    if split_model_key(name)[1] == "lstm":
+        import joblib
+        from lstm_io import load_lstm
+        return load_lstm(folder, joblib.load(folder / "scaler.pkl"))
+
+    model_format = model_format or MODEL_FORMAT
+    if model_format in ("auto", "bundle"):
+        from model_bundle import BundleError, load_bundle
+        try:
+            model, scaler, _ = load_bundle(folder)
+            logger.info("✅ Loaded model bundle for '%s'", name)
+            return model, scaler
+        except BundleError as e:
+            if model_format == "bundle":
+                raise
+            if folder.joinpath("model.bundle").exists():
+                logger.warning("⚠️ Ignoring model bundle for '%s': %s", name, e)
+
+    return load_legacy_model(folder)
+
+def load_legacy_model(folder: Path):
+    import joblib
+    import xgboost as xgb
+
+    name = folder.name
+    model_json_path = folder / "xgb_model.json"
+    scaler_path = folder / "scaler.pkl"
+
+    booster = xgb.Booster()
+    booster.load_model(str(model_json_path))
+    model = XGBBoosterWrapper(booster)
+
+    if not scaler_path.exists():
+        raise FileNotFoundError(f"Scaler file not found for '{name}'")
+    scaler = joblib.load(scaler_path)
+
+    logger.info("✅ Loaded model and scaler for '%s'", name)
+    return model, scaler
+
+def model_footprint(name: str) -> int:
+    """Rough resident size of a loaded model: its on-disk model + scaler size."""
+    folder = find_model_folder(name)
+    if folder is None:
+        return 0
+    if split_model_key(name)[1] == "lstm":
+        from lstm_io import lstm_footprint
+        return lstm_footprint(folder) + (folder / "scaler.pkl").stat().st_size
+    return sum(p.stat().st_size for p in (folder / "xgb_model.json", folder / "scaler.pkl") if p.exists())
+
+def model_version(name: str) -> Tuple:
+    """(file, mtime, size) of everything a load reads; changes when the model is replaced."""
+    folder = find_model_folder(name)
+    if folder is None:
+        return ()
+    if split_model_key(name)[1] == "lstm":
+        files = (folder / "lstm_model" / "saved_model.pb",
+                 folder / "lstm_model" / "variables" / "variables.data-00000-of-00001",
+                 folder / "scaler.pkl")
+    else:
+        files = (folder / "model.bundle", folder / "xgb_model.json", folder / "scaler.pkl")
+    return tuple((p.name, p.stat().st_mtime_ns, p.stat().st_size) for p in files if p.exists())
+
+class ModelRegistry:
+    """Loads models on first use and keeps at most ``max_models`` (and/or
+    ``max_bytes``) of them resident, evicting the least recently used.
+
+    Thread-safe: concurrent first requests for a model share one load.
+    Callbacks registered with on_reload are called with the model name after
+    reload(), or when a model comes back from eviction with different files.
+    """
+
+    def __init__(self, max_models: Optional[int] = None, max_bytes: Optional[int] = None,
+                 loader=load_model_for):
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.loader = loader
+
+        self._models: "OrderedDict[str, Tuple[Any, Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._versions: Dict[str, Tuple] = {}
+        self._reload_listeners: List[Callable[[str], None]] = []
+
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+
+    def available(self, name: str) -> bool:
+        return name in self._models or find_model_folder(name) is not None
+
+    def loaded(self) -> list:
+        return list(self._models)
+
+    def resident_bytes(self) -> int:
+        return sum(entry[2] for entry in self._models.values())
+
+    def get(self, name: str) -> Tuple[Any, Any]:
+        """(model, scaler) for ``name``, loading it if needed."""
+        with self._lock:
+            entry = self._models.get(name)
+            if entry is not None:
+                self._models.move_to_end(name)
+                self.hits += 1
+                return entry[0], entry[1]
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        with load_lock:
+            # another thread may have finished loading while we waited
+            with self._lock:
+                entry = self._models.get(name)
+                if entry is not None:
+                    self._models.move_to_end(name)
+                    self.hits += 1
+                    return entry[0], entry[1]
+
+            start = time.perf_counter()
+            version = model_version(name)
+            model, scaler = self.loader(name)
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                self._models[name] = (model, scaler, model_footprint(name))
+                self.loads += 1
+                self.load_seconds += elapsed
+                self._evict(keep=name)
+                previous = self._versions.get(name)
+                self._versions[name] = version
+            if previous is not None and previous != version:
+                self._notify_reload(name)
+            return model, scaler
+
+    def _evict(self, keep: str):
+        while len(self._models) > 1 and (
+            (self.max_models is not None and len(self._models) > self.max_models)
+            or (self.max_bytes is not None and self.resident_bytes() > self.max_bytes)
+        ):
+            oldest = next(iter(self._models))
+            if oldest == keep:
+                break
+            del self._models[oldest]
+            self.evictions += 1
+            logger.info("♻️ Evicted model '%s' from registry", oldest)
+
+    def evict(self, name: str) -> bool:
+        with self._lock:
+            return self._models.pop(name, None) is not None
+
+    def reload(self, name: str) -> Tuple[Any, Any]:
+        """Load ``name`` again from disk, replacing the resident copy."""
+        with self._lock:
+            self._versions.pop(name, None)
+        # load first so requests keep the old copy until the new one is ready
+        start = time.perf_counter()
+        version = model_version(name)
+        model, scaler = self.loader(name)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._models[name] = (model, scaler, model_footprint(name))
+            self._models.move_to_end(name)
+            self.loads += 1
+            self.load_seconds += elapsed
+            self._evict(keep=name)
+            self._versions[name] = version
+        logger.info("🔄 Reloaded model '%s'", name)
+        self._notify_reload(name)
+        return model, scaler
+
+    def on_reload(self, callback: Callable[[str], None]):
+        self._reload_listeners.append(callback)
+
+    def _notify_reload(self, name: str):
+        for callback in self._reload_listeners:
+            try:
+                callback(name)
+            except Exception as e:
+                logger.error("❌ Reload callback for '%s' failed: %s", name, e)
+
+    def prewarm(self, names: Iterable[str]):
+        for name in names:
+            try:
+                self.get(name)
+            except Exception as e:
+                logger.error("❌ Failed to pre-warm model '%s': %s", name, e)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.loaded(),
+            "resident_bytes": self.resident_bytes(),
+            "max_models": self.max_models,
+            "max_bytes": self.max_bytes,
+            "loads": self.loads,
+            "hits": self.hits,
+            "evictions": self.evictions,
+            "avg_load_ms": round(1000 * self.load_seconds / self.loads, 1) if self.loads else 0.0,
+        }
@@ -0,0 +1,132 @@
+"""Background forecast precomputation.
+
+Every city has a fixed location and model, so its per-m² prediction series
+only changes when the weather does. PrecomputeScheduler refreshes those
+series for all cities, a chunk of cities at a time with a pause between
+chunks so upstream calls are spread out, and swaps each chunk's results into
+the ForecastStore in one step. Requests then only scale a stored series by
+area and efficiency.
+
+Stored entries are only fresh within their forecast-hour bucket, so a pass
+starts as soon as the store's bucket rolls over (the hour plus its
+``bucket_offset``), and further passes every ``interval`` seconds within the
+hour.
+
+A failed refresh keeps the previous results in place; they stay servable as
+stale entries until the store's ``max_age``.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence
+
+from forecast_cache import ForecastStore, StoredForecast
+
+logger = logging.getLogger("solarc.precompute")
+
+
+# refresh(mode, cities) -> {city: StoredForecast} for the cities it could compute
+Refresh = Callable[[str, List[str]], Awaitable[Dict[str, StoredForecast]]]
+
+
+class PrecomputeScheduler:
+    def __init__(
+        self,
+        refresh: Refresh,
+        store: ForecastStore,
+        cities: Callable[[], Iterable[str]],
+        modes: Sequence[str],
+        interval: float = 900.0,
+        chunk_size: int = 50,
+        stagger: float = 1.0,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep,
+    ):
+        self.refresh = refresh
+        self.store = store
+        self.cities = cities
+        self.modes = tuple(modes)
+        self.interval = interval
+        self.chunk_size = max(1, chunk_size)
+        self.stagger = stagger
+        self._clock = clock
+        self._sleep = sleep
+
+        self._task: Optional[asyncio.Task] = None
+
+        self.runs = 0
+        self.refreshed = 0
+        self.failures = 0
+        self.last_started: Optional[float] = None
+        self.last_duration: Optional[float] = None
+
+    def start(self):
+        if self._task is None and self.interval > 0 and self.modes:
+            self._task = asyncio.ensure_future(self._loop())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def next_run(self, started: float) -> float:
+        """When the pass after one started at ``started`` is due: ``interval``
+        later, or at the next bucket rollover if that comes first."""
+        rollover = (self.store.bucket(started) + 1) * 3600 + self.store.bucket_offset
+        return min(started + self.interval, rollover)
+
+    async def _loop(self):
+        while True:
+            started = self._clock()
+            await self.run_once()
+            await self._sleep(max(0.0, self.next_run(started) - self._clock()))
+
+    async def run_once(self):
+        """Refresh every mode for every city, one chunk at a time."""
+        self.last_started = self._clock()
+        started = time.perf_counter()
+        names = sorted(self.cities())
+        failed = 0
+        first = True
+        for mode in self.modes:
+            for start in range(0, len(names), self.chunk_size):
+                if not first and self.stagger > 0:
+                    await asyncio.sleep(self.stagger)
+                first = False
+
+                chunk = names[start:start + self.chunk_size]
+                try:
+                    entries = await self.refresh(mode, chunk)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    failed += len(chunk)
+                    logger.warning("Precompute of %d %s forecasts failed: %s", len(chunk), mode, e)
+                    continue
+                self.store.put_many(mode, entries)
+                self.refreshed += len(entries)
+                failed += len(chunk) - len(entries)
+        self.runs += 1
+        self.failures += failed
+        self.last_duration = time.perf_counter() - started
+        if failed:
+            logger.warning("Precompute kept previous forecasts for %d of %d city/mode pairs",
+                           failed, len(names) * len(self.modes))
+        logger.info("Precomputed forecasts for %d cities x %d modes in %.1fs",
+                    len(names), len(self.modes), self.last_duration)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "modes": list(self.modes),
+            "interval_s": self.interval,
+            "runs": self.runs,
+            "refreshed": self.refreshed,
+            "failures": self.failures,
+            "last_started": self.last_started,
+            "last_duration_s": round(self.last_duration, 3) if self.last_duration is not None else None,
+        }
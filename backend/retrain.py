@@ -0,0 +1,370 @@
+"""Incremental retraining of the regional XGBoost models.
+
+Training data streams out of the dataset store (dataset_store.py) in
+batches of BATCH_ROWS rows, in the serving feature layout (see
+backtest.historical_features). Batches go through an xgboost DataIter into
+an external-memory ExtMemQuantileDMatrix whose pages are cached on disk,
+so memory stays at about one batch plus the booster however much history
+is used.
+
+Two modes:
+- warm (default): load the region's current ``xgb_model.json`` and add
+  ``--rounds`` trees fitted on the new data, by default everything after
+  the ``trained_through`` time recorded by the previous retrain. Models
+  that have never been retrained (the shipped ones) record no such time,
+  so they need ``--since``: the end of the data they were trained on.
+  Otherwise the new trees would refit, and the held-out check score, days
+  the current model has already seen. The existing trees split on scaled
+  features, so the region's scaler is kept as it is.
+- ``--scratch``: fit a new StandardScaler incrementally (partial_fit over
+  the same stream) and then train a new booster from scratch.
+
+Every tenth day is held out. The held-out rows score both the new model
+and the current one, so each version records whether it is an
+improvement.
+
+Each run writes ``models/<name>/versions/<UTC timestamp>/`` with
+xgb_model.json, scaler.pkl and metrics.json. ``--publish`` then copies the
+version into ``models/<name>/``, but only when it is no worse than the
+current model on the held-out days (``--force`` to publish anyway). The
+version's metrics are merged into the region's metrics.json, which keeps
+its other sections (such as ``backtest``) and, on the first publish, the
+original training results under ``"initial_training"``. It also rebuilds
+model.bundle when the region has one. A running server picks the
+files up on the next POST /models/<name>/reload, or when the model is next
+loaded after an eviction.
+
+Regions train concurrently, ``--parallel`` at a time, and share ``--cpus``
+xgboost threads between them.
+
+Usage (from backend/):
+    python retrain.py [--models hassan,karwar] [--since 2024-01-01] [--until ...]
+                      [--rounds 100] [--scratch] [--parallel 2] [--cpus N] [--publish]
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import xgboost as xgb
+
+from backtest import assign_partition, error_sums, historical_features, metrics_from_sums, resolve_columns
+from dataset_store import DEFAULT_ROOT, TIME_COLUMN, DatasetStore, column_to_numpy
+
+logger = logging.getLogger("solarc.retrain")
+
+BASE_DIR = Path(__file__).parent
+BATCH_ROWS = 262_144
+VALID_EVERY_DAYS = 10
+VERSIONS_DIR = "versions"
+PUBLISHED_FILES = ("scaler.pkl", "xgb_model.json", "metrics.json")
+
+# Settings the shipped models were trained with; a booster's own
+# "scikit_learn" attribute takes precedence when it has one
+DEFAULT_PARAMS = {
+    "objective": "reg:squarederror",
+    "eta": 0.01,
+    "max_depth": 5,
+    "subsample": 0.8,
+    "colsample_bytree": 0.8,
+}
+_SKLEARN_PARAMS = {
+    "objective": "objective", "learning_rate": "eta", "max_depth": "max_depth",
+    "subsample": "subsample", "colsample_bytree": "colsample_bytree",
+    "min_child_weight": "min_child_weight", "gamma": "gamma",
+    "reg_alpha": "alpha", "reg_lambda": "lambda",
+}
+
+Batch = Tuple[np.ndarray, np.ndarray]
+
+
+def training_params(booster: Optional[xgb.Booster], threads: int) -> Dict[str, Any]:
+    params = dict(DEFAULT_PARAMS)
+    raw = booster.attr("scikit_learn") if booster is not None else None
+    if raw:
+        sk = json.loads(raw)
+        params.update({ours: sk[theirs] for theirs, ours in _SKLEARN_PARAMS.items() if sk.get(theirs) is not None})
+    # GPU-era tree methods in the saved settings are replaced; external memory needs hist
+    params.update(tree_method="hist", nthread=threads, seed=42)
+    return params
+
+
+def feature_batches(store: DatasetStore, parts: List[Tuple[Dict[str, Any], float, float]],
+                    roles: Dict[str, Optional[str]], split: str, since: Optional[str], until: Optional[str],
+                    batch_rows: int = BATCH_ROWS) -> Iterator[Batch]:
+    """Unscaled (features, target) batches of about ``batch_rows`` rows from
+    the training (``split="train"``) or held-out (``"valid"``) days."""
+    columns = sorted({c for c in roles.values() if c})
+    buffered: List[Batch] = []
+    count = 0
+    for p, lat, lon in parts:
+        table = store.read(p, columns, since, until)
+        data = {name: column_to_numpy(table.column(name)) for name in table.column_names}
+        features, target, valid = historical_features(data, roles, lat, lon)
+        days = data[TIME_COLUMN].astype("datetime64[D]").astype(np.int64)
+        held_out = days % VALID_EVERY_DAYS == VALID_EVERY_DAYS - 1
+        keep = valid & (held_out if split == "valid" else ~held_out)
+        if keep.any():
+            buffered.append((features[keep], target[keep]))
+            count += int(keep.sum())
+        if count >= batch_rows:
+            yield np.concatenate([b[0] for b in buffered]), np.concatenate([b[1] for b in buffered])
+            buffered, count = [], 0
+    if buffered:
+        yield np.concatenate([b[0] for b in buffered]), np.concatenate([b[1] for b in buffered])
+
+
+class ScaledBatches(xgb.DataIter):
+    """Feeds scaled batches from ``make_batches()`` to xgboost, restarting it on reset()."""
+
+    def __init__(self, make_batches: Callable[[], Iterator[Batch]], scaler: Any, cache_prefix: str):
+        self._make_batches = make_batches
+        self._scaler = scaler
+        self._batches: Optional[Iterator[Batch]] = None
+        self.rows = 0
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data) -> bool:
+        if self._batches is None:
+            self._batches = self._make_batches()
+            self.rows = 0
+        batch = next(self._batches, None)
+        if batch is None:
+            return False
+        X, y = batch
+        input_data(data=self._scaler.transform(X), label=y)
+        self.rows += len(y)
+        return True
+
+    def reset(self):
+        self._batches = None
+
+
+def evaluate(model: Any, scaler: Any, batches: Iterator[Batch]) -> Dict[str, Any]:
+    from inference import score
+
+    sums = np.zeros(5)
+    for X, y in batches:
+        sums += error_sums(np.zeros(len(y), dtype=np.int64), 1, y, score(model, scaler, X))[0]
+    return metrics_from_sums(sums)
+
+
+def _read_metrics(folder: Optional[Path]) -> Dict[str, Any]:
+    try:
+        with open(folder / "metrics.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (TypeError, OSError, ValueError):
+        return {}
+
+
+def improves(new_valid: Dict[str, Any], old_valid: Optional[Dict[str, Any]]) -> bool:
+    """True if held-out metrics ``new_valid`` are no worse than ``old_valid``."""
+    if old_valid is None or old_valid["rmse"] is None:
+        return True
+    return new_valid["rmse"] is not None and new_valid["rmse"] <= old_valid["rmse"]
+
+
+def merged_metrics(current: Dict[str, Any], version: Dict[str, Any]) -> Dict[str, Any]:
+    """The region's metrics.json after publishing a version with ``version`` metrics."""
+    merged = dict(current)
+    if current and "retrain" not in current and "initial_training" not in current:
+        merged["initial_training"] = {k: v for k, v in current.items() if k not in ("backtest", "lstm")}
+    merged.update(version)
+    return merged
+
+
+def publish_version(folder: Path, version_dir: Path):
+    """Make ``version_dir`` the region's served model."""
+    from model_bundle import bundle_path, write_bundle
+
+    metrics = merged_metrics(_read_metrics(folder), _read_metrics(version_dir))
+    for name in PUBLISHED_FILES:
+        tmp = folder / (name + ".tmp")
+        if name == "metrics.json":
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(metrics, f, indent=2)
+        else:
+            shutil.copy2(version_dir / name, tmp)
+        os.replace(tmp, folder / name)
+    if bundle_path(folder).exists():
+        write_bundle(folder)
+
+
+def retrain_region(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Train one region's new version (runs in a pool worker)."""
+    import joblib
+    from sklearn.preprocessing import StandardScaler
+    from model_io import XGBBoosterWrapper, find_model_folder, load_legacy_model
+
+    started = time.perf_counter()
+    start_stamp = datetime.now(timezone.utc)
+    name, threads = job["name"], job["threads"]
+    folder = find_model_folder(name) or BASE_DIR / "models" / name
+    parent_metrics = _read_metrics(folder)
+    parent = load_legacy_model(folder) if (folder / "xgb_model.json").exists() else None
+    if parent is None and not job["scratch"]:
+        raise FileNotFoundError(f"No current model for '{name}' to warm-start from; use --scratch")
+
+    since = job["since"]
+    if since is None and not job["scratch"]:
+        through = parent_metrics.get("retrain", {}).get("trained_through")
+        if not through:
+            raise ValueError(f"'{name}' records no trained_through time; pass --since with the end of "
+                             f"the data it was trained on (or use --scratch)")
+        since = str(np.datetime64(through, "s") + np.timedelta64(1, "s"))
+    until = job["until"]
+
+    store = DatasetStore(job["root"])
+    wanted = {(c, y): (lat, lon) for c, y, lat, lon in job["parts"]}
+    parts = [(p, *wanted[(p["city"], p["year"])]) for p in store.select(None, since, until)
+             if (p["city"], p["year"]) in wanted]
+    roles = job["roles"]
+
+    def batches(split: str) -> Iterator[Batch]:
+        return feature_batches(store, parts, roles, split, since, until, job["batch_rows"])
+
+    if job["scratch"]:
+        scaler = StandardScaler()
+        for X, _ in batches("train"):
+            scaler.partial_fit(X)
+        if not hasattr(scaler, "mean_"):
+            return {"name": name, "status": "skipped", "reason": "no training rows"}
+    else:
+        scaler = parent[1]
+
+    cache_dir = tempfile.mkdtemp(prefix=f"retrain-{name}-")
+    try:
+        train_iter = ScaledBatches(lambda: batches("train"), scaler, os.path.join(cache_dir, "train"))
+        try:
+            dtrain = xgb.ExtMemQuantileDMatrix(train_iter, max_bin=256, nthread=threads)
+        except xgb.core.XGBoostError:
+            if train_iter.rows == 0:
+                return {"name": name, "status": "skipped", "reason": "no training rows"}
+            raise
+        parent_booster = parent[0].booster if parent is not None else None
+        params = training_params(parent_booster, threads)
+        booster = xgb.train(params, dtrain, job["rounds"],
+                            xgb_model=None if job["scratch"] else parent_booster)
+        rows_train = train_iter.rows
+        del dtrain
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    new_valid = evaluate(XGBBoosterWrapper(booster), scaler, batches("valid"))
+    old_valid = evaluate(parent[0], parent[1], batches("valid")) if parent is not None else None
+
+    ends = [min(p["_end"], np.datetime64(until, "s") - np.timedelta64(1, "s")) if until else p["_end"]
+            for p, _, _ in parts]
+    version = start_stamp.strftime("%Y%m%dT%H%M%SZ")
+    version_dir = folder / VERSIONS_DIR / version
+    version_dir.mkdir(parents=True, exist_ok=True)
+    booster.save_model(str(version_dir / "xgb_model.json"))
+    joblib.dump(scaler, version_dir / "scaler.pkl")
+
+    metrics = {
+        "location": name,
+        "start": start_stamp.isoformat(),
+        "version": version,
+        "xgboost": {**new_valid, "trees": booster.num_boosted_rounds()},
+        "retrain": {
+            "mode": "scratch" if job["scratch"] else "warm",
+            "parent": parent_metrics.get("version"),
+            "since": since,
+            "until": until,
+            "trained_through": str(max(ends)) if ends else since,
+            "rows_train": rows_train,
+            "rounds_added": job["rounds"],
+            "params": {k: v for k, v in params.items() if k != "nthread"},
+            "parent_valid": old_valid,
+        },
+        "total_time_min": (time.perf_counter() - started) / 60.0,
+        "completed_at": datetime.now(timezone.utc).isoformat(),
+    }
+    if "lstm" in parent_metrics:
+        metrics["lstm"] = parent_metrics["lstm"]  # not retrained here
+    with open(version_dir / "metrics.json", "w", encoding="utf-8") as f:
+        json.dump(metrics, f, indent=2)
+
+    improved = improves(new_valid, old_valid)
+    published = False
+    if job["publish"] and (improved or job["force"]):
+        publish_version(folder, version_dir)
+        published = True
+    return {
+        "name": name, "status": "trained", "version": str(version_dir), "published": published,
+        "improved": improved, "rows_train": rows_train, "valid": new_valid, "parent_valid": old_valid,
+        "minutes": metrics["total_time_min"],
+    }
+
+
+def plan_jobs(store: DatasetStore, city_assignments: Dict[str, dict], models: Optional[List[str]],
+              **options) -> List[Dict[str, Any]]:
+    roles = resolve_columns(store.columns)
+    parts: Dict[str, List[Tuple[str, int, float, float]]] = {}
+    for p in store.partitions:
+        assigned = assign_partition(p["city"], city_assignments, roles)
+        if assigned is not None:
+            parts.setdefault(assigned[0], []).append((p["city"], p["year"], assigned[1], assigned[2]))
+    names = models or sorted(parts)
+    return [{"name": n, "root": str(store.root), "parts": parts.get(n, []), "roles": roles, **options}
+            for n in names]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Retrain regional XGBoost models from the dataset store")
+    parser.add_argument("--store", type=Path, default=DEFAULT_ROOT)
+    parser.add_argument("--models", help="comma-separated regions (default: every region with data)")
+    parser.add_argument("--since", help="first timestamp to train on (default: after the last retrain; "
+                                        "required for a model that has never been retrained)")
+    parser.add_argument("--until", help="end of the training data (exclusive)")
+    parser.add_argument("--rounds", type=int, default=None, help="trees to add (default 100, or 500 with --scratch)")
+    parser.add_argument("--scratch", action="store_true", help="new scaler and booster instead of warm-starting")
+    parser.add_argument("--parallel", type=int, default=2, help="regions trained at once")
+    parser.add_argument("--cpus", type=int, default=os.cpu_count() or 1, help="threads shared by all regions")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS)
+    parser.add_argument("--publish", action="store_true", help="serve each new version unless it validates worse")
+    parser.add_argument("--force", action="store_true", help="with --publish, publish even if worse")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    with open(BASE_DIR / "city_mapping.json", "r", encoding="utf-8") as f:
+        city_assignments = json.load(f)
+
+    parallel = max(1, args.parallel)
+    jobs = plan_jobs(
+        DatasetStore(args.store), city_assignments,
+        [m.strip() for m in args.models.split(",") if m.strip()] if args.models else None,
+        since=args.since, until=args.until, scratch=args.scratch,
+        rounds=args.rounds or (500 if args.scratch else 100),
+        threads=max(1, args.cpus // parallel), batch_rows=args.batch_rows,
+        publish=args.publish, force=args.force,
+    )
+    with ProcessPoolExecutor(max_workers=min(parallel, len(jobs)) or 1) as pool:
+        futures = {pool.submit(retrain_region, job): job["name"] for job in jobs}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error("❌ Retraining '%s' failed: %s", name, e)
+                continue
+            if result["status"] != "trained":
+                logger.warning("⚠️ '%s' skipped: %s", name, result["reason"])
+                continue
+            before = result["parent_valid"]["rmse"] if result["parent_valid"] else None
+            logger.info("✅ %s: %d rows, held-out RMSE %s -> %.2f in %.1f min%s -> %s", name,
+                        result["rows_train"], "n/a" if before is None else f"{before:.2f}",
+                        result["valid"]["rmse"] or float("nan"), result["minutes"],
+                        " (published)" if result["published"] else "", result["version"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Multi-process server: one preloading master, N forked uvicorn workers.
+
+The master imports the app, loads every regional XGBoost model and the
+solar ephemeris, freezes the garbage collector, binds the listening socket
+and forks the workers. The workers share those pages copy-on-write, so
+memory grows by each worker's own heap and not by N copies of the models.
+``gc.freeze()`` keeps the collector from touching (and so copying) the
+preloaded objects.
+
+The workers share a SQLite cache in /dev/shm (workers.SharedCache). A
+weather payload fetched or a forecast scored by one worker serves every
+worker, and concurrent misses for the same coordinates go upstream once.
+Only worker 0 runs the precompute scheduler. A POST /models/<name>/reload
+on any worker is picked up by the others on their next heartbeat. GET
+/health reports the worker that answered plus every worker's heartbeat
+(pid, requests, in-flight, RSS).
+
+LSTM models are not preloaded: tensorflow is not fork-safe, so each worker
+loads them on first use. The master never scores anything either, so the
+workers do not inherit an initialised OpenMP runtime.
+
+The master restarts workers that exit and, on SIGTERM/SIGINT, stops them
+and removes the shared cache. Without os.fork (Windows) it serves from a
+single process.
+
+Usage (from backend/):
+    python serve.py [--workers N] [--host 0.0.0.0] [--port 8000]
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import tempfile
+import time
+from pathlib import Path
+
+logger = logging.getLogger("solarc.serve")
+
+# a worker dying sooner than this after starting is restarted with a delay
+CRASH_WINDOW = 5.0
+RESTART_DELAY = 1.0
+
+
+def shared_cache_path() -> Path:
+    shm = Path("/dev/shm")
+    folder = shm if shm.is_dir() and os.access(shm, os.W_OK) else Path(tempfile.gettempdir())
+    return folder / f"solarc-{os.getpid()}.sqlite"
+
+
+def bind(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def preload(app_module):
+    """Load what the workers should share before forking."""
+    start = time.perf_counter()
+    names = sorted({info["model"] for info in app_module.CITY_ASSIGNMENTS.values()})
+    app_module.MODEL_REGISTRY.prewarm(names)
+    app_module.load_ephemeris()
+    gc.collect()
+    gc.freeze()
+    logger.info("✅ Preloaded %d models in %.2fs", len(app_module.MODEL_REGISTRY.loaded()),
+                time.perf_counter() - start)
+
+
+def run_worker(worker_id: int, sock: socket.socket, app, log_level: str):
+    import uvicorn
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    os.environ["SOLARC_WORKER_ID"] = str(worker_id)
+    status = 0
+    try:
+        uvicorn.Server(uvicorn.Config(app, log_level=log_level)).run(sockets=[sock])
+    except BaseException as e:
+        logger.error("❌ Worker %d failed: %s", worker_id, e)
+        status = 1
+    finally:
+        # never fall back into the master's loop
+        os._exit(status)
+
+
+def serve(workers: int, host: str, port: int, log_level: str):
+    created_cache = "SHARED_CACHE_PATH" not in os.environ
+    if created_cache:
+        os.environ["SHARED_CACHE_PATH"] = str(shared_cache_path())
+
+    import app as app_module
+
+    preload(app_module)
+    sock = bind(host, port)
+    logger.info("🚀 Serving on %s:%d with %d workers", host, port, workers)
+
+    children = {}  # pid -> (worker id, started)
+    stopping = False
+
+    def spawn(worker_id: int):
+        pid = os.fork()
+        if pid == 0:
+            run_worker(worker_id, sock, app_module.app, log_level)
+        children[pid] = (worker_id, time.monotonic())
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    try:
+        for worker_id in range(workers):
+            spawn(worker_id)
+        while children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                time.sleep(0.2)
+                continue
+            worker_id, started = children.pop(pid)
+            if stopping:
+                continue
+            logger.warning("⚠️ Worker %d (pid %d) exited with status %d, restarting",
+                           worker_id, pid, os.waitstatus_to_exitcode(status))
+            if time.monotonic() - started < CRASH_WINDOW:
+                time.sleep(RESTART_DELAY)
+            spawn(worker_id)
+    finally:
+        sock.close()
+        if created_cache and app_module.SHARED_CACHE is not None:
+            app_module.SHARED_CACHE.remove_files()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the API from several preforked worker processes")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WORKERS", str(os.cpu_count() or 1))))
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    # root level too, so library INFO logs (httpx requests) follow LOG_LEVEL
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format="%(message)s")
+    if not hasattr(os, "fork"):
+        import uvicorn
+
+        logger.warning("⚠️ os.fork is unavailable; serving from a single process")
+        uvicorn.run("app:app", host=args.host, port=args.port, log_level=args.log_level)
+        return
+    serve(max(1, args.workers), args.host, args.port, args.log_level)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Nearest-city lookup for arbitrary coordinates.
+
+Each city in city_mapping.json is a point with an assigned model; the model
+region for any other location is that of the nearest city. Lookups go
+through a haversine BallTree over all city points, so they stay
+logarithmic in the number of sites and many points resolve in one query.
+
+Query points are first snapped to a grid of ``grid_step`` degrees, and the
+snapped point is what gets resolved, fetched and scored. Nearby queries
+therefore share one site name, so they also share weather and forecast
+cache entries. Points farther than ``max_distance_km`` from every city are
+outside the covered region.
+"""
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+from sklearn.neighbors import BallTree
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+class OutsideCoverage(Exception):
+    def __init__(self, lat: float, lon: float, distance_km: float):
+        super().__init__(f"No model region within reach of ({lat}, {lon}); "
+                         f"nearest city is {distance_km:.0f} km away")
+        self.distance_km = distance_km
+
+
+class SiteIndex:
+    def __init__(self, names: Sequence[str], lats: Sequence[float], lons: Sequence[float],
+                 models: Sequence[str], grid_step: float = 0.05, max_distance_km: float = 100.0):
+        self.names = np.asarray(names, dtype=object)
+        self.lats = np.asarray(lats, dtype=float)
+        self.lons = np.asarray(lons, dtype=float)
+        self.models = np.asarray(models, dtype=object)
+        self.grid_step = grid_step
+        self.max_distance_km = max_distance_km
+        self._tree = BallTree(np.radians(np.column_stack([self.lats, self.lons])), metric="haversine")
+
+    @classmethod
+    def from_assignments(cls, city_assignments: Dict[str, dict], **kwargs) -> "SiteIndex":
+        names = sorted(city_assignments)
+        return cls(
+            names,
+            [float(city_assignments[n]["lat"]) for n in names],
+            [float(city_assignments[n]["lon"]) for n in names],
+            [city_assignments[n]["model"] for n in names],
+            **kwargs,
+        )
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def snap(self, lats, lons) -> Tuple[np.ndarray, np.ndarray]:
+        """Grid cell centres for the given points (arrays)."""
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        if self.grid_step <= 0:
+            return lats, lons
+        # the final round drops float noise so equal cells give equal names
+        return (np.round(np.round(lats / self.grid_step) * self.grid_step, 6),
+                np.round(np.round(lons / self.grid_step) * self.grid_step, 6))
+
+    def nearest(self, lats, lons) -> Tuple[np.ndarray, np.ndarray]:
+        """(city row, distance in km) of the nearest city for each point."""
+        points = np.radians(np.column_stack([np.ravel(lats), np.ravel(lons)]))
+        dist, idx = self._tree.query(points, k=1)
+        return idx[:, 0], dist[:, 0] * EARTH_RADIUS_KM
+
+    def resolve_many(self, lats, lons) -> Dict[str, np.ndarray]:
+        """Bulk lookup: snapped coordinates, nearest city, its model and the
+        distance to it, plus a ``covered`` mask for points within range."""
+        slat, slon = self.snap(np.ravel(lats), np.ravel(lons))
+        idx, dist = self.nearest(slat, slon)
+        return {
+            "lat": slat,
+            "lon": slon,
+            "city": self.names[idx],
+            "model": self.models[idx],
+            "distance_km": dist,
+            "covered": dist <= self.max_distance_km,
+        }
+
+    def resolve(self, lat: float, lon: float) -> Tuple[str, float, float, str, str]:
+        """(site name, snapped lat, snapped lon, model, nearest city) for one
+        point; raises OutsideCoverage when no city is close enough."""
+        found = self.resolve_many([lat], [lon])
+        if not found["covered"][0]:
+            raise OutsideCoverage(lat, lon, float(found["distance_km"][0]))
+        slat, slon = float(found["lat"][0]), float(found["lon"][0])
+        return site_name(slat, slon), slat, slon, found["model"][0], found["city"][0]
+
+    def stats(self) -> Dict[str, float]:
+        return {"sites": len(self), "grid_step": self.grid_step, "max_distance_km": self.max_distance_km}
+
+
+def site_name(lat: float, lon: float) -> str:
+    """Cache and response name for a snapped coordinate."""
+    return f"{lat:.4f},{lon:.4f}"
@@ -0,0 +1,40 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+
+
+@pytest.fixture
+def client(monkeypatch):
+    reloads = []
+    monkeypatch.setattr(app.MODEL_REGISTRY, "available", lambda name: name == "hassan")
+    monkeypatch.setattr(app.MODEL_REGISTRY, "reload", reloads.append)
+    test_client = TestClient(app.app)
+    test_client.reloads = reloads
+    return test_client
+
+
+def test_reload_is_refused_for_remote_clients(client, monkeypatch):
+    monkeypatch.setattr(app, "ADMIN_TOKEN", "")
+    # TestClient reports the client host as "testclient", i.e. not loopback
+    assert client.post("/models/hassan/reload").status_code == 403
+    assert client.reloads == []
+
+
+def test_reload_requires_the_admin_token(client, monkeypatch):
+    monkeypatch.setattr(app, "ADMIN_TOKEN", "s3cret")
+    assert client.post("/models/hassan/reload", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    resp = client.post("/models/hassan/reload", headers={"X-Admin-Token": "s3cret"})
+    assert resp.status_code == 200
+    assert client.reloads == ["hassan"]
+    assert client.post("/models/nope/reload", headers={"X-Admin-Token": "s3cret"}).status_code == 404
+
+
+def test_reload_is_allowed_from_loopback_without_a_token(monkeypatch):
+    monkeypatch.setattr(app, "ADMIN_TOKEN", "")
+    reloads = []
+    monkeypatch.setattr(app.MODEL_REGISTRY, "available", lambda name: True)
+    monkeypatch.setattr(app.MODEL_REGISTRY, "reload", reloads.append)
+    local = TestClient(app.app, client=("127.0.0.1", 50000))
+    assert local.post("/models/hassan/reload").status_code == 200
+    assert reloads == ["hassan"]
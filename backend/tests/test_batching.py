@@ -0,0 +1,100 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from batching import MicroBatcher
+from inference import ExecutorSaturated
+
+
+class FakeExecutor:
+    """Scores each row as its sum; records the shape of every call."""
+
+    def __init__(self, max_pending=64, delay=0.0, error=None):
+        self.max_pending = max_pending
+        self.retry_after = 1.0
+        self.delay = delay
+        self.error = error
+        self.calls = []
+
+    async def predict(self, model_name, features):
+        self.calls.append((model_name, features.shape[0]))
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return features.sum(axis=1), {"queued": 0.0, "scaling": 0.0, "inference": 0.0}
+
+
+def rows(n, value):
+    return np.full((n, 6), float(value))
+
+
+def test_full_batch_flushes_as_one_call():
+    executor = FakeExecutor()
+    batcher = MicroBatcher(executor, max_batch_size=3, max_wait=10.0)
+
+    async def run():
+        return await asyncio.gather(*(batcher.predict("hassan", rows(i + 1, i)) for i in range(3)))
+
+    results = asyncio.run(run())
+    assert executor.calls == [("hassan", 6)]
+    for i, (P, timing) in enumerate(results):
+        np.testing.assert_array_equal(P, np.full(i + 1, 6.0 * i))
+        assert "batch_wait" in timing
+    assert batcher.pending == 0
+
+
+def test_partial_batch_flushes_after_max_wait():
+    executor = FakeExecutor()
+    batcher = MicroBatcher(executor, max_batch_size=32, max_wait=0.01)
+
+    async def run():
+        return await asyncio.gather(batcher.predict("hassan", rows(2, 1)), batcher.predict("karwar", rows(1, 2)))
+
+    (P1, _), (P2, _) = asyncio.run(run())
+    assert sorted(executor.calls) == [("hassan", 2), ("karwar", 1)]
+    np.testing.assert_array_equal(P1, [6.0, 6.0])
+    np.testing.assert_array_equal(P2, [12.0])
+
+
+def test_backpressure_counts_requests_not_batches():
+    executor = FakeExecutor(max_pending=64, delay=0.05)
+    batcher = MicroBatcher(executor, max_batch_size=32, max_wait=0.001, max_pending=4)
+
+    async def run():
+        return await asyncio.gather(*(batcher.predict("hassan", rows(1, 1)) for _ in range(6)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(run())
+    rejected = [r for r in results if isinstance(r, ExecutorSaturated)]
+    assert len(rejected) == 2
+    assert batcher.rejected == 2
+    assert executor.calls == [("hassan", 4)]
+    assert batcher.pending == 0
+
+
+def test_errors_reach_every_caller_in_the_batch():
+    executor = FakeExecutor(error=RuntimeError("boom"))
+    batcher = MicroBatcher(executor, max_batch_size=2, max_wait=10.0)
+
+    async def run():
+        return await asyncio.gather(*(batcher.predict("hassan", rows(1, 1)) for _ in range(2)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert batcher.pending == 0
+
+
+def test_unbatched_when_disabled():
+    executor = FakeExecutor()
+    batcher = MicroBatcher(executor, max_batch_size=1)
+    P, timing = asyncio.run(batcher.predict("hassan", rows(3, 1)))
+    np.testing.assert_array_equal(P, [6.0, 6.0, 6.0])
+    assert timing["batch_wait"] == 0.0
+
+
+@pytest.mark.parametrize("max_pending", [None, 7])
+def test_max_pending_defaults_to_executor(max_pending):
+    batcher = MicroBatcher(FakeExecutor(max_pending=5), max_pending=max_pending)
+    assert batcher.max_pending == (5 if max_pending is None else max_pending)
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from dataset_store import build_store
+
+
+@pytest.fixture
+def store(tmp_path):
+    times = pd.date_range("2024-12-31 22:00", periods=6, freq="h")
+    pd.DataFrame({
+        "city": "Hassan",
+        "time": times.strftime("%Y-%m-%d %H:%M:%S"),
+        "p": np.arange(6.0),
+    }).to_csv(tmp_path / "data.csv", index=False)
+    return build_store(tmp_path / "data.csv", tmp_path / "store")
+
+
+def test_round_trip_keeps_the_index_schema(store):
+    empty = store.query(cities="Nowhere").schema
+    assert empty.field("time").type == pa.timestamp("s")
+
+    table = store.query()
+    assert table.schema == empty
+    assert table.num_rows == 6 and store.years() == [2024, 2025]
+    np.testing.assert_array_equal(table.column("time").to_numpy(),
+                                  pd.date_range("2024-12-31 22:00", periods=6, freq="h").to_numpy("datetime64[s]"))
+
+    part = store.read(store.partitions[0], ["p"], start="2024-12-31 23:00")
+    assert part.schema.field("time").type == pa.timestamp("s")
+    assert part.num_rows == 1
+    assert store.mapped("Hassan", 2025).schema == store.query(with_city=False).schema
@@ -0,0 +1,116 @@
+import time
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+from energy_map import TILE_SIZE, TileCache, assemble, cell_range, encode_f32, tiles_for
+from weather_cache import WeatherCache
+
+# a box around Hassan, inside the hassan model region
+BOX = {"lat_min": 12.95, "lat_max": 13.05, "lon_min": 76.05, "lon_max": 76.15, "resolution": 0.1}
+
+
+def local_noon_payload(lat, lon, forecast_days, now):
+    """Open-Meteo shaped payload from local midnight, with a UTC offset that
+    puts ``now`` at local noon and sunshine from 06:00 to 18:00."""
+    utc_offset = (12 - int(now // 3600) % 24) * 3600
+    midnight = (int(now) + utc_offset) // 86400 * 86400
+    n = forecast_days * 24
+    hour = np.arange(n) % 24
+    sun = np.clip(np.sin((hour - 6) / 12 * np.pi), 0, None) * 600
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "utc_offset_seconds": utc_offset,
+        "hourly": {
+            "time": [str(np.datetime64(midnight + 3600 * i, "s"))[:16] for i in range(n)],
+            "direct_radiation": sun.tolist(),
+            "diffuse_radiation": (sun / 4).tolist(),
+            "temperature_2m": [25.0] * n,
+            "wind_speed_10m": [3.0] * n,
+        },
+    }
+
+
+@pytest.fixture
+def client(monkeypatch):
+    now = time.time()
+
+    async def request_openmeteo(latitudes, longitudes, forecast_days, past_days=0):
+        return [local_noon_payload(lat, lon, forecast_days, now) for lat, lon in zip(latitudes, longitudes)]
+
+    async def score_features(name, features):
+        # ground-reflected irradiance stands in for a model
+        return features[:, 0].copy(), {}
+
+    monkeypatch.setattr(app, "request_openmeteo", request_openmeteo)
+    monkeypatch.setattr(app, "score_features", score_features)
+    checked = []
+    monkeypatch.setattr(app.MODEL_REGISTRY, "available", lambda name: checked.append(name) or True)
+    monkeypatch.setattr(app, "WEATHER_CACHE", WeatherCache())
+    monkeypatch.setattr(app, "MAP_WEATHER_CACHE", WeatherCache(max_entries=8))
+    monkeypatch.setattr(app, "MAP_TILES", TileCache())
+    test_client = TestClient(app.app)
+    test_client.checked = checked
+    return test_client
+
+
+def test_default_map_is_the_current_local_hour(client):
+    resp = client.post("/energy-map", json=BOX)
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["hour"] == 0
+    values = np.array(body["values"], dtype=float)
+    assert np.nanmin(values) > 0  # local noon, not local midnight
+
+    # 12 hours on is local midnight
+    night = np.array(client.post("/energy-map", json={**BOX, "hour": 12}).json()["values"], dtype=float)
+    assert np.nanmax(night) == 0
+
+
+def test_repeated_map_is_served_from_tiles(client):
+    first = client.post("/energy-map", json=BOX)
+    second = client.post("/energy-map", json=BOX)
+    assert first.headers["X-Cache"].startswith("hit=0,")
+    assert second.headers["X-Cache"].endswith("miss=0")
+    assert first.json()["values"] == second.json()["values"]
+
+
+def test_map_cells_use_their_own_weather_cache(client):
+    big = {**BOX, "lat_max": 13.55, "lon_max": 76.65}  # 36 cells, more than the map cache holds
+    assert client.post("/energy-map", json=big).status_code == 200
+    assert app.WEATHER_CACHE.stats()["entries"] == 0
+    assert app.MAP_WEATHER_CACHE.stats()["entries"] == 8
+    # availability is resolved per model region, not per cell
+    assert len(client.checked) == len(set(client.checked))
+
+
+@pytest.mark.parametrize("payload", [
+    {**BOX, "day": 1, "hour": 0},
+    {**BOX, "day": 0},
+    {**BOX, "hour": -1},
+    {**BOX, "hour": 361},
+    {**BOX, "lat_min": 13.1},
+    {**BOX, "resolution": 10},
+])
+def test_invalid_requests(client, payload):
+    assert client.post("/energy-map", json=payload).status_code == 400
+
+
+def test_current_hour_index():
+    times = ["2025-06-01T00:00", "2025-06-01T01:00", "2025-06-01T02:00"]
+    midnight_utc = np.datetime64("2025-06-01T00:00", "s").astype(np.int64) - 19800
+    assert app.current_hour_index(times, 19800, now=midnight_utc + 5400) == 1
+    assert app.current_hour_index(times, 19800, now=midnight_utc - 60) == 0
+    assert app.current_hour_index(times, None, now=midnight_utc + 19800 + 7300) == 2
+
+
+def test_assemble_cuts_the_box_north_to_south():
+    lat_cells, lon_cells = cell_range(0.0, 0.3, 0.1), cell_range(0.0, 0.2, 0.1)
+    tile = np.arange(TILE_SIZE * TILE_SIZE, dtype=np.float32).reshape(TILE_SIZE, TILE_SIZE)
+    assert tiles_for(lat_cells, lon_cells) == [(0, 0)]
+    grid = assemble({(0, 0): tile}, lat_cells, lon_cells)
+    np.testing.assert_array_equal(grid, tile[:3, :2][::-1])
+    assert len(encode_f32(grid)) == grid.size * 4
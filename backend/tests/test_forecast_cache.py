@@ -0,0 +1,62 @@
+import numpy as np
+
+from forecast_cache import HIT, MISS, STALE, ForecastStore, StoredForecast
+
+
+class Clock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def entry(model="hassan", generation=0, computed_at=0.0):
+    return StoredForecast(model, {"time": []}, {}, np.zeros(3), generation, computed_at)
+
+
+def test_fresh_then_stale_then_miss():
+    clock = Clock(100.0)
+    store = ForecastStore(ttl=600, max_age=1800, clock=clock)
+    store.put("Hassan", "7day", entry(computed_at=100.0))
+    assert store.lookup("hassan", "Hassan", "7day")[1] == HIT
+    clock.now = 100.0 + 601
+    assert store.lookup("hassan", "Hassan", "7day")[1] == STALE
+    clock.now = 100.0 + 1801
+    assert store.lookup("hassan", "Hassan", "7day") == (None, MISS)
+
+
+def test_new_forecast_hour_makes_entries_stale():
+    clock = Clock(3500.0)
+    store = ForecastStore(ttl=3600, max_age=7200, clock=clock)
+    store.put("Hassan", "realtime", entry(computed_at=3500.0))
+    clock.now = 3700.0
+    assert store.lookup("hassan", "Hassan", "realtime")[1] == STALE
+
+
+def test_invalidate_drops_entries_and_rejects_results_from_the_old_model():
+    clock = Clock(10.0)
+    store = ForecastStore(clock=clock)
+    scored_before = store.generation("hassan")
+    store.put("Hassan", "7day", entry(generation=scored_before, computed_at=10.0))
+    store.put("Karwar", "7day", entry(model="karwar", computed_at=10.0))
+
+    store.invalidate("hassan")
+    assert store.lookup("hassan", "Hassan", "7day")[1] == MISS
+    assert store.lookup("karwar", "Karwar", "7day")[1] == HIT
+    assert store.invalidations == 1
+
+    # a refresh that started before the reload finishes afterwards
+    store.put_many("7day", {"Hassan": entry(generation=scored_before, computed_at=10.0)})
+    assert store.lookup("hassan", "Hassan", "7day")[1] == MISS
+    store.put("Hassan", "7day", entry(generation=store.generation("hassan"), computed_at=10.0))
+    assert store.lookup("hassan", "Hassan", "7day")[1] == HIT
+
+
+def test_lru_bound():
+    clock = Clock(10.0)
+    store = ForecastStore(max_entries=2, clock=clock)
+    for city in ("A", "B", "C"):
+        store.put(city, "7day", entry(computed_at=10.0))
+    assert store.lookup("hassan", "A", "7day")[1] == MISS
+    assert store.stats()["entries"] == 2 and store.evictions == 1
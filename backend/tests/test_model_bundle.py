@@ -0,0 +1,93 @@
+import os
+
+import joblib
+import numpy as np
+import pytest
+import xgboost as xgb
+from sklearn.preprocessing import StandardScaler
+
+import model_io
+from model_bundle import BundleError, load_bundle, write_bundle
+
+
+def make_model_folder(folder, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(200, 6))
+    y = X @ rng.normal(size=6)
+    scaler = StandardScaler().fit(X)
+    booster = xgb.train({"max_depth": 3, "nthread": 1}, xgb.DMatrix(scaler.transform(X), label=y),
+                        num_boost_round=5)
+    folder.mkdir(parents=True, exist_ok=True)
+    booster.save_model(str(folder / "xgb_model.json"))
+    joblib.dump(scaler, folder / "scaler.pkl")
+    return X
+
+
+def test_round_trip_matches_legacy(tmp_path):
+    folder = tmp_path / "hassan"
+    X = make_model_folder(folder)
+    write_bundle(folder)
+
+    model, scaler, header = load_bundle(folder)
+    legacy_model, legacy_scaler = model_io.load_legacy_model(folder)
+    np.testing.assert_array_equal(scaler.transform(X), legacy_scaler.transform(X))
+    np.testing.assert_array_equal(model.predict(scaler.transform(X)),
+                                  legacy_model.predict(legacy_scaler.transform(X)))
+    assert header["name"] == "hassan"
+
+
+def test_corrupt_bundle_is_rejected(tmp_path):
+    folder = tmp_path / "hassan"
+    make_model_folder(folder)
+    path = write_bundle(folder)
+    data = bytearray(path.read_bytes())
+    data[-10] ^= 0xFF
+    path.write_bytes(bytes(data))
+    with pytest.raises(BundleError, match="checksum"):
+        load_bundle(folder)
+
+
+def test_refit_scaler_of_the_same_size_makes_the_bundle_stale(tmp_path):
+    folder = tmp_path / "hassan"
+    make_model_folder(folder)
+    write_bundle(folder)
+    size = (folder / "scaler.pkl").stat().st_size
+
+    refit = StandardScaler().fit(np.random.default_rng(1).normal(size=(50, 6)))
+    joblib.dump(refit, folder / "scaler.pkl")
+    assert (folder / "scaler.pkl").stat().st_size == size
+    with pytest.raises(BundleError, match="stale"):
+        load_bundle(folder)
+
+
+def test_touched_but_unchanged_sources_stay_fresh(tmp_path):
+    folder = tmp_path / "hassan"
+    make_model_folder(folder)
+    write_bundle(folder)
+    # a fresh checkout rewrites mtimes without changing content
+    for name in ("xgb_model.json", "scaler.pkl"):
+        os.utime(folder / name, ns=(1, 1))
+    load_bundle(folder)
+
+
+def test_auto_falls_back_when_the_booster_cannot_be_read(tmp_path, monkeypatch):
+    folder = tmp_path / "hassan"
+    make_model_folder(folder)
+    write_bundle(folder)
+    monkeypatch.setattr(model_io, "find_model_folder", lambda key: folder)
+
+    # e.g. an older xgboost reading a newer UBJSON booster; the JSON file still loads
+    load_model = xgb.Booster.load_model
+
+    def ubj_unreadable(self, source):
+        if not isinstance(source, str):
+            raise xgb.core.XGBoostError("unsupported model format")
+        return load_model(self, source)
+
+    monkeypatch.setattr(xgb.Booster, "load_model", ubj_unreadable)
+    with pytest.raises(BundleError, match="failed to load"):
+        load_bundle(folder)
+    model, scaler = model_io.load_model_for("hassan", "auto")
+    assert isinstance(scaler, StandardScaler)
+    with pytest.raises(BundleError):
+        model_io.load_model_for("hassan", "bundle")
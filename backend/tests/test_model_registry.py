@@ -0,0 +1,90 @@
+import threading
+import time
+
+import model_io
+from model_io import ModelRegistry
+
+
+class Loader:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+
+    def __call__(self, name):
+        self.calls.append(name)
+        time.sleep(self.delay)
+        return f"model-{name}-{len(self.calls)}", f"scaler-{name}"
+
+
+def test_lru_keeps_at_most_max_models():
+    loader = Loader()
+    registry = ModelRegistry(max_models=2, loader=loader)
+    registry.get("a")
+    registry.get("b")
+    registry.get("a")  # "b" is now least recently used
+    registry.get("c")
+    assert registry.loaded() == ["a", "c"]
+    assert registry.evictions == 1
+    registry.get("b")
+    assert loader.calls == ["a", "b", "c", "b"]
+    assert registry.hits == 1
+
+
+def test_concurrent_first_use_loads_once():
+    loader = Loader(delay=0.05)
+    registry = ModelRegistry(loader=loader)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get("a"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert loader.calls == ["a"]
+    assert len(set(results)) == 1
+
+
+def test_reload_replaces_the_model_and_notifies():
+    loader = Loader()
+    registry = ModelRegistry(loader=loader)
+    reloaded = []
+    registry.on_reload(reloaded.append)
+    first, _ = registry.get("a")
+    second, _ = registry.reload("a")
+    assert first != second
+    assert registry.get("a")[0] == second
+    assert reloaded == ["a"]
+
+
+def test_changed_files_after_eviction_count_as_a_reload(monkeypatch):
+    versions = {"a": ("v1",)}
+    monkeypatch.setattr(model_io, "model_version", lambda name: versions.get(name, ()))
+    registry = ModelRegistry(max_models=1, loader=Loader())
+    reloaded = []
+    registry.on_reload(reloaded.append)
+    registry.get("a")
+    registry.get("b")  # evicts "a"
+    versions["a"] = ("v2",)
+    registry.get("a")
+    assert reloaded == ["a"]
+
+
+def test_failing_callback_does_not_break_reload():
+    registry = ModelRegistry(loader=Loader())
+
+    def broken(name):
+        raise RuntimeError("listener failed")
+
+    registry.on_reload(broken)
+    registry.reload("a")
+    assert registry.loaded() == ["a"]
+
+
+def test_prewarm_skips_models_that_fail_to_load():
+    def loader(name):
+        if name == "missing":
+            raise FileNotFoundError(name)
+        return "model", "scaler"
+
+    registry = ModelRegistry(loader=loader)
+    registry.prewarm(["missing", "a"])
+    assert registry.loaded() == ["a"]
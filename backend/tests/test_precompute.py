@@ -0,0 +1,74 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from forecast_cache import HIT, ForecastStore, StoredForecast
+from precompute import PrecomputeScheduler
+
+
+class Clock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class Stop(Exception):
+    pass
+
+
+def run_passes(start, passes, interval=900.0, duration=30.0, offset=120.0):
+    """Start times of the first ``passes`` scheduled passes."""
+    clock = Clock(start)
+    store = ForecastStore(bucket_offset=offset, clock=clock)
+    started = []
+
+    async def refresh(mode, cities):
+        started.append(clock.now)
+        clock.now += duration
+        return {}
+
+    async def sleep(seconds):
+        assert seconds >= 0
+        if len(started) >= passes:
+            raise Stop
+        clock.now += seconds
+
+    scheduler = PrecomputeScheduler(refresh, store, lambda: ["Hassan"], ["7day"], interval=interval,
+                                    stagger=0, clock=clock, sleep=sleep)
+    with pytest.raises(Stop):
+        asyncio.run(scheduler._loop())
+    return started
+
+
+def test_passes_follow_the_interval_within_the_hour():
+    hour = 10 * 3600
+    assert run_passes(hour + 200, 3) == [hour + 200, hour + 1100, hour + 2000]
+
+
+def test_a_pass_starts_at_each_bucket_rollover():
+    hour = 10 * 3600
+    started = run_passes(hour + 200, 6)
+    # the 4th pass would be due at +2900 but the bucket rolls over at +3720
+    assert started == [hour + 200, hour + 1100, hour + 2000, hour + 2900, hour + 3720, hour + 4620]
+
+
+def test_rollover_comes_first_when_the_interval_is_long():
+    hour = 10 * 3600
+    assert run_passes(hour + 3000, 3, interval=7200) == [hour + 3000, hour + 3720, hour + 7320]
+
+
+def test_refreshed_entries_are_stored():
+    clock = Clock(7200 + 600)
+    store = ForecastStore(clock=clock)
+
+    async def refresh(mode, cities):
+        return {city: StoredForecast("hassan", {}, {}, np.zeros(1), computed_at=clock.now) for city in cities}
+
+    scheduler = PrecomputeScheduler(refresh, store, lambda: ["Hassan", "Alur"], ["7day"], chunk_size=1,
+                                    stagger=0, clock=clock)
+    asyncio.run(scheduler.run_once())
+    assert scheduler.refreshed == 2 and scheduler.runs == 1
+    assert store.lookup("hassan", "Alur", "7day")[1] == HIT
@@ -0,0 +1,67 @@
+"""Vectorized feature rows against the original per-hour implementation.
+
+fixtures/prediction_rows.json holds a 16-day Open-Meteo payload (with two
+incomplete hours) and the rows the per-hour loop scored for it: the
+daylight hours with direct radiation above 10 W/m², then the current hour.
+"""
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import app
+
+FIXTURE = json.loads((Path(__file__).parent / "fixtures" / "prediction_rows.json").read_text())
+
+
+@pytest.mark.parametrize("mode", ["realtime", "7day", "monthly"])
+def test_rows_match_per_hour_baseline(mode):
+    expected = FIXTURE["rows"][mode]
+    rows, ctx = app.prepare_prediction_rows(
+        FIXTURE["hourly"], FIXTURE["lat"], FIXTURE["lon"], mode, expected["forecast_days"]
+    )
+    np.testing.assert_allclose(rows, np.array(expected["rows"]), rtol=1e-9, atol=1e-9)
+    if mode != "realtime":
+        assert int(ctx["daylight"].sum()) == len(expected["rows"]) - 1
+        assert ctx["daylight"].shape == (expected["forecast_days"] * 24,)
+
+
+def history_for(hourly, days=1):
+    """The ``days`` days before ``hourly``: its first days replayed, a bit warmer."""
+    n = days * 24
+    past = {k: list(v[:n]) for k, v in hourly.items() if k != "time"}
+    past["temperature_2m"] = [None if t is None else t + 1.5 for t in past["temperature_2m"]]
+    start = np.datetime64(hourly["time"][0]) - np.timedelta64(days, "D")
+    past["time"] = [str(start + np.timedelta64(i, "h"))[:16] for i in range(n)]
+    return past
+
+
+@pytest.mark.parametrize("mode", ["realtime", "7day"])
+def test_lstm_windows_reach_into_history(mode):
+    hourly, lat, lon = FIXTURE["hourly"], FIXTURE["lat"], FIXTURE["lon"]
+    forecast_days = FIXTURE["rows"][mode]["forecast_days"]
+    history = history_for(hourly)
+    plain, _ = app.prepare_prediction_rows(hourly, lat, lon, mode, forecast_days)
+    windows, _ = app.prepare_prediction_rows(hourly, lat, lon, mode, forecast_days,
+                                             windowed=True, history=history)
+    past, _, _ = app.prepare_features_batch(history, lat, lon)
+
+    assert windows.shape == (len(plain), app.LSTM_WINDOW, 6)
+    # every window ends at its own hour; the current hour's is last
+    np.testing.assert_allclose(windows[:, -1], plain)
+    np.testing.assert_allclose(windows[-1, :-1], past[-(app.LSTM_WINDOW - 1):])
+    assert len(np.unique(windows[-1, :, 2])) > 1
+
+
+def test_lstm_rows_require_history():
+    with pytest.raises(ValueError):
+        app.prepare_prediction_rows(FIXTURE["hourly"], FIXTURE["lat"], FIXTURE["lon"],
+                                    "realtime", 1, windowed=True)
+
+
+def test_split_history():
+    hourly = FIXTURE["hourly"]
+    history, rest = app.split_history({"hourly": hourly}, 1)
+    assert history["time"] == hourly["time"][:24] and rest["time"] == hourly["time"][24:]
+    assert app.split_history({"hourly": hourly}, 0) == (None, hourly)
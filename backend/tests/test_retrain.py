@@ -0,0 +1,110 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+import xgboost as xgb
+from sklearn.preprocessing import StandardScaler
+
+import retrain
+from backtest import resolve_columns
+from dataset_store import build_store
+
+DAYS = 20
+
+
+@pytest.fixture
+def store(tmp_path):
+    times = pd.date_range("2024-01-01", periods=DAYS * 24, freq="h")
+    hour = times.hour.to_numpy()
+    sun = np.clip(np.sin((hour - 6) / 12 * np.pi), 0, None) * 600
+    frame = pd.DataFrame({
+        "city": "Hassan",
+        "time": times.strftime("%Y-%m-%d %H:%M:%S"),
+        "poa_direct": sun,
+        "poa_diffuse": sun / 4,
+        "temperature": 25.0,
+        "wind_speed": 3.0,
+        "p": sun / 5,
+    })
+    frame.to_csv(tmp_path / "data.csv", index=False)
+    return build_store(tmp_path / "data.csv", tmp_path / "store")
+
+
+def batches(store, split, batch_rows=retrain.BATCH_ROWS):
+    parts = [(p, 13.0, 76.1) for p in store.partitions]
+    return list(retrain.feature_batches(store, parts, resolve_columns(store.columns), split, None, None, batch_rows))
+
+
+def test_feature_batches_hold_out_every_tenth_day(store):
+    train, valid = batches(store, "train"), batches(store, "valid")
+    assert sum(len(y) for _, y in train) == (DAYS - 2) * 24
+    assert sum(len(y) for _, y in valid) == 2 * 24
+    assert all(X.shape[1] == 6 for X, _ in train + valid)
+    # small batches split the same rows differently
+    assert sum(len(y) for _, y in batches(store, "train", batch_rows=1)) == (DAYS - 2) * 24
+
+
+def test_scaled_batches_restart_on_reset(store, tmp_path):
+    X, y = batches(store, "train")[0]
+    scaler = StandardScaler().fit(X)
+    fed = []
+    it = retrain.ScaledBatches(lambda: iter([(X[:100], y[:100]), (X[100:], y[100:])]), scaler, str(tmp_path / "cache"))
+
+    def input_data(data, label):
+        fed.append((data, label))
+
+    while it.next(input_data):
+        pass
+    assert it.rows == len(y)
+    np.testing.assert_allclose(np.concatenate([d for d, _ in fed]), scaler.transform(X))
+
+    it.reset()
+    fed.clear()
+    assert it.next(input_data) and it.rows == 100
+    dmatrix = xgb.ExtMemQuantileDMatrix(
+        retrain.ScaledBatches(lambda: iter([(X, y)]), scaler, str(tmp_path / "dm")), max_bin=16)
+    assert dmatrix.num_row() == len(y)
+
+
+def test_publish_gate():
+    assert retrain.improves({"rmse": 1.0}, None)
+    assert retrain.improves({"rmse": 1.0}, {"rmse": None})
+    assert retrain.improves({"rmse": 1.0}, {"rmse": 1.0})
+    assert not retrain.improves({"rmse": 1.1}, {"rmse": 1.0})
+    assert not retrain.improves({"rmse": None}, {"rmse": 1.0})
+
+
+def test_publish_keeps_backtest_and_original_training(tmp_path):
+    folder, version_dir = tmp_path / "hassan", tmp_path / "hassan" / "versions" / "v1"
+    version_dir.mkdir(parents=True)
+    original = {"location": "hassan", "xgboost": {"rmse": 2.0}, "lstm": {"rmse": 3.0},
+                "backtest": {"rmse": 2.5}, "completed_at": "2024-01-01"}
+    (folder / "metrics.json").write_text(json.dumps(original))
+    version = {"location": "hassan", "version": "v1", "xgboost": {"rmse": 1.5}, "lstm": {"rmse": 3.0},
+               "retrain": {"trained_through": "2025-01-01T00:00:00"}}
+    (version_dir / "metrics.json").write_text(json.dumps(version))
+    for name in ("scaler.pkl", "xgb_model.json"):
+        (version_dir / name).write_text(name)
+
+    retrain.publish_version(folder, version_dir)
+    published = json.loads((folder / "metrics.json").read_text())
+    assert published["backtest"] == {"rmse": 2.5}
+    assert published["xgboost"] == {"rmse": 1.5} and published["version"] == "v1"
+    assert published["initial_training"]["xgboost"] == {"rmse": 2.0}
+    assert (folder / "xgb_model.json").read_text() == "xgb_model.json"
+    assert not list(folder.glob("*.tmp"))
+
+    # a later publish keeps the first training results as they were
+    (version_dir / "metrics.json").write_text(json.dumps({**version, "xgboost": {"rmse": 1.2}}))
+    retrain.publish_version(folder, version_dir)
+    again = json.loads((folder / "metrics.json").read_text())
+    assert again["initial_training"] == published["initial_training"]
+    assert again["xgboost"] == {"rmse": 1.2}
+
+
+def test_warm_retrain_needs_since_without_trained_through(tmp_path):
+    job = {"name": "hassan", "threads": 1, "scratch": False, "since": None, "until": None,
+           "root": str(tmp_path), "parts": [], "roles": {}}
+    with pytest.raises(ValueError, match="--since"):
+        retrain.retrain_region(job)
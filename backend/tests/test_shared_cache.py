@@ -0,0 +1,130 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from forecast_cache import HIT, MISS, ForecastStore, StoredForecast
+from weather_cache import WeatherCache
+from workers import SharedCache
+
+
+class RecordingCache(SharedCache):
+    """Remembers the threads its entry and lease methods ran on."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.threads = set()
+
+    def get(self, key):
+        self.threads.add(threading.current_thread().name)
+        return super().get(key)
+
+    def get_many(self, keys):
+        self.threads.add(threading.current_thread().name)
+        return super().get_many(keys)
+
+    def acquire(self, key, ttl):
+        self.threads.add(threading.current_thread().name)
+        return super().acquire(key, ttl)
+
+
+def drain(shared):
+    """Wait for the writes queued with submit."""
+    shared.submit(int).result()
+
+
+@pytest.fixture
+def path(tmp_path):
+    return tmp_path / "shared.sqlite"
+
+
+def test_lease_is_exclusive_until_it_expires(path):
+    shared = SharedCache(path)
+    assert shared.acquire("k", 10)
+    assert shared.acquire("k", 10)  # renewing our own lease
+    shared._execute("UPDATE leases SET owner = -1")  # now held by another process
+    assert not shared.acquire("k", 10)
+    assert shared.leased_elsewhere("k")
+    shared._execute("UPDATE leases SET until = 0")
+    assert shared.acquire("k", 10)
+
+
+def test_lease_gives_up_quickly_while_the_database_is_locked(path):
+    shared = SharedCache(path, lease_timeout=0.05)
+    shared.generations()  # create the schema
+    other = sqlite3.connect(str(path), isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        start = time.perf_counter()
+        assert not shared.acquire("k", 10)
+        assert time.perf_counter() - start < 1.0
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
+    assert shared.acquire("k", 10)
+
+
+def test_get_many_returns_live_entries(path):
+    shared = SharedCache(path)
+    shared.put_many([("a", 1, time.time() + 60), ("old", 2, time.time() - 1)])
+    assert shared.get_many(["a", "old", "missing"]) == {"a": (1, pytest.approx(time.time() + 60, abs=5))}
+    assert (shared.hits, shared.misses) == (1, 2)
+
+
+def test_weather_served_from_another_workers_fetch(path):
+    first = WeatherCache(shared=SharedCache(path))
+    second_shared = RecordingCache(path)
+    second = WeatherCache(shared=second_shared)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return {"hourly": {"time": []}}
+
+    async def run():
+        await first.get_or_fetch("k", fetch)
+        drain(first.shared)
+        assert await second.missing(["k", "other"]) == ["other"]
+        return await second.get_or_fetch("k", fetch)
+
+    assert asyncio.run(run()) == {"hourly": {"time": []}}
+    assert len(calls) == 1
+    assert second.shared_hits == 1 and second.hits == 1
+    assert second_shared.threads and threading.current_thread().name not in second_shared.threads
+
+
+def test_weather_miss_takes_the_lease_off_the_loop(path):
+    shared = RecordingCache(path)
+    cache = WeatherCache(shared=shared)
+
+    async def fetch():
+        return {"hourly": {}}
+
+    asyncio.run(cache.get_or_fetch("k", fetch))
+    drain(shared)
+    assert cache.misses == 1
+    assert shared.threads == {"solarc-shared_0"}
+    assert shared._execute("SELECT COUNT(*) FROM leases") == [(0,)]  # released after the write
+    assert shared.get(cache._shared_key("k"))[0] == {"hourly": {}}
+
+
+def test_forecast_lookup_async_adopts_shared_entries(path):
+    writer = ForecastStore(shared=SharedCache(path))
+    reader = ForecastStore(shared=RecordingCache(path))
+    writer.put("Hassan", "7day", StoredForecast("hassan", {}, {}, np.ones(3)))
+    drain(writer.shared)
+
+    assert reader.lookup("hassan", "Hassan", "7day") == (None, MISS)  # in-process only
+
+    async def run():
+        return await reader.lookup_many_async([("hassan", "Hassan", "7day"), ("hassan", "Karwar", "7day")])
+
+    (entry, status), (_, other) = asyncio.run(run())
+    assert status == HIT and other == MISS
+    np.testing.assert_array_equal(entry.P_all, np.ones(3))
+    assert reader.shared_hits == 1
+    assert reader.lookup("hassan", "Hassan", "7day")[1] == HIT  # now held locally
+    assert threading.main_thread().name not in reader.shared.threads
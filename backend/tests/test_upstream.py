@@ -0,0 +1,149 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import upstream
+from upstream import CircuitBreaker, CircuitOpenError, UpstreamClient, UpstreamError
+
+URL = "http://upstream.test/v1/forecast"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    # only the breaker's clock; asyncio keeps the real time.monotonic
+    monkeypatch.setattr(upstream, "time", SimpleNamespace(monotonic=fake))
+    return fake
+
+
+def client_for(statuses, **kwargs):
+    """Client whose transport answers with ``statuses`` in turn; an
+    exception class in the list is raised instead."""
+    calls = []
+    answers = iter(statuses)
+
+    def handler(request):
+        calls.append(request)
+        answer = next(answers)
+        if isinstance(answer, type) and issubclass(answer, Exception):
+            raise answer("boom", request=request)
+        return httpx.Response(answer, json={})
+
+    kwargs.setdefault("backoff_base", 0.0)
+    client = UpstreamClient(transport=httpx.MockTransport(handler), **kwargs)
+    return client, calls
+
+
+def get(client):
+    return asyncio.run(client.get(URL))
+
+
+def test_retries_5xx_and_timeouts_then_succeeds():
+    client, calls = client_for([503, httpx.ConnectTimeout, 200], max_retries=2)
+    assert get(client).status_code == 200
+    assert len(calls) == 3
+    assert client.stats()["retries"] == 2
+    assert client.breaker.state == "closed"
+
+
+def test_4xx_is_returned_without_retrying():
+    client, calls = client_for([404, 200])
+    assert get(client).status_code == 404
+    assert len(calls) == 1
+    assert client.stats()["retries"] == 0
+    assert client.breaker.failures == 0
+
+
+def test_exhausted_retries_raise_and_count_one_failure():
+    client, calls = client_for([500, 502, 503], max_retries=2)
+    with pytest.raises(UpstreamError, match="HTTP 503"):
+        get(client)
+    assert len(calls) == 3
+    assert client.breaker.failures == 1 and client.stats()["failures"] == 1
+
+
+def test_backoff_is_capped_full_jitter():
+    client, _ = client_for([], backoff_base=0.2, backoff_max=1.0)
+    assert all(0 <= client._backoff(attempt) <= min(1.0, 0.2 * 2 ** attempt)
+               for attempt in range(6) for _ in range(20))
+
+
+def test_breaker_opens_at_the_failure_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    client, calls = client_for([500] * 3 + [200], max_retries=0, breaker=breaker)
+    for _ in range(2):
+        with pytest.raises(UpstreamError):
+            get(client)
+        assert breaker.state == "closed"
+    with pytest.raises(UpstreamError):
+        get(client)
+    assert breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError) as err:
+        get(client)
+    assert len(calls) == 3  # failed fast, without a request
+    assert err.value.retry_after == pytest.approx(30)
+
+
+def test_half_open_allows_one_trial_then_closes(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 29
+    assert breaker.state == "open"
+    clock.now += 1
+    assert breaker.state == "half-open"
+
+    breaker.before_call()  # the trial call
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # others still fail fast
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0
+    breaker.before_call()
+
+
+def test_failed_trial_reopens_for_a_full_window(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    client, calls = client_for([500, 200], max_retries=0, breaker=breaker)
+    breaker.record_failure()
+    clock.now += 30
+    with pytest.raises(UpstreamError):
+        get(client)  # the half-open trial
+    assert breaker.state == "open"
+    clock.now += 29
+    with pytest.raises(CircuitOpenError):
+        get(client)
+    clock.now += 1
+    assert get(client).status_code == 200
+    assert len(calls) == 2 and breaker.state == "closed"
+
+
+def test_cancelled_trial_frees_the_half_open_slot(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+
+    async def hang(request):
+        await asyncio.sleep(10)
+
+    client = UpstreamClient(transport=httpx.MockTransport(hang), breaker=breaker)
+
+    async def run():
+        task = asyncio.create_task(client.get(URL))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert breaker.state == "half-open"
+    breaker.before_call()  # a new trial is allowed
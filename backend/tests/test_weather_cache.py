@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from weather_cache import WeatherCache
+
+
+class Clock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_key_rounds_coordinates_and_ignores_variable_order():
+    cache = WeatherCache(coord_precision=2)
+    assert cache.key(12.9716, 77.5946, 7, ["b", "a"]) == cache.key(12.97, 77.59, 7, ["a", "b"])
+    assert cache.key(12.97, 77.59, 1, ["a"]) != cache.key(12.97, 77.59, 7, ["a"])
+
+
+def test_expiry_follows_hourly_updates_and_max_ttl():
+    cache = WeatherCache(max_ttl=3600, update_lag=120)
+    assert cache.expiry_for(7200 + 600) == 3 * 3600 + 120
+    # just before the lagged update of the current hour
+    assert cache.expiry_for(7200 + 60) == 7200 + 120
+    assert WeatherCache(max_ttl=60, update_lag=120).expiry_for(7200 + 600) == 7200 + 660
+
+
+def test_entries_expire():
+    clock = Clock(7200 + 600)
+    cache = WeatherCache(clock=clock)
+    cache.put("k", {"hourly": {}})
+    assert cache.get("k") == {"hourly": {}}
+    clock.now = cache.expiry_for(7200 + 600)
+    assert cache.get("k") is None
+    assert cache.expirations == 1
+    assert cache.needs_fetch("k")
+
+
+def test_lru_evicts_least_recently_used():
+    cache = WeatherCache(max_entries=2, clock=Clock(600))
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now the oldest
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_concurrent_misses_share_one_fetch():
+    cache = WeatherCache(clock=Clock(600))
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"hourly": {"time": []}}
+
+    async def run():
+        results = await asyncio.gather(*(cache.get_or_fetch("k", fetch) for _ in range(5)))
+        again = await cache.get_or_fetch("k", fetch)
+        return results, again
+
+    results, again = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results) and again is results[0]
+    assert (cache.misses, cache.coalesced, cache.hits) == (1, 4, 1)
+    assert cache.stats()["inflight"] == 0
+
+
+def test_failed_fetch_is_not_cached():
+    cache = WeatherCache(clock=Clock(600))
+
+    async def failing():
+        raise RuntimeError("upstream down")
+
+    async def ok():
+        return {"hourly": {}}
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await cache.get_or_fetch("k", failing)
+        return await cache.get_or_fetch("k", ok)
+
+    assert asyncio.run(run()) == {"hourly": {}}
+    assert cache.misses == 2
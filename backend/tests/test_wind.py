@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+import app
+import wind
+
+LAYOUT = {"num_turbines": 2, "rotor_diameter": 80.0, "hub_height": 10.0, "rated_power_kw": 2000.0,
+          "cut_in": 3.0, "rated_speed": 12.0, "cut_out": 25.0, "power_coefficient": 0.4}
+
+
+def kmh(ms):
+    return [v * 3.6 if v is not None else None for v in ms]
+
+
+def test_power_curve_regions():
+    # hub at 10 m: hub speed is the measured speed
+    speeds = [2.0, 6.0, 12.0, 20.0, 25.0, 30.0]
+    result = wind.fleet_power(kmh(speeds), [15.0] * len(speeds), [LAYOUT])
+    power = result["power_kw"][0] / LAYOUT["num_turbines"]
+    np.testing.assert_allclose(result["hub_speed"][0], speeds)
+
+    rho = wind.air_density(np.array([15.0]))[0]
+    aerodynamic = 0.5 * rho * wind.swept_area(80.0) * 0.4 * 6.0 ** 3 / 1000.0
+    assert power[0] == 0.0  # below cut-in
+    assert power[1] == pytest.approx(aerodynamic)
+    assert power[2] == power[3] == 2000.0  # rated
+    assert power[4] == power[5] == 0.0  # cut out
+
+
+def test_missing_hours_are_zero_and_flagged():
+    result = wind.fleet_power(kmh([10.0, None, 10.0]), [15.0, 15.0, None], [LAYOUT])
+    assert result["valid"].tolist() == [True, False, False]
+    assert result["power_kw"][0, 0] > 0
+    assert result["power_kw"][0, 1:].tolist() == [0.0, 0.0]
+
+
+def test_layouts_are_rows_and_taller_hubs_see_more_wind():
+    tall = {**LAYOUT, "hub_height": 100.0, "num_turbines": 1}
+    result = wind.fleet_power(kmh([5.0]), [15.0], [LAYOUT, tall])
+    assert result["power_kw"].shape == (2, 1)
+    assert result["hub_speed"][1, 0] == pytest.approx(5.0 * 10 ** wind.DEFAULT_SHEAR_EXPONENT)
+    assert result["power_kw"][1, 0] > result["power_kw"][0, 0] / 2
+
+
+def test_rated_power_and_density():
+    assert wind.rated_power_kw(80.0, 12.0, 0.4) == pytest.approx(
+        0.5 * wind.REFERENCE_DENSITY * wind.swept_area(80.0) * 0.4 * 12.0 ** 3 / 1000.0)
+    assert wind.air_density(np.array([15.0]))[0] == pytest.approx(1.225, abs=1e-3)
+    assert wind.air_density(np.array([15.0]), 1000.0)[0] < wind.air_density(np.array([15.0]))[0]
+    np.testing.assert_array_equal(wind.daily_totals(np.ones((1, 50))), [[24.0, 24.0]])
+
+
+def test_layout_defaults():
+    layout, = app.resolve_turbine_layouts(None)
+    assert layout["hub_height"] == app.DEFAULT_HUB_HEIGHT
+    assert layout["rated_power_kw"] == pytest.approx(wind.rated_power_kw(80, 12.0, 0.40))
+    assert layout["name"] == "layout-1"
+
+
+@pytest.mark.parametrize("config", [
+    {"hub_height": -50},
+    {"hub_height": 0},
+    {"power_coefficient": -1},
+    {"power_coefficient": 0},
+    {"power_coefficient": 0.6},
+    {"rated_power_kw": -100},
+    {"rated_power_kw": 0},
+    {"num_turbines": 0},
+    {"rotor_diameter": 0},
+    {"cut_in": 13.0},
+])
+def test_invalid_layouts_are_rejected(config):
+    with pytest.raises(HTTPException) as e:
+        app.resolve_turbine_layouts([app.TurbineConfig(**config)])
+    assert e.value.status_code == 400
@@ -0,0 +1,168 @@
+"""Shared pooled HTTP client for upstream weather calls.
+
+One httpx.AsyncClient lives for the lifetime of the app (see the lifespan
+handler in app.py). Requests are retried with jittered exponential backoff on
+5xx responses and timeouts, and a circuit breaker fails fast while upstream
+is down instead of letting every caller wait out its own timeouts.
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger("solarc.upstream")
+
+
+class UpstreamError(Exception):
+    """Upstream could not be reached or kept failing after retries."""
+
+
+class CircuitOpenError(UpstreamError):
+    def __init__(self, retry_after: float):
+        super().__init__(f"circuit open, retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half-open -> closed."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_inflight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        state = self.state
+        if state == "open" or (state == "half-open" and self._trial_inflight):
+            remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+            raise CircuitOpenError(max(remaining, 1.0))
+        if state == "half-open":
+            self._trial_inflight = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_inflight = False
+
+    def release_trial(self):
+        self._trial_inflight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_inflight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            # a failed half-open trial re-opens for another full window
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.failures}
+
+
+class UpstreamClient:
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        connect_timeout: float = 3.0,
+        read_timeout: float = 10.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.2,
+        backoff_max: float = 2.0,
+        breaker: Optional[CircuitBreaker] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("⚠️ HTTP/2 requested but 'h2' is not installed; using HTTP/1.1")
+                http2 = False
+
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+
+        self.client = httpx.AsyncClient(
+            http2=http2,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            transport=transport,
+        )
+
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+
+    def _backoff(self, attempt: int) -> float:
+        # "full jitter": spreads retries from concurrent callers apart
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def get(self, url: str, params: Optional[Dict[str, Any]] = None) -> httpx.Response:
+        """GET with retries. Returns the final response (any status < 500).
+
+        Raises CircuitOpenError without touching the network while the breaker
+        is open, and UpstreamError once retries are exhausted.
+        """
+        self.breaker.before_call()
+        self.requests += 1
+
+        try:
+            resp = await self._get_with_retries(url, params)
+        except UpstreamError:
+            self.failures += 1
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # cancelled mid-call: neither a success nor an upstream failure
+            self.breaker.release_trial()
+            raise
+        self.breaker.record_success()
+        return resp
+
+    async def _get_with_retries(self, url: str, params: Optional[Dict[str, Any]]) -> httpx.Response:
+        last_error = ""
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.retries += 1
+                await asyncio.sleep(self._backoff(attempt - 1))
+            try:
+                resp = await self.client.get(url, params=params)
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                last_error = f"{type(e).__name__}: {e}"
+                continue
+            if resp.status_code >= 500:
+                last_error = f"HTTP {resp.status_code}"
+                continue
+            return resp
+        raise UpstreamError(f"{url} failed after {self.max_retries + 1} attempts ({last_error})")
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "circuit": self.breaker.stats(),
+        }
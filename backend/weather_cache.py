@@ -0,0 +1,193 @@
+"""In-process cache for Open-Meteo forecast payloads.
+
+Entries are keyed by rounded coordinates, forecast_days and the hourly
+variable set, expire shortly after the next upstream hourly update, and are
+bounded by an LRU. Concurrent misses for the same key share one upstream call.
+
+With a ``shared`` cache (workers.SharedCache, used when serving with several
+worker processes) local misses fall through to it before going upstream,
+fetched payloads are written to it, and a fetch lease makes concurrent
+misses in different workers share one upstream call too. Shared cache calls
+run on its thread, never on the event loop.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+
+class WeatherCache:
+    def __init__(
+        self,
+        max_entries: int = 512,
+        max_ttl: float = 3600.0,
+        update_lag: float = 120.0,
+        coord_precision: int = 2,
+        clock: Callable[[], float] = time.time,
+        shared: Optional[Any] = None,
+        lease_wait: float = 10.0,
+    ):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        # Open-Meteo publishes hourly; give upstream this long after the hour to refresh
+        self.update_lag = update_lag
+        self.coord_precision = coord_precision
+        self._clock = clock
+        self.shared = shared
+        # longest wait for another worker's fetch before fetching ourselves
+        self.lease_wait = lease_wait
+
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.shared_hits = 0
+
+    def round_coords(self, lat: float, lon: float) -> Tuple[float, float]:
+        return round(lat, self.coord_precision), round(lon, self.coord_precision)
+
+    def key(self, lat: float, lon: float, forecast_days: int, hourly_vars: Iterable[str],
+            past_days: int = 0) -> Hashable:
+        rlat, rlon = self.round_coords(lat, lon)
+        return (rlat, rlon, int(forecast_days), tuple(sorted(hourly_vars)), int(past_days))
+
+    def expiry_for(self, now: float) -> float:
+        """Next hourly upstream refresh (plus lag), capped at max_ttl."""
+        next_update = ((now - self.update_lag) // 3600 + 1) * 3600 + self.update_lag
+        return min(next_update, now + self.max_ttl)
+
+    @staticmethod
+    def _shared_key(key: Hashable) -> str:
+        return "weather:" + repr(key)
+
+    def _adopt(self, key: Hashable, found: Optional[Tuple[Any, float]]) -> Optional[Any]:
+        """Store an entry read from the shared cache locally and return its value."""
+        if found is None:
+            return None
+        value, expires_at = found
+        self._store(key, value, expires_at)
+        self.shared_hits += 1
+        return value
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """The locally cached value for ``key``, or None (the shared cache is
+        consulted by get_or_fetch and missing, off the event loop)."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if self._clock() >= expires_at:
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def needs_fetch(self, key: Hashable) -> bool:
+        """True if ``key`` is neither cached here and fresh nor being fetched here."""
+        entry = self._entries.get(key)
+        fresh = entry is not None and self._clock() < entry[0]
+        return not fresh and key not in self._inflight
+
+    async def missing(self, keys: Iterable[Hashable]) -> List[Hashable]:
+        """The ``keys`` that need an upstream fetch: needs_fetch, and with a
+        shared cache neither stored there nor being fetched by another worker."""
+        keys = [key for key in keys if self.needs_fetch(key)]
+        if self.shared is None or not keys:
+            return keys
+        shared = self.shared
+
+        def check():
+            found = shared.get_many([self._shared_key(key) for key in keys])
+            leased = {key for key in keys
+                      if self._shared_key(key) not in found and shared.leased_elsewhere(self._shared_key(key))}
+            return found, leased
+
+        found, leased = await shared.run(check)
+        for key in keys:
+            self._adopt(key, found.get(self._shared_key(key)))
+        return [key for key in keys if self._shared_key(key) not in found and key not in leased]
+
+    def _store(self, key: Hashable, value: Any, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def put(self, key: Hashable, value: Any):
+        expires_at = self.expiry_for(self._clock())
+        self._store(key, value, expires_at)
+        if self.shared is not None:
+            self.shared.submit(self.shared.put, self._shared_key(key), value, expires_at)
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, fetch))
+            self._inflight[key] = task
+        else:
+            self.coalesced += 1
+
+        # shield so one cancelled caller doesn't cancel the fetch for the others
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        leased = False
+        try:
+            if self.shared is not None:
+                shared, shared_key = self.shared, self._shared_key(key)
+                value = self._adopt(key, await shared.run(shared.get, shared_key))
+                if value is not None:
+                    self.hits += 1
+                    return value
+                leased = await shared.run(shared.acquire, shared_key, self.lease_wait)
+                if not leased:
+                    # another worker is fetching this key (or the database is
+                    # busy); wait a while for its result
+                    shared.lease_waits += 1
+                    deadline = time.monotonic() + self.lease_wait
+                    while time.monotonic() < deadline:
+                        await asyncio.sleep(0.05)
+                        value = self._adopt(key, await shared.run(shared.get, shared_key))
+                        if value is not None:
+                            self.hits += 1
+                            return value
+                        if not await shared.run(shared.leased_elsewhere, shared_key):
+                            break
+            self.misses += 1
+            value = await fetch()
+            self.put(key, value)
+            return value
+        finally:
+            if leased:
+                # queued after put's write, so waiting workers find the value first
+                self.shared.submit(self.shared.release, self._shared_key(key))
+            self._inflight.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "shared_hits": self.shared_hits,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,95 @@
+"""Vectorized wind fleet energy from Open-Meteo hourly weather.
+
+For every hour at once: wind_speed_10m is converted to m/s and extrapolated
+to hub height with the power law, air density comes from temperature_2m and
+site elevation, and a cut-in / rated / cut-out power curve gives turbine
+output. Several turbine layouts are evaluated in the same pass as rows of a
+(layouts, hours) array.
+"""
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+KMH_TO_MS = 1 / 3.6
+R_DRY_AIR = 287.05  # J/(kg·K)
+SEA_LEVEL_PRESSURE = 101325.0  # Pa
+REFERENCE_DENSITY = 1.225  # kg/m³, used to derive rated power when not given
+DEFAULT_SHEAR_EXPONENT = 1 / 7
+MEASUREMENT_HEIGHT = 10.0  # m, height of wind_speed_10m
+BETZ_LIMIT = 0.593  # highest physically possible power coefficient (16/27)
+
+
+def air_density(temperature_c: np.ndarray, elevation_m: float = 0.0) -> np.ndarray:
+    """Dry-air density (kg/m³) from temperature and barometric pressure at elevation."""
+    pressure = SEA_LEVEL_PRESSURE * (1 - 2.25577e-5 * elevation_m) ** 5.25588
+    return pressure / (R_DRY_AIR * (np.asarray(temperature_c, dtype=float) + 273.15))
+
+
+def hub_wind_speed(speed_10m_ms: np.ndarray, hub_height: np.ndarray,
+                   shear_exponent: float = DEFAULT_SHEAR_EXPONENT) -> np.ndarray:
+    """Power-law extrapolation; broadcasts hub heights of shape (K, 1) over hours."""
+    return speed_10m_ms * (np.asarray(hub_height, dtype=float) / MEASUREMENT_HEIGHT) ** shear_exponent
+
+
+def swept_area(rotor_diameter):
+    return np.pi * (np.asarray(rotor_diameter, dtype=float) / 2) ** 2
+
+
+def rated_power_kw(rotor_diameter: float, rated_speed: float, power_coefficient: float) -> float:
+    """Rated power implied by the aerodynamic curve at rated speed and sea-level density."""
+    area = swept_area(rotor_diameter)
+    return float(0.5 * REFERENCE_DENSITY * area * power_coefficient * rated_speed ** 3 / 1000.0)
+
+
+def fleet_power(
+    speed_10m_kmh: Sequence[Optional[float]],
+    temperature_c: Sequence[Optional[float]],
+    layouts: Sequence[Dict[str, float]],
+    elevation_m: float = 0.0,
+    shear_exponent: float = DEFAULT_SHEAR_EXPONENT,
+) -> Dict[str, np.ndarray]:
+    """Hourly fleet output for each layout.
+
+    ``layouts`` are dicts with num_turbines, rotor_diameter, hub_height,
+    rated_power_kw, cut_in, rated_speed, cut_out and power_coefficient.
+    Hours with missing weather produce 0 output and are flagged in ``valid``.
+
+    Returns arrays: ``power_kw`` and ``hub_speed`` of shape (layouts, hours),
+    ``air_density`` and ``valid`` of shape (hours,).
+    """
+    v10 = np.array([np.nan if v is None else v for v in speed_10m_kmh], dtype=float) * KMH_TO_MS
+    temp = np.array([np.nan if t is None else t for t in temperature_c], dtype=float)
+    valid = np.isfinite(v10) & np.isfinite(temp)
+    rho = air_density(np.where(valid, temp, 15.0), elevation_m)
+
+    def column(key):
+        return np.array([layout[key] for layout in layouts], dtype=float)[:, None]
+
+    hub_height = column("hub_height")
+    cut_in, rated_speed, cut_out = column("cut_in"), column("rated_speed"), column("cut_out")
+    rated = column("rated_power_kw")
+    area = swept_area(column("rotor_diameter"))
+    cp = column("power_coefficient")
+
+    v = hub_wind_speed(np.where(valid, v10, 0.0), hub_height, shear_exponent)
+    aerodynamic = 0.5 * rho * area * cp * v ** 3 / 1000.0
+    per_turbine = np.where(
+        (v >= cut_in) & (v < cut_out),
+        np.where(v >= rated_speed, rated, np.minimum(aerodynamic, rated)),
+        0.0,
+    )
+    per_turbine[:, ~valid] = 0.0
+
+    return {
+        "power_kw": per_turbine * column("num_turbines"),
+        "hub_speed": v,
+        "air_density": rho,
+        "valid": valid,
+    }
+
+
+def daily_totals(hourly_kwh: np.ndarray, hours_per_day: int = 24) -> np.ndarray:
+    """(layouts, hours) -> (layouts, days) over complete days only."""
+    num_days = hourly_kwh.shape[-1] // hours_per_day
+    trimmed = hourly_kwh[..., :num_days * hours_per_day]
+    return trimmed.reshape(*hourly_kwh.shape[:-1], num_days, hours_per_day).sum(axis=-1)
@@ -0,0 +1,285 @@
+"""State shared between the worker processes of ``serve.py``.
+
+SharedCache is a small SQLite database, in /dev/shm where available, that
+every worker opens. It holds:
+- cache entries (pickled, with an absolute expiry) that back WeatherCache
+  and ForecastStore, so a payload fetched or a forecast scored by one
+  worker serves all of them;
+- fetch leases, so only one worker at a time goes upstream for a key while
+  the others wait for its result;
+- a generation counter per model, bumped when a worker reloads a model, so
+  the other workers reload theirs too;
+- one heartbeat row per worker with its pid and load, for /health.
+
+SQLite in WAL mode lets readers and the one writer proceed concurrently
+across processes, and every call here is a single short statement. The
+connection is opened lazily per process, so an instance created before
+fork() is safe to use in the children.
+
+The methods block (disk I/O, pickling, waits on another worker's write),
+so async code calls them through ``run`` (awaited) or ``submit`` (fire and
+forget). Both use one thread per process, which keeps the calls in order: a
+value put before its fetch lease is released is visible once the lease is
+gone. A lease attempt gives up after ``lease_timeout`` instead of queueing
+behind other workers' writes.
+
+WorkerLoad is the ASGI middleware that counts requests per worker.
+"""
+import asyncio
+import functools
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("solarc.workers")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, expires REAL NOT NULL, value BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner INTEGER NOT NULL, until REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS generations (name TEXT PRIMARY KEY, generation INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS workers (id INTEGER PRIMARY KEY, pid INTEGER NOT NULL, started REAL NOT NULL,
+                                    updated REAL NOT NULL, info TEXT NOT NULL);
+"""
+
+
+class SharedCache:
+    def __init__(self, path: Path, heartbeat_interval: float = 2.0, lease_timeout: float = 0.05):
+        self.path = Path(path)
+        self.heartbeat_interval = heartbeat_interval
+        # longest wait for the database lock when taking a fetch lease
+        self.lease_timeout = lease_timeout
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.lease_waits = 0
+
+    def _db(self) -> sqlite3.Connection:
+        """This process's connection; callers hold ``_lock``."""
+        if self._pid != os.getpid():
+            # first use in this process (possibly a fork of the creator)
+            self._conn = sqlite3.connect(str(self.path), timeout=5.0, isolation_level=None,
+                                         check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=OFF")  # a cache; losing it costs refetches only
+            self._conn.executescript(_SCHEMA)
+            self._pid = os.getpid()
+        return self._conn
+
+    def _execute(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+        with self._lock:
+            return self._db().execute(sql, params).fetchall()
+
+    # ---------- calls from the event loop ----------
+
+    def _pool(self) -> ThreadPoolExecutor:
+        # threads don't survive fork(): each process starts its own
+        if self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="solarc-shared")
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Await ``fn(*args)`` (a method of this cache) on the cache thread."""
+        return await asyncio.get_running_loop().run_in_executor(self._pool(), functools.partial(fn, *args))
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """Queue ``fn(*args)`` on the cache thread without waiting; failures are logged."""
+        future = self._pool().submit(fn, *args)
+        future.add_done_callback(_log_failure)
+        return future
+
+    # ---------- entries ----------
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """(value, expires_at) of a live entry, or None."""
+        rows = self._execute("SELECT value, expires FROM entries WHERE key = ? AND expires > ?", (key, time.time()))
+        if not rows:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pickle.loads(rows[0][0]), rows[0][1]
+
+    def get_many(self, keys: List[str]) -> Dict[str, Tuple[Any, float]]:
+        """{key: (value, expires_at)} for the live entries among ``keys``."""
+        found: Dict[str, Tuple[Any, float]] = {}
+        for start in range(0, len(keys), 500):  # stay under SQLite's variable limit
+            chunk = keys[start:start + 500]
+            rows = self._execute(
+                f"SELECT key, value, expires FROM entries WHERE key IN ({','.join('?' * len(chunk))}) AND expires > ?",
+                (*chunk, time.time()),
+            )
+            found.update((key, (pickle.loads(value), expires)) for key, value, expires in rows)
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put(self, key: str, value: Any, expires_at: float):
+        self.put_many([(key, value, expires_at)])
+
+    def put_many(self, items: Iterable[Tuple[str, Any, float]]):
+        rows = [(key, expires_at, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+                for key, value, expires_at in items]
+        if not rows:
+            return
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.executemany("INSERT OR REPLACE INTO entries (key, expires, value) VALUES (?, ?, ?)", rows)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        self.writes += len(rows)
+
+    def purge(self) -> int:
+        """Drop expired entries and leases; returns the entries removed."""
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            removed = db.execute("DELETE FROM entries WHERE expires <= ?", (now,)).rowcount
+            db.execute("DELETE FROM leases WHERE until <= ?", (now,))
+        return removed
+
+    # ---------- fetch leases ----------
+
+    def acquire(self, key: str, ttl: float) -> bool:
+        """Claim ``key`` for ``ttl`` seconds; False while another process holds
+        it, or if the database stays locked for longer than ``lease_timeout``."""
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            # one statement: takes a free or expired lease (or renews ours) atomically
+            db.execute(f"PRAGMA busy_timeout = {int(self.lease_timeout * 1000)}")
+            try:
+                cursor = db.execute(
+                    "INSERT INTO leases (key, owner, until) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, until = excluded.until "
+                    "WHERE leases.owner = excluded.owner OR leases.until <= ?",
+                    (key, os.getpid(), now + ttl, now),
+                )
+                return cursor.rowcount == 1
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) and "busy" not in str(e):
+                    raise
+                return False
+            finally:
+                db.execute("PRAGMA busy_timeout = 5000")
+
+    def release(self, key: str):
+        self._execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, os.getpid()))
+
+    def leased_elsewhere(self, key: str) -> bool:
+        rows = self._execute("SELECT 1 FROM leases WHERE key = ? AND owner != ? AND until > ?",
+                             (key, os.getpid(), time.time()))
+        return bool(rows)
+
+    # ---------- model generations ----------
+
+    def generation(self, name: str) -> int:
+        rows = self._execute("SELECT generation FROM generations WHERE name = ?", (name,))
+        return rows[0][0] if rows else 0
+
+    def generations(self) -> Dict[str, int]:
+        return dict(self._execute("SELECT name, generation FROM generations"))
+
+    def bump_generation(self, name: str) -> int:
+        self._execute("INSERT INTO generations (name, generation) VALUES (?, 1) "
+                      "ON CONFLICT(name) DO UPDATE SET generation = generation + 1", (name,))
+        return self.generation(name)
+
+    # ---------- workers ----------
+
+    def heartbeat(self, worker_id: int, started: float, info: Dict[str, Any]):
+        self._execute("INSERT OR REPLACE INTO workers (id, pid, started, updated, info) VALUES (?, ?, ?, ?, ?)",
+                      (worker_id, os.getpid(), started, time.time(), json.dumps(info)))
+
+    def workers(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        return [
+            {
+                "id": worker_id,
+                "pid": pid,
+                "alive": now - updated <= 3 * self.heartbeat_interval,
+                "uptime_s": round(now - started, 1),
+                "last_seen_s": round(now - updated, 1),
+                **json.loads(info),
+            }
+            for worker_id, pid, started, updated, info in self._execute(
+                "SELECT id, pid, started, updated, info FROM workers ORDER BY id")
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self._execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM entries")[0]
+        lookups = self.hits + self.misses
+        return {
+            "path": str(self.path),
+            "entries": entries[0],
+            "bytes": entries[1],
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "lease_waits": self.lease_waits,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def remove_files(self):
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.unlink(str(self.path) + suffix)
+            except FileNotFoundError:
+                pass
+
+
+def _log_failure(future: Future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.warning("⚠️ Shared cache write failed: %s", future.exception())
+
+
+def resident_bytes() -> Optional[int]:
+    """This process's resident set size (Linux), or None."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class LoadCounter:
+    def __init__(self):
+        self.requests = 0
+        self.inflight = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"requests": self.requests, "inflight": self.inflight}
+
+
+class WorkerLoad:
+    """ASGI middleware counting the HTTP requests handled and in flight in this process."""
+
+    def __init__(self, app, counter: LoadCounter):
+        self.app = app
+        self.counter = counter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        self.counter.requests += 1
+        self.counter.inflight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.counter.inflight -= 1